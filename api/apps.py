@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .catalogo import invalidar_catalogo_al_escribir
+        from .models import Producto
+
+        # Cualquier escritura de Producto (API, admin, datos sintéticos, shell) invalida el catálogo
+        post_save.connect(invalidar_catalogo_al_escribir, sender=Producto, dispatch_uid='catalogo_post_save')
+        post_delete.connect(invalidar_catalogo_al_escribir, sender=Producto, dispatch_uid='catalogo_post_delete')
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Proveedor
+
+# Autenticación JWT sin consultas: el usuario se arma a partir de los claims firmados del token
+# (user_id, username y proveedor_id, agregados al emitir el token en login/register_proveedor).
+# Para no aceptar indefinidamente a usuarios desactivados, cada worker recuerda por unos segundos
+# si el usuario sigue activo y solo entonces vuelve a consultarlo.
+REVOCACION_TTL_SEGUNDOS = 60  # Tiempo máximo que un usuario desactivado puede seguir usando su token
+REVOCACION_MAX_USUARIOS = 10000  # Usuarios recordados por worker; se descartan los usados hace más tiempo
+
+_usuarios_activos = OrderedDict()  # user_id -> (activo, expira), del menos al más recientemente usado
+_usuarios_activos_lock = threading.Lock()
+
+# ID del proveedor asociado al usuario, o None si no es proveedor
+def buscar_proveedor_id(user):
+    return Proveedor.objects.filter(user=user).values_list('id', flat=True).first()
+
+# Crea los tokens del usuario con los claims que usa ClaimsJWTAuthentication
+def tokens_para_usuario(user, proveedor_id):
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh['proveedor_id'] = proveedor_id
+    return refresh
+
+# Indica si el usuario sigue activo, consultando la base de datos como máximo una vez por TTL
+def usuario_activo(user_id):
+    with _usuarios_activos_lock:
+        activo, expira = _usuarios_activos.get(user_id, (None, 0))
+    if time.monotonic() >= expira:
+        activo = User.objects.filter(id=user_id, is_active=True).exists()
+        expira = time.monotonic() + REVOCACION_TTL_SEGUNDOS
+    with _usuarios_activos_lock:
+        _usuarios_activos[user_id] = (activo, expira)
+        _usuarios_activos.move_to_end(user_id)
+        while len(_usuarios_activos) > REVOCACION_MAX_USUARIOS:
+            _usuarios_activos.popitem(last=False)
+    return activo
+
+class ClaimsJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        if not usuario_activo(user.id):
+            raise AuthenticationFailed('El usuario está inactivo o fue eliminado.', code='user_inactive')
+        return user
+
+# ID del proveedor autenticado: desde el claim del token si existe, o con una consulta para los tokens anteriores
+def proveedor_id_de(request):
+    if request.auth is not None and request.auth.get('proveedor_id'):
+        return request.auth['proveedor_id']
+    return Proveedor.objects.values_list('id', flat=True).get(user_id=request.user.id)
@@ -0,0 +1,456 @@
+import asyncio
+import io
+import json
+import math
+import platform
+import subprocess
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from uuid import uuid4
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections, transaction
+from django.test import Client, RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from . import urls
+from .authentication import tokens_para_usuario
+from .dispositivos import DISPOSITIVO_DEFAULT
+from .datos_sinteticos import BENCH_PASSWORD, PREFIJO, hay_datos_sinteticos
+from .models import Cliente, Dispositivo, KiloProveedor, MovimientoPuntos, Producto, Proveedor, SensorData, Transaccion, UmbralControl
+from .puntos import acreditar_puntos
+from .ranking import sumar_ranking
+from .renderizado import (COLUMNAS_KILO, COLUMNAS_PRODUCTO, COLUMNAS_TRANSACCION, JSONRapidoRenderer, filas_kilos,
+                          filas_productos, filas_transacciones, orjson)
+from .serializers import KiloProveedorSerializer, ProductoSerializer, TransaccionSerializer
+
+# Benchmark de las rutas de api/urls.py sobre los datos de `sembrar_datos`. Mide latencia (p50/p95),
+# consultas SQL por solicitud y solicitudes por segundo, con el cliente de pruebas de Django (en el mismo
+# proceso, secuencial) o contra un servidor local (--url, con varios hilos). Los resultados se guardan en
+# JSON para compararlos entre versiones.
+ESCENARIOS = [
+    # (nombre, método, ruta de api/urls.py, URL, cuerpo, autenticado)
+    ('register', 'POST', 'register/', '/api/register/', lambda c, i: {'username': f"{PREFIJO}_reg_{c['corrida']}_{i}", 'password': BENCH_PASSWORD}, False),
+    ('login', 'POST', 'login/', '/api/login/', lambda c, i: {'username': c['username'], 'password': BENCH_PASSWORD}, False),
+    ('loginuser', 'POST', 'loginuser/', '/api/loginuser/', lambda c, i: {'username': f'{PREFIJO}_usuario', 'password': BENCH_PASSWORD}, False),
+    ('proveedores-list', 'GET', 'proveedores/', '/api/proveedores/', None, False),
+    ('user-list', 'GET', 'usuarios/', '/api/usuarios/', None, False),
+    ('user-detail', 'GET', 'usuarios/<int:pk>/', '/api/usuarios/{user_id}/', None, False),
+    ('proveedor-detail', 'GET', 'proveedores/<int:pk>/', '/api/proveedores/{proveedor_id}/', None, False),
+    ('clientes-list', 'GET', 'clientes/', '/api/clientes/', None, False),
+    ('clientes-search', 'GET', 'clientes/search/', f'/api/clientes/search/?q={PREFIJO}%201', None, False),
+    ('cliente-detail', 'GET', 'clientes/<int:pk>/', '/api/clientes/{cliente_id}/', None, False),
+    ('productos-list', 'GET', 'productos/', '/api/productos/', None, False),
+    ('productos-detail', 'GET', 'productos/<int:pk>/', '/api/productos/{producto_id}/', None, False),
+    ('canjear-puntos', 'POST', 'canjear_puntos/', '/api/canjear_puntos/', lambda c, i: {'proveedor_id': c['proveedor_id'], 'producto_id': c['producto_id'], 'cantidad': 1}, False),
+    ('consultar-puntos', 'GET', 'consultar_puntos/<int:proveedor_id>/', '/api/consultar_puntos/{proveedor_id}/', None, False),
+    ('ranking', 'GET', 'ranking/', '/api/ranking/?por=kilos&limit=20', None, False),
+    ('ranking-proveedor', 'GET', 'ranking/<int:proveedor_id>/', '/api/ranking/{proveedor_id}/?por=puntos', None, False),
+    ('register-prove', 'POST', 'register_proveedor/', '/api/register_proveedor/', lambda c, i: {'username': f"{PREFIJO}_regprov_{c['corrida']}_{i}", 'password': BENCH_PASSWORD}, False),
+    ('proveedor-profile', 'GET', 'profile_proveedor/', '/api/profile_proveedor/', None, True),
+    ('kilos-list', 'GET', 'kilos/', '/api/kilos/', None, False),
+    ('kilos-create', 'POST', 'kilos/', '/api/kilos/', lambda c, i: {'proveedor': c['proveedor_id'], 'kilos': '12.50', 'descripcion': 'benchmark'}, False),
+    ('kilos-batch', 'POST', 'kilos/batch/', '/api/kilos/batch/', lambda c, i: [{'proveedor': c['proveedor_id'], 'kilos': '3.25'}] * 100, False),
+    ('kilos-export-csv', 'GET', 'kilos/export/', '/api/kilos/export/?formato=csv', None, False),
+    ('kilo-detail', 'GET', 'kilos/<int:pk>/', '/api/kilos/{kilo_id}/', None, False),
+    ('transaccion-list', 'GET', 'transacciones/', '/api/transacciones/', None, False),
+    ('transacciones-export-ndjson', 'GET', 'transacciones/export/', '/api/transacciones/export/?formato=ndjson&from={desde}', None, False),
+    ('transaccion-detail', 'GET', 'transacciones/<int:pk>/', '/api/transacciones/{transaccion_id}/', None, False),
+    ('update-user', 'PUT', 'update-user/<int:pk>/', '/api/update-user/{usuario_id}/', lambda c, i: {'username': f'{PREFIJO}_usuario'}, False),
+    ('configuracion', 'GET', 'configuracion/', '/api/configuracion/', None, False),
+    ('dispositivos-list', 'GET', 'dispositivos/', '/api/dispositivos/', None, False),
+    ('dispositivos-estado', 'GET', 'dispositivos/estado/', '/api/dispositivos/estado/', None, False),
+    ('sensor-ultima', 'GET', 'sensor_data/', '/api/sensor_data/?dispositivo={dispositivo}', None, False),
+    ('sensor-historial-1h', 'GET', 'sensor_data/', '/api/sensor_data/?dispositivo={dispositivo}&bucket=1h&from={desde}', None, False),
+    ('sensor-historial-lttb', 'GET', 'sensor_data/', '/api/sensor_data/?dispositivo={dispositivo}&from={desde}&points=500', None, False),
+    ('sensor-put', 'PUT', 'sensor_data/', '/api/sensor_data/?dispositivo={dispositivo}', lambda c, i: {'temperature': 40.0 + i % 10, 'humidity': 55.0}, False),
+    ('sensor-batch', 'POST', 'sensor_data/batch/', '/api/sensor_data/batch/?dispositivo={dispositivo}', lambda c, i: [{'temperature': 40.0, 'humidity': 55.0}] * 500, False),
+    ('servo-get', 'GET', 'servo_motor_state/', '/api/servo_motor_state/?dispositivo={dispositivo}', None, False),
+    ('servo-put', 'PUT', 'servo_motor_state/', '/api/servo_motor_state/?dispositivo={dispositivo}', lambda c, i: {'is_active': i % 2 == 0}, False),
+    ('control-umbrales', 'GET', 'control/umbrales/', '/api/control/umbrales/', None, False),
+    ('control-umbral-detail', 'GET', 'control/umbrales/<int:pk>/', '/api/control/umbrales/{umbral_id}/', None, False),
+    ('control-eventos', 'GET', 'control/eventos/', '/api/control/eventos/?dispositivo={dispositivo}', None, False),
+    ('canjes-por-proveedor', 'GET', 'canjes_por_proveedor/', '/api/canjes_por_proveedor/', None, True),
+    ('kilos-intercambiados', 'GET', 'kilos_intercambiados/', '/api/kilos_intercambiados/', None, True),
+]
+OMITIDAS = {
+    'servo_motor_state/stream/': 'Conexión SSE de larga duración: no tiene una latencia por solicitud comparable.',
+}
+MIN_DIFERENCIA_MS = 2.0  # Diferencias de p95 menores no se consideran regresión (ruido de medición)
+
+# Rutas de api/urls.py que no tienen escenario ni están omitidas a propósito
+def rutas_sin_escenario():
+    cubiertas = {ruta for _, _, ruta, _, _, _ in ESCENARIOS} | set(OMITIDAS)
+    return [str(patron.pattern) for patron in urls.urlpatterns if str(patron.pattern) not in cubiertas]
+
+# IDs y token usados por los escenarios. Acredita al proveedor los puntos de los canjes del benchmark.
+def preparar_contexto(iteraciones):
+    if not hay_datos_sinteticos():
+        raise RuntimeError('No hay datos sintéticos: ejecutar primero `python manage.py sembrar_datos`.')
+    proveedor = Proveedor.objects.select_related('user').get(user__username=f'{PREFIJO}_proveedor_0')
+    producto = Producto.objects.filter(nombre__startswith=f'{PREFIJO} ', tipo='C').order_by('puntos_requeridos').first()
+    with transaction.atomic():
+        acreditar_puntos(proveedor.id, producto.puntos_requeridos * (iteraciones + 1))
+        sumar_ranking(proveedor.id, timezone.now(), puntos=producto.puntos_requeridos * (iteraciones + 1))
+    return {
+        'corrida': uuid4().hex[:8],
+        'username': proveedor.user.username,
+        'user_id': proveedor.user_id,
+        'proveedor_id': proveedor.id,
+        'usuario_id': User.objects.values_list('id', flat=True).get(username=f'{PREFIJO}_usuario'),
+        'producto_id': producto.id,
+        'cliente_id': Cliente.objects.filter(ubicacion=PREFIJO).values_list('id', flat=True).first(),
+        'kilo_id': KiloProveedor.objects.filter(proveedor=proveedor).values_list('id', flat=True).first(),
+        'transaccion_id': Transaccion.objects.filter(producto__nombre__startswith=f'{PREFIJO} ').values_list('id', flat=True).first(),
+        'dispositivo': f'{PREFIJO}-0',
+        'umbral_id': UmbralControl.objects.filter(dispositivo__codigo=f'{PREFIJO}-0').values_list('id', flat=True).first(),
+        'desde': (timezone.now() - timedelta(days=30)).strftime('%Y-%m-%d'),
+        'token': str(tokens_para_usuario(proveedor.user, proveedor.id).access_token),
+    }
+
+# Percentil por rango más cercano
+def percentil(ordenados, p):
+    return ordenados[max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+def resumir(tiempos, consultas, codigos, primera, duracion):
+    ordenados = sorted(tiempos)
+    return {
+        'solicitudes': len(tiempos),
+        'status': dict(Counter(str(codigo) for codigo in codigos)),
+        'errores': sum(1 for codigo in codigos if codigo >= 400),
+        'primera_ms': round(primera, 2),  # Primera solicitud (caché fría), no incluida en los percentiles
+        'p50_ms': round(percentil(ordenados, 50), 2),
+        'p95_ms': round(percentil(ordenados, 95), 2),
+        'max_ms': round(ordenados[-1], 2),
+        'media_ms': round(sum(ordenados) / len(ordenados), 2),
+        'rps': round(len(tiempos) / duracion, 1),
+        'consultas_p50': percentil(sorted(consultas), 50) if consultas else None,
+        'consultas_max': max(consultas) if consultas else None,
+    }
+
+def host_permitido():
+    return next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+
+# Ejecuta un escenario en el mismo proceso con el cliente de pruebas, contando las consultas SQL
+def medir_con_cliente(escenario, contexto, iteraciones):
+    _, metodo, _, url, cuerpo, autenticado = escenario
+    host = host_permitido()
+    extra = {'HTTP_AUTHORIZATION': f"Bearer {contexto['token']}"} if autenticado else {}
+    client = Client(HTTP_HOST=host)
+    contador = [0]
+
+    def contar(execute, sql, params, many, context):
+        contador[0] += 1
+        return execute(sql, params, many, context)
+
+    tiempos, consultas, codigos = [], [], []
+    primera = None
+    with ExitStack() as stack:
+        for conexion in connections.all():  # También las réplicas, si hay
+            stack.enter_context(conexion.execute_wrapper(contar))
+        inicio_total = None
+        for i in range(iteraciones + 1):
+            datos = json.dumps(cuerpo(contexto, i)) if cuerpo else ''
+            contador[0] = 0
+            inicio = time.perf_counter()
+            response = client.generic(metodo, url.format(**contexto), datos, content_type='application/json', **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)  # Las exportaciones consultan la base de datos mientras se envían
+            duracion = (time.perf_counter() - inicio) * 1000
+            if i == 0:
+                primera = duracion
+                inicio_total = time.perf_counter()
+                continue
+            tiempos.append(duracion)
+            consultas.append(contador[0])
+            codigos.append(response.status_code)
+    return resumir(tiempos, consultas, codigos, primera, time.perf_counter() - inicio_total)
+
+# Ejecuta un escenario contra un servidor en `base_url` con `concurrencia` hilos (sin conteo de consultas)
+def medir_con_servidor(escenario, contexto, iteraciones, base_url, concurrencia):
+    _, metodo, _, url, cuerpo, autenticado = escenario
+    headers = {'Content-Type': 'application/json'}
+    if autenticado:
+        headers['Authorization'] = f"Bearer {contexto['token']}"
+
+    def solicitar(i):
+        datos = json.dumps(cuerpo(contexto, i)).encode() if cuerpo else None
+        request = urllib.request.Request(base_url.rstrip('/') + url.format(**contexto), data=datos, headers=headers, method=metodo)
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                codigo = response.status
+        except urllib.error.HTTPError as error:
+            codigo = error.code
+        return (time.perf_counter() - inicio) * 1000, codigo
+
+    primera, _ = solicitar(0)
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        resultados = list(pool.map(solicitar, range(1, iteraciones + 1)))
+    duracion = time.perf_counter() - inicio_total
+    return resumir([t for t, _ in resultados], [], [c for _, c in resultados], primera, duracion)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+# Ejecuta los escenarios (todos o los indicados en `solo`) y devuelve el informe completo
+def ejecutar(iteraciones=30, base_url=None, concurrencia=1, solo=None):
+    contexto = preparar_contexto(iteraciones)
+    resultados = {}
+    for escenario in ESCENARIOS:
+        if solo and escenario[0] not in solo:
+            continue
+        if base_url:
+            resultados[escenario[0]] = medir_con_servidor(escenario, contexto, iteraciones, base_url, concurrencia)
+        else:
+            resultados[escenario[0]] = medir_con_cliente(escenario, contexto, iteraciones)
+        resultados[escenario[0]].update({'metodo': escenario[1], 'ruta': escenario[2]})
+    return {
+        'meta': {
+            'fecha': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'base_de_datos': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'modo': base_url or 'cliente',
+            'iteraciones': iteraciones,
+            'concurrencia': concurrencia if base_url else 1,
+            'datos': {
+                modelo.__name__: modelo.objects.count()
+                for modelo in (Proveedor, Cliente, Producto, KiloProveedor, Transaccion, MovimientoPuntos, Dispositivo, SensorData)
+            },
+        },
+        'resultados': resultados,
+        'sin_escenario': rutas_sin_escenario(),
+        'omitidas': OMITIDAS,
+    }
+
+# Compara dos informes: regresión si el p95 creció más de `umbral` % (y más de MIN_DIFERENCIA_MS) o si aumentaron las consultas
+def comparar(anterior, actual, umbral=20.0):
+    filas = []
+    for nombre, ahora in actual['resultados'].items():
+        antes = anterior['resultados'].get(nombre)
+        if antes is None:
+            continue
+        delta = (ahora['p95_ms'] - antes['p95_ms']) / antes['p95_ms'] * 100 if antes['p95_ms'] else 0.0
+        mas_lento = delta > umbral and ahora['p95_ms'] - antes['p95_ms'] > MIN_DIFERENCIA_MS
+        mas_consultas = None not in (antes.get('consultas_max'), ahora.get('consultas_max')) and ahora['consultas_max'] > antes['consultas_max']
+        filas.append({
+            'nombre': nombre,
+            'p95_antes': antes['p95_ms'],
+            'p95_ahora': ahora['p95_ms'],
+            'delta_pct': round(delta, 1),
+            'consultas_antes': antes.get('consultas_max'),
+            'consultas_ahora': ahora.get('consultas_max'),
+            'regresion': mas_lento or mas_consultas,
+        })
+    return filas
+
+# Compara, para las listas con camino rápido, el tiempo de convertir y renderizar `filas` registros con el
+# serializador + JSONRenderer y con .values() + JSONRapidoRenderer (mejor de `repeticiones`, incluye la consulta)
+def comparar_renderizado(filas=10000, repeticiones=5):
+    request = RequestFactory().get('/api/productos/', HTTP_HOST=host_permitido())  # Las URLs de las imágenes son absolutas, como en la vista
+    casos = [
+        ('transacciones', Transaccion, TransaccionSerializer, lambda filas_: filas_transacciones(filas_), COLUMNAS_TRANSACCION),
+        ('kilos', KiloProveedor, KiloProveedorSerializer, lambda filas_: filas_kilos(filas_), COLUMNAS_KILO),
+        ('productos', Producto, ProductoSerializer, lambda filas_: filas_productos(filas_, request), COLUMNAS_PRODUCTO),
+    ]
+    resultados = {}
+    for nombre, modelo, serializer_class, construir, columnas in casos:
+        queryset = modelo.objects.order_by('-id')
+
+        def con_serializador():
+            datos = serializer_class(queryset[:filas], many=True, context={'request': request}).data
+            return JSONRenderer().render(datos)
+
+        def rapido():
+            return JSONRapidoRenderer().render(construir(queryset.values(*columnas)[:filas]))
+
+        tiempos = {}
+        contenidos = {}
+        for variante, funcion in (('serializador', con_serializador), ('rapido', rapido)):
+            mejor = math.inf
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                contenidos[variante] = funcion()
+                mejor = min(mejor, time.perf_counter() - inicio)
+            tiempos[variante] = mejor
+        resultados[nombre] = {
+            'filas': min(filas, queryset.count()),
+            'serializador_ms': round(tiempos['serializador'] * 1000, 1),
+            'rapido_ms': round(tiempos['rapido'] * 1000, 1),
+            'aceleracion': round(tiempos['serializador'] / tiempos['rapido'], 1) if tiempos['rapido'] else None,
+            'identico': contenidos['serializador'] == contenidos['rapido'],
+            'bytes': len(contenidos['rapido']),
+        }
+    return {'orjson': orjson is not None, 'resultados': resultados}
+
+# Benchmark de conexiones lentas: `clientes` dispositivos envían a la vez una lectura (PUT sensor_data/) y el
+# cuerpo de cada una llega en `fragmentos` partes separadas por `latencia_ms` (red lenta). Con WSGI cada
+# solicitud ocupa uno de los `hilos` del servidor mientras se recibe el cuerpo; con ASGI el cuerpo se recibe
+# en el event loop y la vista asíncrona solo usa el hilo del ORM para sus consultas. Sin --url se llama a
+# WSGIHandler (con un pool de `hilos`) y al ASGIHandler de Django en este proceso; con --url se abren las
+# conexiones contra un servidor real (gunicorn, uvicorn) para comparar despliegues.
+CONEXIONES_RUTA = '/api/sensor_data/'
+CONEXIONES_DISPOSITIVOS = 50  # Dispositivos entre los que se reparten los clientes
+
+def _lectura(i):
+    return json.dumps({'temperature': 20.0 + i % 30, 'humidity': 40.0 + i % 50}).encode()
+
+def _partes(cuerpo, fragmentos):
+    tamano = max(1, math.ceil(len(cuerpo) / fragmentos))
+    return [cuerpo[inicio:inicio + tamano] for inicio in range(0, len(cuerpo), tamano)]
+
+# Códigos de dispositivo para los clientes: los registrados (hasta CONEXIONES_DISPOSITIVOS) o el de por defecto
+def dispositivos_de_prueba():
+    return list(Dispositivo.objects.order_by('id').values_list('codigo', flat=True)[:CONEXIONES_DISPOSITIVOS]) or [DISPOSITIVO_DEFAULT]
+
+# wsgi.input de un cliente lento: read(n) se bloquea hasta tener n bytes, como el socket de un servidor WSGI
+class _CuerpoLento(io.RawIOBase):
+    def __init__(self, partes, pausa):
+        self.partes = list(partes)
+        self.pausa = pausa
+        self.recibido = b''
+
+    def read(self, size=-1):
+        while self.partes and (size is None or size < 0 or len(self.recibido) < size):
+            time.sleep(self.pausa)
+            self.recibido += self.partes.pop(0)
+        if size is None or size < 0:
+            size = len(self.recibido)
+        datos, self.recibido = self.recibido[:size], self.recibido[size:]
+        return datos
+
+def _medir_wsgi(clientes, dispositivos, fragmentos, pausa, hilos):
+    handler = WSGIHandler()
+    host = host_permitido()
+
+    def atender(i, llegada):
+        cuerpo = _lectura(i)
+        environ = {
+            'REQUEST_METHOD': 'PUT', 'PATH_INFO': CONEXIONES_RUTA, 'SCRIPT_NAME': '',
+            'QUERY_STRING': urllib.parse.urlencode({'dispositivo': dispositivos[i % len(dispositivos)]}),
+            'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(cuerpo)),
+            'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1',
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+            'wsgi.input': _CuerpoLento(_partes(cuerpo, fragmentos), pausa), 'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        codigo = []
+        response = handler(environ, lambda estado, headers, exc_info=None: codigo.append(int(estado.split()[0])))
+        try:
+            b''.join(response)
+        finally:
+            response.close()  # request_finished: cierra la conexión a la base de datos del hilo
+        return (time.perf_counter() - llegada) * 1000, codigo[0]
+
+    primera, _ = atender(0, time.perf_counter())
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:  # Los clientes que no tienen hilo esperan en la cola del servidor
+        resultados = list(pool.map(lambda i: atender(i, inicio), range(1, clientes + 1)))
+    return resumir([t for t, _ in resultados], [], [c for _, c in resultados], primera, time.perf_counter() - inicio)
+
+async def _medir_asgi(clientes, dispositivos, fragmentos, pausa):
+    application = get_asgi_application()
+    host = host_permitido()
+
+    async def atender(i, llegada):
+        cuerpo = _lectura(i)
+        partes = _partes(cuerpo, fragmentos)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'PUT', 'scheme': 'http',
+            'path': CONEXIONES_RUTA, 'raw_path': CONEXIONES_RUTA.encode(), 'root_path': '',
+            'query_string': urllib.parse.urlencode({'dispositivo': dispositivos[i % len(dispositivos)]}).encode(),
+            'headers': [(b'host', host.encode()), (b'content-type', b'application/json'), (b'content-length', str(len(cuerpo)).encode())],
+            'client': ('127.0.0.1', 0), 'server': (host, 80),
+        }
+        codigo = []
+
+        async def receive():
+            if partes:
+                await asyncio.sleep(pausa)
+                parte = partes.pop(0)
+                return {'type': 'http.request', 'body': parte, 'more_body': bool(partes)}
+            await asyncio.Event().wait()  # El cliente sigue conectado hasta recibir la respuesta
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                codigo.append(mensaje['status'])
+
+        await application(scope, receive, send)
+        return (time.perf_counter() - llegada) * 1000, codigo[0]
+
+    primera, _ = await atender(0, time.perf_counter())
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(atender(i, inicio) for i in range(1, clientes + 1)))
+    return resumir([t for t, _ in resultados], [], [c for _, c in resultados], primera, time.perf_counter() - inicio)
+
+async def _medir_url(base_url, clientes, dispositivos, fragmentos, pausa):
+    destino = urllib.parse.urlsplit(base_url)
+    puerto = destino.port or (443 if destino.scheme == 'https' else 80)
+
+    async def atender(i, llegada):
+        cuerpo = _lectura(i)
+        ruta = destino.path.rstrip('/') + CONEXIONES_RUTA + '?' + urllib.parse.urlencode({'dispositivo': dispositivos[i % len(dispositivos)]})
+        try:
+            lector, escritor = await asyncio.open_connection(destino.hostname, puerto, ssl=destino.scheme == 'https')
+            escritor.write(
+                f'PUT {ruta} HTTP/1.1\r\nHost: {destino.netloc}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n'.encode()
+            )
+            for parte in _partes(cuerpo, fragmentos):
+                await asyncio.sleep(pausa)
+                escritor.write(parte)
+                await escritor.drain()
+            linea = await lector.readline()
+            await lector.read()  # Hasta que el servidor cierre la conexión
+            escritor.close()
+            codigo = int(linea.split()[1])
+        except (OSError, IndexError, ValueError):
+            codigo = 599  # Conexión rechazada o cortada
+        return (time.perf_counter() - llegada) * 1000, codigo
+
+    primera, _ = await atender(0, time.perf_counter())
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(atender(i, inicio) for i in range(1, clientes + 1)))
+    return resumir([t for t, _ in resultados], [], [c for _, c in resultados], primera, time.perf_counter() - inicio)
+
+# Compara WSGI (con `hilos` hilos) y ASGI en este proceso, o mide los servidores de `urls` ({nombre: URL base})
+def comparar_conexiones(clientes=1000, latencia_ms=500, fragmentos=5, hilos=32, urls=None):
+    dispositivos = dispositivos_de_prueba()
+    pausa = latencia_ms / 1000 / fragmentos
+    if urls:
+        resultados = {nombre: asyncio.run(_medir_url(url, clientes, dispositivos, fragmentos, pausa)) for nombre, url in urls.items()}
+    else:
+        resultados = {
+            'wsgi': _medir_wsgi(clientes, dispositivos, fragmentos, pausa, hilos),
+            'asgi': asyncio.run(_medir_asgi(clientes, dispositivos, fragmentos, pausa)),
+        }
+    return {
+        'meta': {
+            'fecha': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'base_de_datos': connection.vendor,
+            'clientes': clientes,
+            'latencia_ms': latencia_ms,
+            'fragmentos': fragmentos,
+            'hilos_wsgi': None if urls else hilos,
+            'dispositivos': len(dispositivos),
+            'modo': urls or 'proceso',
+        },
+        'resultados': resultados,
+    }
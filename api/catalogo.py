@@ -0,0 +1,58 @@
+import hashlib
+import time
+from uuid import uuid4
+from django.core.cache import cache
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .renderizado import JSONRapidoRenderer
+
+# Catálogo de productos pre-renderizado. Cada escritura de Producto cambia la versión del catálogo en la
+# caché compartida; el JSON ya renderizado se guarda por versión, así las lecturas no consultan la base de
+# datos ni vuelven a serializar, y los clientes pueden revalidar con ETag / Last-Modified (304).
+CATALOGO_VERSION_KEY = 'catalogo:version'
+CATALOGO_TIMEOUT = 7 * 24 * 60 * 60  # Las versiones viejas se descartan solas de la caché
+
+# Versión vigente del catálogo: {'version': ..., 'modificado': timestamp}
+def estado_catalogo():
+    estado = cache.get(CATALOGO_VERSION_KEY)
+    if estado is None:
+        cache.add(CATALOGO_VERSION_KEY, {'version': uuid4().hex, 'modificado': int(time.time())}, None)
+        estado = cache.get(CATALOGO_VERSION_KEY)
+    return estado
+
+# Marca el catálogo como modificado; las escrituras de Producto la llaman solas (ver invalidar_catalogo_al_escribir)
+def invalidar_catalogo():
+    cache.set(CATALOGO_VERSION_KEY, {'version': uuid4().hex, 'modificado': int(time.time())}, None)
+
+# Receptor de post_save / post_delete de Producto y de las escrituras en bloque de ProductoQuerySet. Dentro de
+# una transacción se vuelve a invalidar al confirmarla: una lectura concurrente pudo guardar la versión nueva
+# con los datos anteriores a la escritura.
+def invalidar_catalogo_al_escribir(**kwargs):
+    invalidar_catalogo()
+    using = kwargs.get('using') or router.db_for_write(kwargs.get('sender'))
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(invalidar_catalogo, using=using)
+
+# JSON (bytes) de `clave` para la versión vigente (la clave debe depender solo de lo que cambia la respuesta); `construir` devuelve los datos si no están en caché
+def catalogo_renderizado(estado, clave, construir):
+    cache_key = f"catalogo:{estado['version']}:{hashlib.md5(clave.encode()).hexdigest()}"
+    contenido = cache.get(cache_key)
+    if contenido is None:
+        contenido = JSONRapidoRenderer().render(construir())
+        cache.set(cache_key, contenido, CATALOGO_TIMEOUT)
+    return contenido
+
+# Respuesta JSON con ETag (y Last-Modified si se indica), o 304 si el cliente ya tiene esa versión
+def respuesta_condicional(request, etag, contenido=None, construir_contenido=None, last_modified=None):
+    etag = f'"{etag}"'
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if no_modificado is not None:
+        no_modificado['ETag'] = etag
+        return no_modificado
+    response = HttpResponse(contenido if contenido is not None else construir_contenido(), content_type='application/json')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,36 @@
+from django.db import connections, router
+from django.db.models import Q
+from .models import Cliente
+
+# Búsqueda de clientes en mostrador por DNI, RUC o nombre. Cada criterio es un prefijo que se lee del índice:
+# en MySQL como LIKE 'abc%' (istartswith, con la intercalación de la columna) y en SQLite como rango
+# (campo >= 'abc' AND campo < 'abd'), porque ahí LIKE no usa el índice. El rango solo es correcto si la base
+# compara por código de carácter (BINARY en SQLite): con utf8mb4_0900_ai_ci, ':' va antes que '9' y '{'
+# antes que las letras, y un prefijo terminado en 9 o en z no encontraría nada. Los nombres se comparan con
+# Cliente.busqueda_apellidos / busqueda_nombre (en minúsculas, calculados por la base de datos), así se
+# encuentra "García Pérez, Ana" escribiendo "garcía p" o "ana g". La cantidad de resultados está acotada.
+BUSQUEDA_LIMITE = 20  # Resultados por defecto
+BUSQUEDA_LIMITE_MAX = 50
+BUSQUEDA_MIN_CARACTERES = 2  # Prefijos más cortos recorrerían buena parte del índice
+
+# Condición `campo` empieza con `prefijo`, de forma que pueda leerse del índice en la base `vendor`
+def condicion_prefijo(campo, prefijo, vendor):
+    if vendor != 'sqlite':
+        return Q(**{f'{campo}__istartswith': prefijo})  # Las columnas de búsqueda ya están en minúsculas
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return Q(**{f'{campo}__gte': prefijo, f'{campo}__lt': siguiente})
+
+# Consulta de los clientes que coinciden con `q`: DNI o RUC si son solo dígitos, nombre completo si no
+def clientes_que_coinciden(q, vendor=None):
+    q = ' '.join(q.split()).lower()  # Espacios normalizados, igual que en las columnas de búsqueda
+    vendor = vendor or connections[router.db_for_read(Cliente)].vendor
+    if q.isdigit():
+        condicion = condicion_prefijo('dni', q, vendor) | condicion_prefijo('ruc', q, vendor)
+    else:
+        condicion = condicion_prefijo('busqueda_apellidos', q, vendor) | condicion_prefijo('busqueda_nombre', q, vendor)
+    return Cliente.objects.filter(condicion)
+
+# Hasta `limite` clientes ordenados por apellidos, y si había más
+def buscar_clientes(q, limite=BUSQUEDA_LIMITE):
+    clientes = list(clientes_que_coinciden(q).order_by('busqueda_apellidos', 'id')[:limite + 1])
+    return clientes[:limite], len(clientes) > limite
@@ -0,0 +1,34 @@
+from uuid import uuid4
+from django.core.cache import cache
+from .models import Configuracion
+
+# Configuración del sistema guardada en la memoria de cada proceso. Cada worker compara su copia con
+# un sello de versión en la caché compartida (settings.CACHES) y solo vuelve a consultar la base de
+# datos cuando la versión cambió, es decir, después de un PUT en configuracion_detail.
+CONFIGURACION_VERSION_KEY = 'configuracion:version'
+
+_configuracion = (None, None)  # (versión, instancia) en memoria del proceso
+
+# Devuelve la versión vigente, creando una nueva si la caché compartida no la tiene
+def version_actual():
+    version = cache.get(CONFIGURACION_VERSION_KEY)
+    if version is None:
+        cache.add(CONFIGURACION_VERSION_KEY, uuid4().hex, None)
+        version = cache.get(CONFIGURACION_VERSION_KEY)
+    return version
+
+# Obtiene la configuración (o la crea si no existe) sin consultar la base de datos si la copia local está vigente
+def obtener_configuracion():
+    global _configuracion
+    version = version_actual()
+    version_local, configuracion = _configuracion
+    if configuracion is None or version_local != version:
+        configuracion = Configuracion.objects.first()
+        if not configuracion:
+            configuracion = Configuracion.objects.create()
+        _configuracion = (version, configuracion)
+    return configuracion
+
+# Marca la configuración como modificada para que todos los workers la vuelvan a leer
+def invalidar_configuracion():
+    cache.set(CONFIGURACION_VERSION_KEY, uuid4().hex, None)
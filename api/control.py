@@ -0,0 +1,218 @@
+import copy
+import math
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .dispositivos import estado_servo_async, guardar_estado_servo_async, lectura_a_dict
+from .models import EstadoControlDispositivo, EventoControl, SensorData, ServoMotorState, UmbralControl
+from .servo_stream import publicar_estado_servo_async
+
+# Control automático del servomotor a partir de las lecturas del sensor. Por cada dispositivo y variable
+# (temperatura, humedad) se mantiene en la memoria del proceso una media y una varianza móviles
+# exponenciales (EWMA), actualizadas en O(1) por lectura sin volver a consultar el historial. Cuando la media
+# cruza el umbral de encendido de UmbralControl el servomotor se activa, y se desactiva cuando vuelve al
+# umbral de apagado (histéresis: entre los dos umbrales no cambia). Una lectura que se aleja de la media más
+# de sigmas_anomalia desviaciones se registra como anomalía; igual entra en la media, que la amortigua.
+# Los cruces y las anomalías quedan en EventoControl. El control solo actúa en los cruces: un cambio manual
+# del servomotor (servo_motor_state_detail) se respeta hasta el siguiente cruce.
+#
+# El estado de cada dispositivo está en EstadoControlDispositivo, compartido por todos los workers, y se
+# guarda con un UPDATE condicional sobre su versión: si otro worker lo actualizó antes, el UPDATE no cambia
+# ninguna fila, las lecturas se vuelven a procesar sobre el estado leído de la fila y no se registran
+# eventos calculados sobre un estado viejo. Cada proceso recuerda la última versión que guardó, así con un
+# solo worker por dispositivo cada lectura cuesta un UPDATE. El historial solo se lee (las últimas
+# CONTROL_LECTURAS_RECUPERACION lecturas) cuando el dispositivo todavía no tiene fila.
+CONTROL_VERSION_KEY = 'control:umbrales:version'  # Sello de versión de los umbrales en la caché compartida
+CONTROL_LECTURAS_RECUPERACION = 200  # Lecturas recientes con las que se reconstruye el estado de un dispositivo
+CONTROL_MIN_LECTURAS = 20  # Lecturas antes de detectar anomalías: al principio la varianza no es representativa
+
+_umbrales = (None, {})  # (versión, {(dispositivo_id o None, variable): UmbralControl}) en memoria del proceso
+_estados = {}  # dispositivo_id -> (versión, EstadoControl) guardado por este proceso
+
+# Media y varianza móviles exponenciales (Welford con pesos exponenciales)
+class EstadisticaMovil:
+    __slots__ = ('media', 'varianza', 'lecturas')
+
+    def __init__(self):
+        self.media = None
+        self.varianza = 0.0
+        self.lecturas = 0
+
+    def actualizar(self, valor, alpha):
+        if self.media is None:
+            self.media = valor
+        else:
+            diferencia = valor - self.media
+            incremento = alpha * diferencia
+            self.media += incremento
+            self.varianza = (1 - alpha) * (self.varianza + diferencia * incremento)
+        self.lecturas += 1
+
+    def desviacion(self):
+        return math.sqrt(self.varianza)
+
+# Si la variable pide el servomotor activo. Con encender > apagar se vigilan valores altos y con encender <
+# apagar valores bajos; entre los dos umbrales se mantiene lo que pedía antes.
+def exige_activo(umbral, media, antes):
+    if umbral.encender > umbral.apagar:
+        return media > umbral.apagar if antes else media >= umbral.encender
+    return media < umbral.apagar if antes else media <= umbral.encender
+
+class EstadoControl:
+    def __init__(self):
+        self.estadisticas = {}  # variable -> EstadisticaMovil
+        self.exige = {}  # variable -> si la variable pide el servomotor activo
+        self.ultimo = None  # Fecha de la última lectura procesada
+
+    def activo(self):
+        return any(self.exige.values())
+
+    # Campos de EstadoControlDispositivo
+    def a_fila(self):
+        return {
+            'estadisticas': {variable: [e.media, e.varianza, e.lecturas] for variable, e in self.estadisticas.items()},
+            'exige': self.exige,
+            'ultimo': self.ultimo,
+        }
+
+    @classmethod
+    def desde_fila(cls, fila):
+        estado = cls()
+        for variable, (media, varianza, lecturas) in fila.estadisticas.items():
+            estadistica = estado.estadisticas[variable] = EstadisticaMovil()
+            estadistica.media, estadistica.varianza, estadistica.lecturas = media, varianza, lecturas
+        estado.exige = dict(fila.exige)
+        estado.ultimo = fila.ultimo
+        return estado
+
+    # Procesa una lectura ({variable: valor, 'timestamp': fecha}) y devuelve sus eventos como
+    # (tipo, variable, valor, media, desviacion)
+    def procesar(self, lectura, umbrales):
+        eventos = []
+        antes = self.activo()
+        cruces = []
+        for variable, umbral in umbrales.items():
+            valor = lectura[variable]
+            estadistica = self.estadisticas.setdefault(variable, EstadisticaMovil())
+            desviacion = estadistica.desviacion()
+            anomala = (estadistica.lecturas >= CONTROL_MIN_LECTURAS and desviacion > 0
+                       and abs(valor - estadistica.media) > umbral.sigmas_anomalia * desviacion)
+            estadistica.actualizar(valor, umbral.alpha)
+            if anomala:
+                eventos.append(('anomalia', variable, valor, estadistica.media, desviacion))
+            exige = exige_activo(umbral, estadistica.media, self.exige.get(variable, False))
+            if exige != self.exige.get(variable, False):
+                cruces.append((variable, valor, estadistica.media, desviacion))
+            self.exige[variable] = exige
+        if self.activo() != antes and cruces:
+            eventos.append(('encendido' if self.activo() else 'apagado', *cruces[0]))
+        self.ultimo = lectura['timestamp']
+        return eventos
+
+# Umbrales de todos los dispositivos, sin consultar la base de datos si la copia local está vigente
+async def umbrales_vigentes():
+    global _umbrales
+    version = await cache.aget(CONTROL_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CONTROL_VERSION_KEY, uuid4().hex, None)
+        version = await cache.aget(CONTROL_VERSION_KEY)
+    version_local, umbrales = _umbrales
+    if version_local != version:
+        umbrales = {(umbral.dispositivo_id, umbral.variable): umbral async for umbral in UmbralControl.objects.all()}
+        _umbrales = (version, umbrales)
+    return umbrales
+
+# Umbrales activos del dispositivo por variable: el propio o, si no tiene, el de todos los dispositivos
+def umbrales_de(umbrales, dispositivo_id):
+    resultado = {}
+    for variable, _ in UmbralControl.VARIABLE_CHOICES:
+        umbral = umbrales.get((dispositivo_id, variable)) or umbrales.get((None, variable))
+        if umbral is not None and umbral.activo:
+            resultado[variable] = umbral
+    return resultado
+
+# Marca los umbrales como modificados para que todos los workers los vuelvan a leer
+def invalidar_umbrales():
+    cache.set(CONTROL_VERSION_KEY, uuid4().hex, None)
+
+# Reconstruye el estado del dispositivo con sus lecturas anteriores a `hasta`, sin registrar eventos
+async def recuperar_estado(dispositivo_id, hasta, umbrales):
+    estado = EstadoControl()
+    recientes = (
+        SensorData.objects.filter(dispositivo_id=dispositivo_id, timestamp__lt=hasta)
+        .order_by('-timestamp').values('temperature', 'humidity', 'timestamp')[:CONTROL_LECTURAS_RECUPERACION]
+    )
+    for lectura in reversed([lectura async for lectura in recientes]):
+        estado.procesar(lectura, umbrales)
+    return estado
+
+# (versión, EstadoControl) compartido del dispositivo; sin fila todavía, (None, estado reconstruido desde el historial)
+async def cargar_estado(dispositivo_id, hasta, umbrales):
+    fila = await EstadoControlDispositivo.objects.filter(dispositivo_id=dispositivo_id).afirst()
+    if fila is None:
+        return None, await recuperar_estado(dispositivo_id, hasta, umbrales)
+    return fila.version, EstadoControl.desde_fila(fila)
+
+def crear_estado(dispositivo_id, estado):
+    try:
+        with transaction.atomic():  # Punto de guardado por si otro worker crea la fila al mismo tiempo
+            EstadoControlDispositivo.objects.create(dispositivo_id=dispositivo_id, version=1, **estado.a_fila())
+    except IntegrityError:
+        return False
+    return True
+
+# Guarda el estado solo si nadie lo cambió desde `version` (None: el dispositivo todavía no tenía fila);
+# devuelve False si otro worker se adelantó
+async def guardar_estado(dispositivo_id, estado, version):
+    if version is None:
+        return await sync_to_async(crear_estado)(dispositivo_id, estado)
+    actualizadas = await EstadoControlDispositivo.objects.filter(dispositivo_id=dispositivo_id, version=version).aupdate(
+        version=F('version') + 1, **estado.a_fila(),
+    )
+    return actualizadas == 1
+
+# Activa o desactiva el servomotor si no está ya en ese estado
+async def cambiar_servo(dispositivo_id, activo):
+    if (await estado_servo_async(dispositivo_id))['is_active'] == activo:
+        return False
+    servo_motor_state, _ = await ServoMotorState.objects.aupdate_or_create(dispositivo_id=dispositivo_id, defaults={'is_active': activo})
+    await guardar_estado_servo_async(servo_motor_state)
+    await publicar_estado_servo_async(dispositivo_id, {'is_active': activo})  # Enviar el nuevo estado a los dispositivos conectados por SSE
+    return True
+
+# Procesa las lecturas recién insertadas de un dispositivo: actualiza las estadísticas compartidas, cambia el
+# servomotor si la media cruzó un umbral y registra los eventos
+async def procesar_lecturas(dispositivo_id, lecturas):
+    umbrales = umbrales_de(await umbrales_vigentes(), dispositivo_id)
+    if not umbrales or not lecturas:
+        return []
+    lecturas = sorted((lectura_a_dict(lectura) for lectura in lecturas), key=lambda lectura: lectura['timestamp'])
+    guardado = _estados.get(dispositivo_id)
+    while True:
+        if guardado is None:
+            guardado = await cargar_estado(dispositivo_id, lecturas[0]['timestamp'], umbrales)
+        version, estado = guardado[0], copy.deepcopy(guardado[1])
+        eventos = []
+        activo = None  # Estado final pedido al servomotor, si hubo un cruce
+        for lectura in lecturas:
+            if estado.ultimo is not None and lectura['timestamp'] < estado.ultimo:
+                continue  # Lectura atrasada: las estadísticas ya avanzaron más allá
+            for tipo, variable, valor, media, desviacion in estado.procesar(lectura, umbrales):
+                eventos.append(EventoControl(
+                    dispositivo_id=dispositivo_id, tipo=tipo, variable=variable, valor=valor, media=media,
+                    desviacion=desviacion, fecha=lectura['timestamp'],
+                ))
+                if tipo != 'anomalia':
+                    activo = tipo == 'encendido'
+        if await guardar_estado(dispositivo_id, estado, version):
+            _estados[dispositivo_id] = ((version or 0) + 1, estado)
+            break
+        guardado = None  # Otro worker actualizó el estado: volver a procesar sobre el de la fila
+
+    if activo is not None:
+        await cambiar_servo(dispositivo_id, activo)
+    if eventos:
+        await EventoControl.objects.abulk_create(eventos)
+    return eventos
@@ -0,0 +1,176 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .configuracion import obtener_configuracion
+from .control import invalidar_umbrales
+from .dispositivos import invalidar_dispositivos
+from .kilos_mensuales import reconstruir_kilos_mensuales
+from .ranking import reconstruir_ranking
+from .models import Cliente, Dispositivo, KiloProveedor, MovimientoPuntos, Producto, Proveedor, SensorData, ServoMotorState, Transaccion, UmbralControl
+from .rollups import actualizar_rollups
+
+# Generador de datos sintéticos para pruebas de carga y benchmarks. Todo se inserta con bulk_create y los
+# registros llevan el prefijo 'bench' para poder borrarlos después. Con la misma semilla se obtiene el
+# mismo conjunto de datos (las fechas son relativas al momento de la carga).
+PREFIJO = 'bench'
+BENCH_PASSWORD = 'benchmark123'  # Contraseña de todos los usuarios generados
+BATCH_SIZE = 1000  # Filas por sentencia INSERT / UPDATE
+
+# Indica si ya hay datos sintéticos cargados
+def hay_datos_sinteticos():
+    return User.objects.filter(username__startswith=f'{PREFIJO}_').exists()
+
+# Borra los datos sintéticos (los registros de kilos, transacciones y movimientos se borran en cascada)
+def borrar_datos_sinteticos():
+    with transaction.atomic():
+        User.objects.filter(username__startswith=f'{PREFIJO}_').delete()
+        Cliente.objects.filter(ubicacion=PREFIJO).delete()
+        Producto.objects.filter(nombre__startswith=f'{PREFIJO} ').delete()
+        Dispositivo.objects.filter(codigo__startswith=f'{PREFIJO}-').delete()
+    reconstruir_kilos_mensuales()
+    reconstruir_ranking()
+    invalidar_dispositivos()
+    invalidar_umbrales()
+
+# IDs de las filas insertadas después de `ultimo_id`, en orden de inserción (MySQL no los devuelve en bulk_create)
+def _ids_insertados(modelo, ultimo_id):
+    return list(modelo.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True))
+
+def _ultimo_id(modelo):
+    return modelo.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+# Carga el conjunto de datos y devuelve la cantidad de filas creadas por modelo
+def sembrar(proveedores=100, clientes=200, productos=50, kilos=10000, transacciones=2000,
+            dispositivos=2, lecturas=10000, dias=365, semilla=0):
+    rnd = random.Random(semilla)
+    ahora = timezone.now()
+    conversion_rate = obtener_configuracion().conversion_rate
+    password = make_password(BENCH_PASSWORD)  # Un solo hash para todos los usuarios
+
+    with transaction.atomic():
+        # Usuarios y proveedores (más un usuario que no es proveedor, para login_user)
+        usuarios = [User(username=f'{PREFIJO}_proveedor_{i}', password=password) for i in range(proveedores)]
+        usuarios.append(User(username=f'{PREFIJO}_usuario', password=password))
+        User.objects.bulk_create(usuarios, batch_size=BATCH_SIZE)
+        user_ids = dict(User.objects.filter(username__startswith=f'{PREFIJO}_proveedor_').values_list('username', 'id'))
+        Proveedor.objects.bulk_create(
+            [Proveedor(user_id=user_ids[f'{PREFIJO}_proveedor_{i}']) for i in range(proveedores)], batch_size=BATCH_SIZE
+        )
+        proveedor_ids = list(Proveedor.objects.filter(user__username__startswith=f'{PREFIJO}_proveedor_').values_list('id', flat=True))
+
+        Cliente.objects.bulk_create([
+            Cliente(nombre=f'Cliente {i}', apellidos=f'{PREFIJO} {i}', dni=f'{90000000 + i}',
+                    ruc=f'{20000000000 + i}' if i % 3 == 0 else None, ubicacion=PREFIJO)
+            for i in range(clientes)
+        ], batch_size=BATCH_SIZE)
+        cliente_ids = list(Cliente.objects.filter(ubicacion=PREFIJO).values_list('id', flat=True))
+
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'{PREFIJO} producto {i}', descripcion=f'Producto sintético {i}', tipo='C' if i % 2 == 0 else 'V',
+                puntos_requeridos=rnd.randint(1, 20) * 50 if i % 2 == 0 else None,
+                precio=Decimal(rnd.randint(500, 20000)) / 100 if i % 2 else None,
+            )
+            for i in range(productos)
+        ], batch_size=BATCH_SIZE)
+        canjeables = list(Producto.objects.filter(nombre__startswith=f'{PREFIJO} ', tipo='C').values_list('id', 'puntos_requeridos'))
+        vendibles = list(Producto.objects.filter(nombre__startswith=f'{PREFIJO} ', tipo='V').values_list('id', 'precio'))
+
+        # Kilos repartidos en los últimos `dias` días, con su crédito en el libro de puntos
+        saldos = dict.fromkeys(proveedor_ids, 0)
+        ultimo = _ultimo_id(KiloProveedor)
+        filas = [
+            (rnd.choice(proveedor_ids), Decimal(rnd.randint(50, 5000)) / 100, ahora - timedelta(seconds=rnd.randint(0, dias * 86400)))
+            for _ in range(kilos)
+        ] if proveedor_ids else []
+        KiloProveedor.objects.bulk_create(
+            [KiloProveedor(proveedor_id=proveedor_id, kilos=cantidad) for proveedor_id, cantidad, _ in filas], batch_size=BATCH_SIZE
+        )
+        kilo_ids = _ids_insertados(KiloProveedor, ultimo)
+        KiloProveedor.objects.bulk_update(
+            [KiloProveedor(id=kilo_id, fecha=fecha) for kilo_id, (_, _, fecha) in zip(kilo_ids, filas)], ['fecha'], batch_size=BATCH_SIZE
+        )  # fecha es auto_now_add: se corrige después de insertar
+        movimientos = []
+        for kilo_id, (proveedor_id, cantidad, _) in zip(kilo_ids, filas):
+            puntos = int(cantidad) * conversion_rate
+            saldos[proveedor_id] += puntos
+            movimientos.append(MovimientoPuntos(proveedor_id=proveedor_id, puntos=puntos, tipo='K', kilo_id=kilo_id))
+
+        # Canjes mientras el saldo del proveedor alcanza; si no, ventas a clientes
+        ultimo = _ultimo_id(Transaccion)
+        filas = []
+        for _ in range(transacciones if proveedor_ids and (canjeables or vendibles) else 0):
+            proveedor_id = rnd.choice(proveedor_ids)
+            fecha = ahora - timedelta(seconds=rnd.randint(0, dias * 86400))
+            if canjeables:
+                producto_id, puntos = rnd.choice(canjeables)
+                if saldos[proveedor_id] >= puntos:
+                    saldos[proveedor_id] -= puntos
+                    filas.append((Transaccion(proveedor_id=proveedor_id, producto_id=producto_id, cantidad=1, puntos_utilizados=puntos, tipo='C'), fecha))
+                    continue
+            if not vendibles:
+                continue
+            producto_id, precio = rnd.choice(vendibles)
+            cantidad = rnd.randint(1, 5)
+            filas.append((Transaccion(
+                cliente_id=rnd.choice(cliente_ids) if cliente_ids else None, producto_id=producto_id,
+                cantidad=cantidad, total=precio * cantidad, tipo='V',
+            ), fecha))
+        Transaccion.objects.bulk_create([fila for fila, _ in filas], batch_size=BATCH_SIZE)
+        transaccion_ids = _ids_insertados(Transaccion, ultimo)
+        Transaccion.objects.bulk_update(
+            [Transaccion(id=transaccion_id, fecha=fecha) for transaccion_id, (_, fecha) in zip(transaccion_ids, filas)], ['fecha'], batch_size=BATCH_SIZE
+        )
+        movimientos.extend(
+            MovimientoPuntos(proveedor_id=fila.proveedor_id, puntos=-fila.puntos_utilizados, tipo='C', transaccion_id=transaccion_id)
+            for transaccion_id, (fila, _) in zip(transaccion_ids, filas) if fila.tipo == 'C'
+        )
+        MovimientoPuntos.objects.bulk_create(movimientos, batch_size=BATCH_SIZE)
+        Proveedor.objects.bulk_update(
+            [Proveedor(id=proveedor_id, puntos_acumulados=saldo) for proveedor_id, saldo in saldos.items()], ['puntos_acumulados'], batch_size=BATCH_SIZE
+        )  # El saldo coincide con la suma del libro
+
+        # Dispositivos con lecturas a intervalos regulares que terminan ahora
+        Dispositivo.objects.bulk_create(
+            [Dispositivo(codigo=f'{PREFIJO}-{i}', nombre=f'Compostera sintética {i}') for i in range(dispositivos)], batch_size=BATCH_SIZE
+        )
+        dispositivo_ids = list(Dispositivo.objects.filter(codigo__startswith=f'{PREFIJO}-').values_list('id', flat=True))
+        ServoMotorState.objects.bulk_create([ServoMotorState(dispositivo_id=dispositivo_id) for dispositivo_id in dispositivo_ids])
+        UmbralControl.objects.bulk_create(
+            [UmbralControl(dispositivo_id=dispositivo_id, variable='temperature', encender=58, apagar=52) for dispositivo_id in dispositivo_ids]
+        )  # La temperatura sintética oscila entre 30 y 60: el control cruza los umbrales
+        por_dispositivo = lecturas // len(dispositivo_ids) if dispositivo_ids else 0
+        intervalo = dias * 86400 / max(por_dispositivo, 1)
+        SensorData.objects.bulk_create(
+            (
+                SensorData(
+                    dispositivo_id=dispositivo_id,
+                    temperature=round(45 + 15 * math.sin(i / 96) + rnd.gauss(0, 1), 2),
+                    humidity=round(55 + 10 * math.cos(i / 96) + rnd.gauss(0, 2), 2),
+                    timestamp=ahora - timedelta(seconds=(por_dispositivo - i) * intervalo),
+                )
+                for dispositivo_id in dispositivo_ids for i in range(por_dispositivo)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+    reconstruir_kilos_mensuales()
+    reconstruir_ranking()
+    actualizar_rollups(margen=timedelta(0))  # Sin inserciones concurrentes: agregar todo de una vez
+    invalidar_dispositivos()
+    invalidar_umbrales()
+    return {
+        'proveedores': len(proveedor_ids),
+        'clientes': len(cliente_ids),
+        'productos': len(canjeables) + len(vendibles),
+        'kilos': len(kilo_ids),
+        'transacciones': len(transaccion_ids),
+        'movimientos': len(movimientos),
+        'dispositivos': len(dispositivo_ids),
+        'lecturas': por_dispositivo * len(dispositivo_ids),
+    }
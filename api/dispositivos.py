@@ -0,0 +1,165 @@
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from .models import Dispositivo, SensorData, ServoMotorState
+
+# Registro de dispositivos y caché de sus últimos valores. Las lecturas y el estado del servomotor se
+# escriben en la base de datos y también en la caché compartida (write-through), así las consultas del
+# "valor actual" de cada compostera no tocan la base de datos. Las funciones terminadas en _async son las
+# mismas con el ORM y la caché asíncronos, para las vistas de api/sensores.py.
+DISPOSITIVO_DEFAULT = 'default'  # Dispositivo usado por el firmware que no envía ?dispositivo=
+DISPOSITIVOS_KEY = 'dispositivos:lista'  # Lista de (id, codigo) de todos los dispositivos
+
+SIN_LECTURAS = False  # Valor en la caché de la última lectura de un dispositivo que todavía no envió ninguna
+
+_ids_por_codigo = {}  # codigo -> id, en memoria del proceso
+
+# Código del dispositivo indicado en la solicitud (?dispositivo=), o el dispositivo por defecto
+def codigo_solicitado(request):
+    return request.GET.get('dispositivo') or DISPOSITIVO_DEFAULT
+
+# Devuelve el id del dispositivo; lanza Dispositivo.DoesNotExist si no está registrado
+def obtener_dispositivo_id(codigo):
+    dispositivo_id = _ids_por_codigo.get(codigo)
+    if dispositivo_id is None:
+        if codigo == DISPOSITIVO_DEFAULT:
+            dispositivo_id = Dispositivo.objects.get_or_create(codigo=codigo)[0].id
+        else:
+            dispositivo_id = Dispositivo.objects.values_list('id', flat=True).get(codigo=codigo)
+        _ids_por_codigo[codigo] = dispositivo_id
+    return dispositivo_id
+
+async def obtener_dispositivo_id_async(codigo):
+    dispositivo_id = _ids_por_codigo.get(codigo)
+    if dispositivo_id is None:
+        if codigo == DISPOSITIVO_DEFAULT:
+            dispositivo_id = (await Dispositivo.objects.aget_or_create(codigo=codigo))[0].id
+        else:
+            dispositivo_id = await Dispositivo.objects.values_list('id', flat=True).aget(codigo=codigo)
+        _ids_por_codigo[codigo] = dispositivo_id
+    return dispositivo_id
+
+# Debe llamarse al registrar un dispositivo para que aparezca en el estado de todos los dispositivos
+def invalidar_dispositivos():
+    cache.delete(DISPOSITIVOS_KEY)
+
+def clave_lectura(dispositivo_id):
+    return f'sensor:ultimo:{dispositivo_id}'
+
+def clave_servo(dispositivo_id):
+    return f'servo:estado:{dispositivo_id}'
+
+def lectura_a_dict(sensor_data):
+    return {'temperature': sensor_data.temperature, 'humidity': sensor_data.humidity, 'timestamp': sensor_data.timestamp}
+
+# Última lectura de cada dispositivo entre las recién insertadas
+def _mas_nuevas(lecturas):
+    ultimas = {}
+    for lectura in lecturas:
+        actual = ultimas.get(lectura.dispositivo_id)
+        if actual is None or lectura.timestamp >= actual.timestamp:
+            ultimas[lectura.dispositivo_id] = lectura
+    return ultimas
+
+# Valores a escribir en la caché: las lecturas más nuevas que la que ya está en caché
+def _lecturas_a_guardar(ultimas, en_cache):
+    nuevas = {}
+    for dispositivo_id, lectura in ultimas.items():
+        anterior = en_cache.get(clave_lectura(dispositivo_id))
+        if not anterior or lectura.timestamp >= anterior['timestamp']:
+            nuevas[clave_lectura(dispositivo_id)] = lectura_a_dict(lectura)
+    return nuevas
+
+# Guarda en la caché las lecturas recién insertadas, si son más nuevas que la que ya está en caché
+def guardar_ultimas_lecturas(lecturas):
+    ultimas = _mas_nuevas(lecturas)
+    en_cache = cache.get_many([clave_lectura(dispositivo_id) for dispositivo_id in ultimas])
+    cache.set_many(_lecturas_a_guardar(ultimas, en_cache), None)
+
+async def guardar_ultimas_lecturas_async(lecturas):
+    ultimas = _mas_nuevas(lecturas)
+    en_cache = await cache.aget_many([clave_lectura(dispositivo_id) for dispositivo_id in ultimas])
+    await cache.aset_many(_lecturas_a_guardar(ultimas, en_cache), None)
+
+# Última lectura del dispositivo (desde la caché; la base de datos solo si no está en caché), o None si
+# todavía no envió ninguna. Una lectura nunca escribe: no se inventa una lectura en cero que después
+# aparecería en el historial, los rollups y las estadísticas del control. Que no hay lecturas también se
+# guarda en la caché (SIN_LECTURAS), hasta que llegue la primera.
+def ultima_lectura(dispositivo_id):
+    lectura = cache.get(clave_lectura(dispositivo_id))
+    if lectura is None:
+        sensor_data = SensorData.objects.filter(dispositivo_id=dispositivo_id).order_by('-timestamp').first()
+        lectura = lectura_a_dict(sensor_data) if sensor_data else SIN_LECTURAS
+        cache.set(clave_lectura(dispositivo_id), lectura, None)
+    return lectura or None
+
+async def ultima_lectura_async(dispositivo_id):
+    lectura = await cache.aget(clave_lectura(dispositivo_id))
+    if lectura is None:
+        sensor_data = await SensorData.objects.filter(dispositivo_id=dispositivo_id).order_by('-timestamp').afirst()
+        lectura = lectura_a_dict(sensor_data) if sensor_data else SIN_LECTURAS
+        await cache.aset(clave_lectura(dispositivo_id), lectura, None)
+    return lectura or None
+
+def guardar_estado_servo(servo_motor_state):
+    cache.set(clave_servo(servo_motor_state.dispositivo_id), {'is_active': servo_motor_state.is_active}, None)
+
+async def guardar_estado_servo_async(servo_motor_state):
+    await cache.aset(clave_servo(servo_motor_state.dispositivo_id), {'is_active': servo_motor_state.is_active}, None)
+
+# Estado del servomotor del dispositivo (desde la caché; la base de datos solo si no está en caché). Sin
+# fila todavía, el estado es el valor por defecto del modelo (inactivo); la fila se crea con el primer PUT.
+def estado_servo(dispositivo_id):
+    estado = cache.get(clave_servo(dispositivo_id))
+    if estado is None:
+        servo_motor_state = ServoMotorState.objects.filter(dispositivo_id=dispositivo_id).first() or ServoMotorState(dispositivo_id=dispositivo_id)
+        guardar_estado_servo(servo_motor_state)
+        estado = {'is_active': servo_motor_state.is_active}
+    return estado
+
+async def estado_servo_async(dispositivo_id):
+    estado = await cache.aget(clave_servo(dispositivo_id))
+    if estado is None:
+        servo_motor_state = await ServoMotorState.objects.filter(dispositivo_id=dispositivo_id).afirst() or ServoMotorState(dispositivo_id=dispositivo_id)
+        await guardar_estado_servo_async(servo_motor_state)
+        estado = {'is_active': servo_motor_state.is_active}
+    return estado
+
+# Última lectura y estado del servomotor de todos los dispositivos con una sola lectura de la caché
+def estado_de_todos():
+    dispositivos = cache.get(DISPOSITIVOS_KEY)
+    if dispositivos is None:
+        dispositivos = list(Dispositivo.objects.order_by('id').values_list('id', 'codigo'))
+        cache.set(DISPOSITIVOS_KEY, dispositivos, None)
+    en_cache = cache.get_many([
+        clave for dispositivo_id, _ in dispositivos for clave in (clave_lectura(dispositivo_id), clave_servo(dispositivo_id))
+    ])
+    cargar_faltantes(en_cache, [dispositivo_id for dispositivo_id, _ in dispositivos])
+    return [
+        {
+            'dispositivo': codigo,
+            'sensor': en_cache[clave_lectura(dispositivo_id)] or None,  # None si el dispositivo todavía no envió lecturas
+            'servo': en_cache[clave_servo(dispositivo_id)],
+        }
+        for dispositivo_id, codigo in dispositivos
+    ]
+
+# Completa `en_cache` con los valores que faltaban en la caché, con una consulta por tipo de valor
+# (y no una por dispositivo), y los guarda en la caché
+def cargar_faltantes(en_cache, dispositivo_ids):
+    sin_lectura = [dispositivo_id for dispositivo_id in dispositivo_ids if clave_lectura(dispositivo_id) not in en_cache]
+    sin_servo = [dispositivo_id for dispositivo_id in dispositivo_ids if clave_servo(dispositivo_id) not in en_cache]
+    nuevos = {}
+    if sin_lectura:
+        nuevos.update({clave_lectura(dispositivo_id): SIN_LECTURAS for dispositivo_id in sin_lectura})
+        ultimas = SensorData.objects.filter(dispositivo_id=OuterRef('pk')).order_by('-timestamp').values('id')[:1]
+        ids = Dispositivo.objects.filter(id__in=sin_lectura).annotate(ultima=Subquery(ultimas)).values_list('ultima', flat=True)
+        for lectura in SensorData.objects.filter(id__in=[lectura_id for lectura_id in ids if lectura_id is not None]):
+            nuevos[clave_lectura(lectura.dispositivo_id)] = lectura_a_dict(lectura)
+    if sin_servo:
+        # Los dispositivos sin fila del servomotor quedan con el valor por defecto, sin crearla
+        nuevos.update({clave_servo(dispositivo_id): {'is_active': False} for dispositivo_id in sin_servo})
+        for dispositivo_id, is_active in ServoMotorState.objects.filter(dispositivo_id__in=sin_servo).values_list('dispositivo_id', 'is_active'):
+            nuevos[clave_servo(dispositivo_id)] = {'is_active': is_active}
+    if nuevos:
+        cache.set_many(nuevos, None)
+        en_cache.update(nuevos)
@@ -0,0 +1,40 @@
+# Reducción de series temporales para gráficos con el algoritmo
+# Largest-Triangle-Three-Buckets (LTTB), de Sveinn Steinarsson.
+
+# Devuelve los índices de los puntos (x, y) que conservan la forma de la serie
+# usando como máximo `threshold` puntos. Siempre incluye el primero y el último.
+def lttb_indices(points, threshold):
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))  # No hace falta reducir (o el límite es demasiado pequeño)
+
+    indices = [0]
+    every = (n - 2) / (threshold - 2)  # Tamaño de cada cubeta sin contar los extremos
+    a = 0  # Índice del último punto seleccionado
+
+    for i in range(threshold - 2):
+        # Promedio de la siguiente cubeta, usado como tercer vértice del triángulo
+        siguiente_inicio = int((i + 1) * every) + 1
+        siguiente_fin = min(int((i + 2) * every) + 1, n)
+        tramo = points[siguiente_inicio:siguiente_fin]
+        avg_x = sum(p[0] for p in tramo) / len(tramo)
+        avg_y = sum(p[1] for p in tramo) / len(tramo)
+
+        # Elegir el punto de la cubeta actual que forma el triángulo de mayor área
+        inicio = int(i * every) + 1
+        fin = int((i + 1) * every) + 1
+        ax, ay = points[a]
+        max_area = -1
+        elegido = inicio
+        for j in range(inicio, fin):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                elegido = j
+
+        indices.append(elegido)
+        a = elegido
+
+    indices.append(n - 1)
+    return indices
@@ -0,0 +1,93 @@
+import csv
+import json
+from datetime import datetime
+from django.db.models import Max
+from django.utils import timezone
+from .models import KiloProveedor, Transaccion
+
+# Exportación de Transaccion y KiloProveedor en CSV o NDJSON con memoria constante. Las filas se leen por
+# bloques de EXPORTACION_CHUNK ordenados por id (keyset: cada bloque es una consulta id > último), así no se
+# carga la tabla completa ni siquiera en MySQL, donde iterator() trae todo el resultado al cliente. El id
+# máximo se fija al empezar, para que las filas insertadas durante la descarga no aparezcan a medias.
+EXPORTACION_CHUNK = 2000  # Filas por consulta
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+# Campo exportado -> columna, con los mismos nombres que TransaccionSerializer y KiloProveedorSerializer
+CAMPOS_TRANSACCION = {
+    'id': 'id', 'proveedor': 'proveedor_id', 'cliente': 'cliente_id', 'producto': 'producto_id', 'cantidad': 'cantidad',
+    'total': 'total', 'puntos_utilizados': 'puntos_utilizados', 'tipo': 'tipo', 'fecha': 'fecha',
+}
+CAMPOS_KILO = {'id': 'id', 'proveedor': 'proveedor_id', 'kilos': 'kilos', 'descripcion': 'descripcion', 'fecha': 'fecha'}
+
+# Misma representación que DateTimeField de DRF (ISO 8601, 'Z' para UTC). Para muchas filas conviene pasar
+# `zona` (timezone.get_current_timezone()) una sola vez: buscarla en cada llamada es lo más costoso
+def fecha_iso(valor, zona=None):
+    valor = (valor.astimezone(zona) if zona is not None else timezone.localtime(valor)).isoformat()
+    return valor[:-6] + 'Z' if valor.endswith('+00:00') else valor
+
+# Filas (tuplas con `columnas`, la primera debe ser 'id') del queryset, por bloques de EXPORTACION_CHUNK
+def filas_por_bloques(queryset, columnas):
+    ultimo_id = queryset.aggregate(maximo=Max('id'))['maximo']
+    if ultimo_id is None:
+        return
+    desde_id = 0
+    while True:
+        bloque = list(queryset.filter(id__gt=desde_id, id__lte=ultimo_id).order_by('id').values_list(*columnas)[:EXPORTACION_CHUNK])
+        if not bloque:
+            return
+        yield bloque
+        if len(bloque) < EXPORTACION_CHUNK:
+            return
+        desde_id = bloque[-1][0]
+
+class _Eco:
+    # Objeto tipo archivo para csv.writer que devuelve lo escrito en lugar de guardarlo
+    def write(self, valor):
+        return valor
+
+def _valor(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return fecha_iso(valor)
+    if isinstance(valor, (int, float, str, bool)):
+        return valor
+    return str(valor)  # Decimal como cadena, igual que DRF
+
+# Genera el contenido (bytes) de la exportación en el formato pedido, un bloque de filas a la vez
+def exportar(queryset, campos, formato):
+    columnas = list(campos.values())
+    campos = list(campos)
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(campos).encode()
+        for bloque in filas_por_bloques(queryset, columnas):
+            yield ''.join(escritor.writerow(['' if v is None else _valor(v) for v in fila]) for fila in bloque).encode()
+    else:
+        for bloque in filas_por_bloques(queryset, columnas):
+            yield ''.join(
+                json.dumps(dict(zip(campos, map(_valor, fila))), ensure_ascii=False) + '\n' for fila in bloque
+            ).encode()
+
+def transacciones_filtradas(proveedor_id=None, desde=None, hasta=None, tipo=None):
+    queryset = Transaccion.objects.all()
+    if proveedor_id is not None:
+        queryset = queryset.filter(proveedor_id=proveedor_id)
+    if tipo is not None:
+        queryset = queryset.filter(tipo=tipo)
+    return _rango(queryset, desde, hasta)
+
+def kilos_filtrados(proveedor_id=None, desde=None, hasta=None):
+    queryset = KiloProveedor.objects.all()
+    if proveedor_id is not None:
+        queryset = queryset.filter(proveedor_id=proveedor_id)
+    return _rango(queryset, desde, hasta)
+
+def _rango(queryset, desde, hasta):
+    if desde is not None:
+        queryset = queryset.filter(fecha__gte=desde)
+    if hasta is not None:
+        queryset = queryset.filter(fecha__lt=hasta)
+    return queryset
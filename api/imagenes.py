@@ -0,0 +1,90 @@
+import hashlib
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.views.static import serve
+from PIL import Image, ImageOps
+
+# Versiones reducidas de las imágenes de productos (miniatura y tarjeta, en WebP y JPEG como respaldo).
+# Se generan una sola vez al subir la imagen y se guardan con el hash del contenido original en el nombre,
+# por lo que una URL nunca cambia de contenido y se puede cachear como inmutable.
+DERIVADOS_DIR = 'productos/derivados/'
+TAMANOS = {'thumb': 160, 'card': 480}  # Lado máximo en píxeles
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+# Genera los derivados de la imagen y devuelve {'origen': nombre, 'thumb': {'webp': ruta, 'jpeg': ruta}, 'card': {...}}
+def generar_derivados(imagen):
+    with imagen.open('rb') as archivo:
+        contenido = archivo.read()
+    digest = hashlib.sha256(contenido).hexdigest()[:16]
+    variantes = {'origen': imagen.name}
+
+    with Image.open(BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original)  # Respetar la orientación de las fotos de celular
+        for nombre, lado in TAMANOS.items():
+            reducida = original.copy()
+            reducida.thumbnail((lado, lado), Image.LANCZOS)
+            variantes[nombre] = {}
+            for extension, (formato, opciones) in FORMATOS.items():
+                ruta = f'{DERIVADOS_DIR}{digest}-{nombre}.{extension}'
+                if not default_storage.exists(ruta):  # El mismo contenido ya fue procesado (por ejemplo, la imagen por defecto)
+                    buffer = BytesIO()
+                    convertir(reducida, formato).save(buffer, formato, **opciones)
+                    default_storage.save(ruta, ContentFile(buffer.getvalue()))
+                variantes[nombre][extension] = ruta
+    return variantes
+
+# JPEG no admite transparencia: se compone sobre fondo blanco
+def convertir(imagen, formato):
+    if formato == 'JPEG' and imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1])
+        return fondo
+    if imagen.mode not in ('RGB', 'RGBA'):
+        return imagen.convert('RGBA' if formato == 'WEBP' and 'A' in imagen.getbands() else 'RGB')
+    return imagen
+
+# Genera los derivados del producto si su imagen cambió desde la última vez; devuelve True si los actualizó
+def actualizar_derivados(producto):
+    if not producto.imagen:
+        variantes = {}
+    elif producto.imagen_variantes.get('origen') == producto.imagen.name:
+        return False
+    else:
+        try:
+            variantes = generar_derivados(producto.imagen)
+        except (FileNotFoundError, OSError):
+            variantes = {}  # Archivo inexistente o que no es una imagen: se sigue usando la original
+    if variantes == producto.imagen_variantes:
+        return False
+    producto.imagen_variantes = variantes
+    type(producto).objects.filter(pk=producto.pk).update(imagen_variantes=variantes)
+    return True
+
+# Objeto estilo srcset con las URLs de los derivados (absolutas si hay request), o None si no hay derivados
+def srcset(producto, request=None):
+    return srcset_de_variantes(producto.imagen_variantes, request)
+
+def srcset_de_variantes(variantes, request=None):
+    if not variantes.get('origen'):
+        return None
+    resultado = {}
+    for nombre in TAMANOS:
+        resultado[nombre] = {}
+        for extension, ruta in variantes.get(nombre, {}).items():
+            url = default_storage.url(ruta)
+            resultado[nombre][extension] = request.build_absolute_uri(url) if request is not None else url
+    return resultado
+
+# Sirve MEDIA_ROOT en desarrollo agregando caché de larga duración para los derivados (en producción,
+# configurar lo mismo en el servidor web para /media/productos/derivados/)
+def servir_media(request, path, document_root=None, show_indexes=False):
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if path.startswith(DERIVADOS_DIR) and response.status_code == 200:
+        response['Cache-Control'] = CACHE_INMUTABLE
+    return response
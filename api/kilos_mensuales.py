@@ -0,0 +1,48 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import KiloProveedor, KiloMensualProveedor
+
+# Mantenimiento incremental de KiloMensualProveedor. Las funciones deben llamarse dentro de la misma
+# transaction.atomic() que crea, edita o elimina el KiloProveedor correspondiente.
+
+# Primer día del mes (en la zona horaria del proyecto, igual que TruncMonth)
+def mes_de(fecha):
+    return timezone.localtime(fecha).date().replace(day=1)
+
+# Suma (o resta, con signo negativo) kilos y registros al total mensual del proveedor
+def sumar_kilos_mensuales(proveedor_id, fecha, kilos, registros=1):
+    mes = mes_de(fecha)
+    cambios = {'total_kilos': F('total_kilos') + kilos, 'registros': F('registros') + registros}
+    if KiloMensualProveedor.objects.filter(proveedor_id=proveedor_id, mes=mes).update(**cambios):
+        return
+    try:
+        with transaction.atomic():  # Punto de guardado por si otro proceso crea la fila al mismo tiempo
+            KiloMensualProveedor.objects.create(proveedor_id=proveedor_id, mes=mes, total_kilos=kilos, registros=registros)
+    except IntegrityError:
+        KiloMensualProveedor.objects.filter(proveedor_id=proveedor_id, mes=mes).update(**cambios)
+
+# Recalcula desde cero los totales mensuales de todos los proveedores con una sola agregación
+def reconstruir_kilos_mensuales():
+    totales = (
+        KiloProveedor.objects.annotate(month=TruncMonth('fecha'))
+        .values('proveedor_id', 'month')
+        .annotate(total_kilos=Sum('kilos'), registros=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        KiloMensualProveedor.objects.all().delete()
+        creados = KiloMensualProveedor.objects.bulk_create(
+            [
+                KiloMensualProveedor(
+                    proveedor_id=fila['proveedor_id'],
+                    mes=fila['month'].date(),
+                    total_kilos=fila['total_kilos'],
+                    registros=fila['registros'],
+                )
+                for fila in totales.iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(creados)
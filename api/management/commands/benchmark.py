@@ -0,0 +1,59 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmark import comparar, ejecutar
+
+# Comando para medir las rutas de la API sobre los datos de sembrar_datos y guardar el resultado en JSON:
+#   python manage.py benchmark --salida actual.json --comparar base.json
+#   python manage.py benchmark --url http://127.0.0.1:8000 --concurrencia 8
+class Command(BaseCommand):
+    help = 'Mide latencia p50/p95, consultas por solicitud y solicitudes por segundo de cada ruta de la API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=30, help='Solicitudes medidas por escenario.')
+        parser.add_argument('--url', help='Servidor local a medir (por defecto, el cliente de pruebas en este proceso).')
+        parser.add_argument('--concurrencia', type=int, default=1, help='Hilos por escenario con --url.')
+        parser.add_argument('--solo', help='Escenarios a ejecutar, separados por comas.')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+        parser.add_argument('--comparar', help='Resultados JSON anteriores contra los que comparar.')
+        parser.add_argument('--umbral', type=float, default=20.0, help='Aumento de p95 (%%) que se considera regresión.')
+
+    def handle(self, *args, **options):
+        if options['iteraciones'] < 1 or options['concurrencia'] < 1:
+            raise CommandError('--iteraciones y --concurrencia deben ser mayores que cero.')
+        try:
+            informe = ejecutar(
+                iteraciones=options['iteraciones'],
+                base_url=options['url'],
+                concurrencia=options['concurrencia'],
+                solo=set(options['solo'].split(',')) if options['solo'] else None,
+            )
+        except RuntimeError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(f"{'escenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}{'consultas':>11}{'errores':>9}")
+        for nombre, resultado in informe['resultados'].items():
+            consultas = '-' if resultado['consultas_max'] is None else resultado['consultas_max']
+            self.stdout.write(
+                f"{nombre:<24}{resultado['p50_ms']:>9}{resultado['p95_ms']:>9}{resultado['rps']:>9}{consultas:>11}{resultado['errores']:>9}"
+            )
+        if informe['sin_escenario']:
+            self.stderr.write(f"Rutas sin escenario: {', '.join(informe['sin_escenario'])}")
+
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(informe, archivo, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+        if options['comparar']:
+            with open(options['comparar']) as archivo:
+                anterior = json.load(archivo)
+            filas = comparar(anterior, informe, options['umbral'])
+            for fila in filas:
+                marca = '  REGRESIÓN' if fila['regresion'] else ''
+                self.stdout.write(
+                    f"{fila['nombre']:<24}{fila['p95_antes']:>9} -> {fila['p95_ahora']:<9}({fila['delta_pct']:+}%)"
+                    f"  consultas {fila['consultas_antes']} -> {fila['consultas_ahora']}{marca}"
+                )
+            regresiones = [fila['nombre'] for fila in filas if fila['regresion']]
+            if regresiones:
+                raise CommandError(f"Regresiones: {', '.join(regresiones)}")
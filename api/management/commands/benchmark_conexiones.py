@@ -0,0 +1,38 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmark import comparar_conexiones
+
+# Comando para comparar WSGI y ASGI con muchos dispositivos de red lenta conectados a la vez (ver api/sensores.py):
+#   python manage.py benchmark_conexiones --clientes 2000 --latencia-ms 500 --hilos 32
+#   python manage.py benchmark_conexiones --url gunicorn=http://127.0.0.1:8000 --url uvicorn=http://127.0.0.1:8001
+class Command(BaseCommand):
+    help = 'Mide solicitudes por segundo y latencia de sensor_data/ con miles de clientes lentos concurrentes, en WSGI y en ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=1000, help='Dispositivos conectados a la vez.')
+        parser.add_argument('--latencia-ms', type=int, default=500, help='Tiempo que tarda en llegar el cuerpo de cada solicitud.')
+        parser.add_argument('--fragmentos', type=int, default=5, help='Partes en que llega el cuerpo de cada solicitud.')
+        parser.add_argument('--hilos', type=int, default=32, help='Hilos del servidor WSGI simulado (workers x threads).')
+        parser.add_argument('--url', action='append', help='Servidor a medir como nombre=URL (se puede repetir).')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        if min(options['clientes'], options['fragmentos'], options['hilos']) < 1 or options['latencia_ms'] < 0:
+            raise CommandError('--clientes, --fragmentos y --hilos deben ser mayores que cero y --latencia-ms no puede ser negativa.')
+        urls = None
+        if options['url']:
+            if not all('=' in url for url in options['url']):
+                raise CommandError('--url debe tener la forma nombre=URL.')
+            urls = dict(url.split('=', 1) for url in options['url'])
+        informe = comparar_conexiones(options['clientes'], options['latencia_ms'], options['fragmentos'], options['hilos'], urls)
+
+        self.stdout.write(f"{'servidor':<12}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'errores':>9}")
+        for nombre, resultado in informe['resultados'].items():
+            self.stdout.write(
+                f"{nombre:<12}{resultado['rps']:>9}{resultado['p50_ms']:>10}{resultado['p95_ms']:>10}{resultado['max_ms']:>10}{resultado['errores']:>9}"
+            )
+
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(informe, archivo, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
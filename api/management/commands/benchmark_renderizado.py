@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmark import comparar_renderizado
+
+# Comando para comparar el serializador con el camino rápido de las listas (ver api/renderizado.py):
+#   python manage.py benchmark_renderizado --filas 10000
+class Command(BaseCommand):
+    help = 'Compara el tiempo de serializar y renderizar las listas con el serializador y con el camino rápido.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Registros de cada modelo a renderizar.')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por variante (se toma la mejor).')
+
+    def handle(self, *args, **options):
+        if options['filas'] < 1 or options['repeticiones'] < 1:
+            raise CommandError('--filas y --repeticiones deben ser mayores que cero.')
+        informe = comparar_renderizado(options['filas'], options['repeticiones'])
+        self.stdout.write(f"JSON con {'orjson' if informe['orjson'] else 'json de la biblioteca estándar'}")
+        self.stdout.write(f"{'lista':<16}{'filas':>8}{'serializador ms':>17}{'rápido ms':>11}{'x':>7}{'idéntico':>10}")
+        for nombre, resultado in informe['resultados'].items():
+            self.stdout.write(
+                f"{nombre:<16}{resultado['filas']:>8}{resultado['serializador_ms']:>17}{resultado['rapido_ms']:>11}"
+                f"{resultado['aceleracion']:>7}{'sí' if resultado['identico'] else 'NO':>10}"
+            )
+        if not all(resultado['identico'] for resultado in informe['resultados'].values()):
+            raise CommandError('El camino rápido no produce el mismo JSON que el serializador.')
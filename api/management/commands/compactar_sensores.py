@@ -0,0 +1,33 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.rollups import ROLLUP_MARGEN_SEGUNDOS, actualizar_rollups, compactar
+
+# Comando para materializar los agregados por hora y por día de SensorData y eliminar
+# las lecturas crudas fuera de la ventana de retención. Cada ejecución agrega las lecturas hasta el id
+# máximo leído en la anterior (ver actualizar_rollups). Pensado para ejecutarse desde cron:
+#   python manage.py compactar_sensores --retention-days 30
+class Command(BaseCommand):
+    help = 'Actualiza los agregados de sensores desde el último watermark y elimina las lecturas crudas antiguas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=getattr(settings, 'SENSOR_RAW_RETENTION_DAYS', 30),
+            help='Días de lecturas crudas que se conservan (0 para no eliminar nada).',
+        )
+        parser.add_argument(
+            '--margen-segundos',
+            type=int,
+            default=ROLLUP_MARGEN_SEGUNDOS,
+            help='Segundos entre leer el id máximo y agregar las lecturas hasta ese id (0 solo sin inserciones concurrentes).',
+        )
+
+    def handle(self, *args, **options):
+        procesadas = actualizar_rollups(timedelta(seconds=options['margen_segundos']))  # Solo las lecturas nuevas desde la última ejecución
+        self.stdout.write(f'Lecturas agregadas: {procesadas}')
+
+        if options['retention_days'] > 0:
+            eliminadas = compactar(options['retention_days'])
+            self.stdout.write(f'Lecturas crudas eliminadas: {eliminadas}')
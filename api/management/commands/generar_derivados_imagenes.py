@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.catalogo import invalidar_catalogo
+from api.imagenes import actualizar_derivados
+from api.models import Producto
+
+# Comando para generar las miniaturas y versiones WebP de los productos existentes (por ejemplo, al
+# desplegar esta funcionalidad por primera vez). Los productos ya procesados se omiten:
+#   python manage.py generar_derivados_imagenes
+class Command(BaseCommand):
+    help = 'Genera las versiones reducidas (miniatura y tarjeta, WebP y JPEG) de las imágenes de productos.'
+
+    def handle(self, *args, **options):
+        actualizados = sum(actualizar_derivados(producto) for producto in Producto.objects.iterator())
+        if actualizados:
+            invalidar_catalogo()  # Las respuestas del catálogo ahora incluyen los derivados
+        self.stdout.write(f'Productos actualizados: {actualizados}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.kilos_mensuales import reconstruir_kilos_mensuales
+
+# Comando para recalcular los totales mensuales de kilos de todos los proveedores, por ejemplo
+# al desplegar la tabla por primera vez o si se modificaron registros fuera de la API:
+#   python manage.py reconstruir_kilos_mensuales
+class Command(BaseCommand):
+    help = 'Recalcula KiloMensualProveedor a partir de todos los registros de KiloProveedor.'
+
+    def handle(self, *args, **options):
+        creados = reconstruir_kilos_mensuales()
+        self.stdout.write(f'Totales mensuales recalculados: {creados}')
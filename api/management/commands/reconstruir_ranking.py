@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.ranking import reconstruir_ranking
+
+# Comando para recalcular el ranking de proveedores desde cero, por ejemplo si se modificaron saldos,
+# kilos o movimientos de puntos fuera de la API:
+#   python manage.py reconstruir_ranking
+class Command(BaseCommand):
+    help = 'Recalcula RankingProveedor a partir de los saldos, los registros de kilos y el libro de puntos.'
+
+    def handle(self, *args, **options):
+        creados = reconstruir_ranking()
+        self.stdout.write(f'Filas del ranking recalculadas: {creados}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.datos_sinteticos import borrar_datos_sinteticos, hay_datos_sinteticos, sembrar
+
+# Comando para cargar un conjunto de datos sintéticos reproducible (para benchmarks y pruebas de carga):
+#   python manage.py sembrar_datos --proveedores 1000 --kilos 100000 --lecturas 500000 --limpiar
+class Command(BaseCommand):
+    help = 'Carga proveedores, clientes, productos, kilos, transacciones y lecturas de sensores sintéticos con inserciones masivas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--proveedores', type=int, default=100)
+        parser.add_argument('--clientes', type=int, default=200)
+        parser.add_argument('--productos', type=int, default=50)
+        parser.add_argument('--kilos', type=int, default=10000, help='Registros de KiloProveedor.')
+        parser.add_argument('--transacciones', type=int, default=2000)
+        parser.add_argument('--dispositivos', type=int, default=2)
+        parser.add_argument('--lecturas', type=int, default=10000, help='Lecturas de sensores en total (repartidas entre los dispositivos).')
+        parser.add_argument('--dias', type=int, default=365, help='Días hacia atrás en los que se reparten las fechas.')
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--limpiar', action='store_true', help='Borra los datos sintéticos anteriores antes de cargar.')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            borrar_datos_sinteticos()
+        elif hay_datos_sinteticos():
+            raise CommandError('Ya hay datos sintéticos cargados; usar --limpiar para reemplazarlos.')
+
+        creados = sembrar(**{
+            campo: options[campo]
+            for campo in ('proveedores', 'clientes', 'productos', 'kilos', 'transacciones', 'dispositivos', 'lecturas', 'dias', 'semilla')
+        })
+        for modelo, cantidad in creados.items():
+            self.stdout.write(f'{modelo}: {cantidad}')
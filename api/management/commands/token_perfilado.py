@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.perfilado import crear_token
+
+# Comando para generar un token que habilita el perfilado de solicitudes (header X-Profile o ?_profile=):
+#   python manage.py token_perfilado --minutos 30
+class Command(BaseCommand):
+    help = 'Genera un token firmado para perfilar solicitudes de la API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutos', type=int, default=60, help='Minutos de validez del token.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(crear_token(options['minutos']))
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+# Métricas por ruta (latencia, consultas SQL y tiempo de base de datos, tamaño de respuesta y códigos de
+# estado) en formato de texto de Prometheus. Cada hilo acumula en su propio registro, sin bloqueos; el
+# endpoint suma los registros al consultarlo. Con varios workers (gunicorn), si METRICAS_DIR está definido
+# cada proceso vuelca su registro a un archivo cada METRICAS_INTERVALO_SEGUNDOS y el endpoint suma los
+# archivos de todos los procesos.
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Segundos
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_TAMANO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # Bytes
+METRICAS_INTERVALO_SEGUNDOS = 5
+SIN_RUTA = 'sin_ruta'  # Solicitudes que no coinciden con ninguna ruta (404)
+
+_local = threading.local()
+_registros = []  # Registro de cada hilo: {(ruta, metodo): estadística}
+_proximo_volcado = [0.0]
+
+def _nueva_estadistica():
+    return {
+        'status': {},
+        'latencia': [0] * (len(BUCKETS_LATENCIA) + 1), 'latencia_suma': 0.0,
+        'consultas': [0] * (len(BUCKETS_CONSULTAS) + 1), 'consultas_suma': 0,
+        'db_segundos': 0.0,
+        'tamano': [0] * (len(BUCKETS_TAMANO) + 1), 'tamano_suma': 0,
+    }
+
+def _registro_del_hilo():
+    registro = getattr(_local, 'registro', None)
+    if registro is None:
+        registro = _local.registro = {}
+        _registros.append(registro)
+    return registro
+
+# Acumula una solicitud en el registro del hilo actual (consultas y db_segundos son None si no se midieron)
+def registrar(ruta, metodo, status, segundos, consultas=None, db_segundos=None, tamano=None):
+    registro = _registro_del_hilo()
+    estadistica = registro.get((ruta, metodo))
+    if estadistica is None:
+        estadistica = registro[(ruta, metodo)] = _nueva_estadistica()
+    estadistica['status'][status] = estadistica['status'].get(status, 0) + 1
+    estadistica['latencia'][bisect_left(BUCKETS_LATENCIA, segundos)] += 1
+    estadistica['latencia_suma'] += segundos
+    if consultas is not None:
+        estadistica['consultas'][bisect_left(BUCKETS_CONSULTAS, consultas)] += 1
+        estadistica['consultas_suma'] += consultas
+        estadistica['db_segundos'] += db_segundos
+    if tamano is not None:
+        estadistica['tamano'][bisect_left(BUCKETS_TAMANO, tamano)] += 1
+        estadistica['tamano_suma'] += tamano
+
+def _sumar(destino, origen):
+    for clave, valor in origen.items():
+        if clave == 'status':
+            for status, cantidad in valor.items():
+                destino['status'][status] = destino['status'].get(status, 0) + cantidad
+        elif isinstance(valor, list):
+            destino[clave] = [a + b for a, b in zip(destino[clave], valor)]
+        else:
+            destino[clave] += valor
+
+# Suma de los registros de todos los hilos del proceso: {'ruta\tmetodo': estadística}
+def snapshot_proceso():
+    total = {}
+    for registro in list(_registros):
+        for (ruta, metodo), estadistica in list(registro.items()):
+            _sumar(total.setdefault(f'{ruta}\t{metodo}', _nueva_estadistica()), estadistica)
+    return total
+
+# Escribe el registro del proceso en METRICAS_DIR (reemplazo atómico del archivo del proceso)
+def volcar():
+    directorio = getattr(settings, 'METRICAS_DIR', None)
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    destino = os.path.join(directorio, f'{os.getpid()}.json')
+    temporal = f'{destino}.{threading.get_ident()}.tmp'
+    with open(temporal, 'w') as archivo:
+        json.dump(snapshot_proceso(), archivo)
+    os.replace(temporal, destino)
+
+# Registro de todos los procesos (o solo del actual si no hay METRICAS_DIR)
+def snapshot_total():
+    directorio = getattr(settings, 'METRICAS_DIR', None)
+    if not directorio:
+        return snapshot_proceso()
+    volcar()
+    total = {}
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directorio, nombre)) as archivo:
+                snapshot = json.load(archivo)
+        except (OSError, ValueError):
+            continue  # Archivo de un proceso que se está escribiendo o se eliminó
+        for clave, estadistica in snapshot.items():
+            estadistica['status'] = {int(status): cantidad for status, cantidad in estadistica['status'].items()}
+            _sumar(total.setdefault(clave, _nueva_estadistica()), estadistica)
+    return total
+
+def _etiquetas(**etiquetas):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{nombre}="{escapar(valor)}"' for nombre, valor in etiquetas.items())
+
+def _histograma(lineas, nombre, buckets, conteos, suma, etiquetas):
+    acumulado = 0
+    for limite, cantidad in zip(buckets, conteos):
+        acumulado += cantidad
+        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+    acumulado += conteos[-1]
+    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {acumulado}')
+    lineas.append(f'{nombre}_sum{{{etiquetas}}} {suma}')
+    lineas.append(f'{nombre}_count{{{etiquetas}}} {acumulado}')
+
+# Texto en formato de exposición de Prometheus
+def exportar(snapshot):
+    secciones = {
+        'api_requests_total': ('counter', 'Solicitudes atendidas por ruta, método y código de estado.'),
+        'api_request_duration_seconds': ('histogram', 'Latencia de las solicitudes en segundos.'),
+        'api_request_db_queries': ('histogram', 'Consultas SQL por solicitud.'),
+        'api_request_db_seconds_total': ('counter', 'Tiempo total de base de datos en segundos.'),
+        'api_response_size_bytes': ('histogram', 'Tamaño del cuerpo de las respuestas (sin contar las de streaming).'),
+    }
+    lineas = {nombre: [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}'] for nombre, (tipo, ayuda) in secciones.items()}
+    for clave in sorted(snapshot):
+        ruta, metodo = clave.split('\t')
+        estadistica = snapshot[clave]
+        etiquetas = _etiquetas(ruta=ruta, metodo=metodo)
+        for status, cantidad in sorted(estadistica['status'].items()):
+            lineas['api_requests_total'].append(f'api_requests_total{{{etiquetas},status="{status}"}} {cantidad}')
+        _histograma(lineas['api_request_duration_seconds'], 'api_request_duration_seconds', BUCKETS_LATENCIA,
+                    estadistica['latencia'], estadistica['latencia_suma'], etiquetas)
+        _histograma(lineas['api_request_db_queries'], 'api_request_db_queries', BUCKETS_CONSULTAS,
+                    estadistica['consultas'], estadistica['consultas_suma'], etiquetas)
+        lineas['api_request_db_seconds_total'].append(f'api_request_db_seconds_total{{{etiquetas}}} {estadistica["db_segundos"]}')
+        _histograma(lineas['api_response_size_bytes'], 'api_response_size_bytes', BUCKETS_TAMANO,
+                    estadistica['tamano'], estadistica['tamano_suma'], etiquetas)
+    return '\n'.join(linea for seccion in lineas.values() for linea in seccion) + '\n'
+
+# Nombre de la ruta resuelta (el name de api/urls.py o, si no tiene, el patrón)
+def nombre_ruta(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return SIN_RUTA
+    return match.url_name or match.route
+
+def _tamano(response):
+    return None if response.streaming else len(response.content)
+
+# Cuenta en `medicion` las consultas y los segundos de base de datos de todas las conexiones de la solicitud
+@contextmanager
+def medir_consultas(medicion):
+    def medir(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            medicion[0] += 1
+            medicion[1] += time.perf_counter() - inicio
+
+    with ExitStack() as stack:
+        for conexion in connections.all():
+            stack.enter_context(conexion.execute_wrapper(medir))
+        yield
+
+class MetricasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = [0, 0.0]  # Consultas y segundos de base de datos
+        inicio = time.perf_counter()
+        with medir_consultas(medicion):
+            response = self.get_response(request)
+        registrar(nombre_ruta(request), request.method, response.status_code, time.perf_counter() - inicio,
+                  medicion[0], medicion[1], _tamano(response))
+        self.volcar_si_corresponde()
+        return response
+
+    # En ASGI las conexiones son del hilo donde sync_to_async ejecuta el ORM (vistas síncronas y métodos a* del
+    # ORM), que es el mismo durante toda la solicitud (ThreadSensitiveContext): la medición se instala y se
+    # quita en ese hilo
+    async def __acall__(self, request):
+        medicion = [0, 0.0]
+        inicio = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(stack.enter_context)(medir_consultas(medicion))
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        registrar(nombre_ruta(request), request.method, response.status_code, time.perf_counter() - inicio,
+                  medicion[0], medicion[1], _tamano(response))
+        self.volcar_si_corresponde()
+        return response
+
+    def volcar_si_corresponde(self):
+        if getattr(settings, 'METRICAS_DIR', None) and time.monotonic() >= _proximo_volcado[0]:
+            _proximo_volcado[0] = time.monotonic() + METRICAS_INTERVALO_SEGUNDOS
+            volcar()
+
+# Vista para exponer las métricas a Prometheus; solo responde a las IPs de METRICAS_IPS_PERMITIDAS
+def metricas_prometheus(request):
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICAS_IPS_PERMITIDAS', ('127.0.0.1', '::1')):
+        raise Http404()
+    return HttpResponse(exportar(snapshot_total()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_alter_sensordata_humidity_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='sensordata',
+            options={'get_latest_by': 'timestamp'},
+        ),
+        migrations.AlterField(
+            model_name='sensordata',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
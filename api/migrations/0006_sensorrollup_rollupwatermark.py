@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_sensordata_timeseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolucion', models.CharField(choices=[('1h', 'Hora'), ('1d', 'Día')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('temperature_sum', models.FloatField(default=0.0)),
+                ('humidity_min', models.FloatField()),
+                ('humidity_max', models.FloatField()),
+                ('humidity_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('resolucion', 'bucket'), name='unique_sensor_rollup_bucket')],
+            },
+        ),
+    ]
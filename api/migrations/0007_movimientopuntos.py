@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_sensorrollup_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoPuntos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntos', models.IntegerField()),
+                ('tipo', models.CharField(choices=[('K', 'Kilos'), ('C', 'Canje')], max_length=1)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('kilo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.kiloproveedor')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.proveedor')),
+                ('transaccion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.transaccion')),
+            ],
+        ),
+    ]
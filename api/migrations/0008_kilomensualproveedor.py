@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def calcular_totales(apps, schema_editor):
+    KiloProveedor = apps.get_model('api', 'KiloProveedor')
+    KiloMensualProveedor = apps.get_model('api', 'KiloMensualProveedor')
+    totales = (
+        KiloProveedor.objects.annotate(month=TruncMonth('fecha'))
+        .values('proveedor_id', 'month')
+        .annotate(total_kilos=Sum('kilos'), registros=Count('id'))
+        .order_by()
+    )
+    KiloMensualProveedor.objects.bulk_create(
+        [
+            KiloMensualProveedor(proveedor_id=fila['proveedor_id'], mes=fila['month'].date(), total_kilos=fila['total_kilos'], registros=fila['registros'])
+            for fila in totales.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_movimientopuntos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KiloMensualProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('total_kilos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('registros', models.PositiveIntegerField(default=0)),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.proveedor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'mes'), name='unique_kilo_mensual_proveedor')],
+            },
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
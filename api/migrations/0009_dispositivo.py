@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Asigna las lecturas, agregados y el servomotor existentes al dispositivo por defecto
+def asignar_dispositivo_default(apps, schema_editor):
+    Dispositivo = apps.get_model('api', 'Dispositivo')
+    SensorData = apps.get_model('api', 'SensorData')
+    SensorRollup = apps.get_model('api', 'SensorRollup')
+    ServoMotorState = apps.get_model('api', 'ServoMotorState')
+    dispositivo, _ = Dispositivo.objects.get_or_create(codigo='default', defaults={'nombre': 'Compostera principal'})
+    SensorData.objects.filter(dispositivo__isnull=True).update(dispositivo=dispositivo)
+    SensorRollup.objects.filter(dispositivo__isnull=True).update(dispositivo=dispositivo)
+    servo = ServoMotorState.objects.order_by('id').first()  # La API solo usaba el primer registro
+    if servo:
+        ServoMotorState.objects.exclude(id=servo.id).delete()
+        servo.dispositivo = dispositivo
+        servo.save(update_fields=['dispositivo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_kilomensualproveedor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dispositivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, unique=True)),
+                ('nombre', models.CharField(blank=True, default='', max_length=255)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='sensorrollup',
+            name='unique_sensor_rollup_bucket',
+        ),
+        migrations.AddField(
+            model_name='sensordata',
+            name='dispositivo',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.AddField(
+            model_name='sensorrollup',
+            name='dispositivo',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.AddField(
+            model_name='servomotorstate',
+            name='dispositivo',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.RunPython(asignar_dispositivo_default, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sensordata',
+            name='dispositivo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.AlterField(
+            model_name='sensorrollup',
+            name='dispositivo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.AlterField(
+            model_name='servomotorstate',
+            name='dispositivo',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo'),
+        ),
+        migrations.AddIndex(
+            model_name='sensordata',
+            index=models.Index(fields=['dispositivo', 'timestamp'], name='sensordata_disp_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sensorrollup',
+            constraint=models.UniqueConstraint(fields=('dispositivo', 'resolucion', 'bucket'), name='unique_sensor_rollup_dispositivo_bucket'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:13
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def calcular_ranking(apps, schema_editor):
+    Proveedor = apps.get_model('api', 'Proveedor')
+    KiloProveedor = apps.get_model('api', 'KiloProveedor')
+    MovimientoPuntos = apps.get_model('api', 'MovimientoPuntos')
+    RankingProveedor = apps.get_model('api', 'RankingProveedor')
+    filas = {}
+
+    def fila(proveedor_id, periodo):
+        clave = (proveedor_id, periodo)
+        if clave not in filas:
+            filas[clave] = RankingProveedor(proveedor_id=proveedor_id, periodo=periodo, kilos=Decimal('0'), puntos=0)
+        return filas[clave]
+
+    for proveedor_id, puntos in Proveedor.objects.values_list('id', 'puntos_acumulados'):
+        fila(proveedor_id, 'total').puntos = puntos
+    kilos = KiloProveedor.objects.annotate(month=TruncMonth('fecha')).values('proveedor_id', 'month').annotate(total=Sum('kilos')).order_by()
+    for total in kilos:
+        fila(total['proveedor_id'], 'total').kilos += total['total']
+        fila(total['proveedor_id'], f"{total['month']:%Y-%m}").kilos = total['total']
+    puntos = MovimientoPuntos.objects.annotate(month=TruncMonth('fecha')).values('proveedor_id', 'month').annotate(total=Sum('puntos')).order_by()
+    for total in puntos:
+        fila(total['proveedor_id'], f"{total['month']:%Y-%m}").puntos = total['total']
+    RankingProveedor.objects.bulk_create(filas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_producto_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(max_length=7)),
+                ('kilos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('puntos', models.IntegerField(default=0)),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.proveedor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['periodo', '-kilos', 'proveedor'], name='ranking_kilos_idx'), models.Index(fields=['periodo', '-puntos', 'proveedor'], name='ranking_puntos_idx')],
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'periodo'), name='unique_ranking_proveedor')],
+            },
+        ),
+        migrations.RunPython(calcular_ranking, migrations.RunPython.noop),
+    ]
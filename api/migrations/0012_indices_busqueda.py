@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_rankingproveedor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda_apellidos',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('apellidos', models.Value(' '), 'nombre')), output_field=models.CharField(max_length=511)),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda_nombre',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat('nombre', models.Value(' '), 'apellidos')), output_field=models.CharField(max_length=511)),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['ruc'], name='cliente_ruc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['busqueda_apellidos'], name='cliente_busqueda_apellidos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['busqueda_nombre'], name='cliente_busqueda_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kiloproveedor',
+            index=models.Index(fields=['proveedor', 'fecha'], name='kilo_proveedor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['proveedor', 'fecha'], name='transaccion_prov_fecha_idx'),
+        ),
+    ]
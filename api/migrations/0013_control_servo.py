@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('encendido', 'Servomotor activado'), ('apagado', 'Servomotor desactivado'), ('anomalia', 'Lectura anómala')], max_length=9)),
+                ('variable', models.CharField(choices=[('temperature', 'Temperatura'), ('humidity', 'Humedad')], max_length=11)),
+                ('valor', models.FloatField()),
+                ('media', models.FloatField()),
+                ('desviacion', models.FloatField()),
+                ('fecha', models.DateTimeField()),
+                ('dispositivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dispositivo', '-id'], name='evento_control_disp_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UmbralControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variable', models.CharField(choices=[('temperature', 'Temperatura'), ('humidity', 'Humedad')], max_length=11)),
+                ('encender', models.FloatField()),
+                ('apagar', models.FloatField()),
+                ('alpha', models.FloatField(default=0.2)),
+                ('sigmas_anomalia', models.FloatField(default=4.0)),
+                ('activo', models.BooleanField(default=True)),
+                ('dispositivo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.dispositivo')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dispositivo', 'variable'), name='unique_umbral_control')],
+            },
+        ),
+    ]
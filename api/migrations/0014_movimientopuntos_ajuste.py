@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:47
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.utils import timezone
+
+
+# Saldo inicial: los saldos anteriores al libro (0007) no tienen movimientos. Un ajuste por proveedor con la
+# diferencia entre su saldo y la suma de sus movimientos deja el libro cuadrado con puntos_acumulados, y se
+# suma al ranking del mes para que reconstruir_ranking() dé las mismas filas.
+def registrar_saldos_iniciales(apps, schema_editor):
+    Proveedor = apps.get_model('api', 'Proveedor')
+    MovimientoPuntos = apps.get_model('api', 'MovimientoPuntos')
+    RankingProveedor = apps.get_model('api', 'RankingProveedor')
+    movimientos = {
+        fila['proveedor_id']: fila['total'] for fila in MovimientoPuntos.objects.values('proveedor_id').annotate(total=Sum('puntos')).order_by()
+    }
+    ajustes = [
+        MovimientoPuntos(proveedor_id=proveedor_id, puntos=saldo - (movimientos.get(proveedor_id) or 0), tipo='A')
+        for proveedor_id, saldo in Proveedor.objects.values_list('id', 'puntos_acumulados')
+        if saldo != (movimientos.get(proveedor_id) or 0)
+    ]
+    MovimientoPuntos.objects.bulk_create(ajustes, batch_size=1000)
+    periodo = f'{timezone.localtime():%Y-%m}'
+    for ajuste in ajustes:
+        filas = RankingProveedor.objects.filter(proveedor_id=ajuste.proveedor_id, periodo=periodo)
+        if not filas.update(puntos=F('puntos') + ajuste.puntos):
+            RankingProveedor.objects.create(proveedor_id=ajuste.proveedor_id, periodo=periodo, puntos=ajuste.puntos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_control_servo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientopuntos',
+            name='tipo',
+            field=models.CharField(choices=[('K', 'Kilos'), ('C', 'Canje'), ('A', 'Ajuste')], max_length=1),
+        ),
+        migrations.RunPython(registrar_saldos_iniciales, migrations.RunPython.noop),
+    ]
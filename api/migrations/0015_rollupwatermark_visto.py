@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_movimientopuntos_ajuste'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='visto_en',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='visto_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
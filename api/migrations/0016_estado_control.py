@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_rollupwatermark_visto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoControlDispositivo',
+            fields=[
+                ('dispositivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.dispositivo')),
+                ('estadisticas', models.JSONField(default=dict)),
+                ('exige', models.JSONField(default=dict)),
+                ('ultimo', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
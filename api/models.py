@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 # Modelo para los proveedores, relacionado uno a uno con el modelo de usuario de Django.
@@ -16,10 +19,44 @@ class Cliente(models.Model):
     dni = models.CharField(max_length=8, unique=True)  # DNI del cliente, debe ser único.
     ruc = models.CharField(max_length=11, blank=True, null=True)  # RUC del cliente, opcional.
     ubicacion = models.CharField(max_length=255)  # Ubicación del cliente.
+    # Nombre completo en minúsculas en los dos órdenes, calculado por la base de datos, para buscar por prefijo con índice (ver api/clientes.py).
+    busqueda_apellidos = models.GeneratedField(expression=Lower(Concat('apellidos', Value(' '), 'nombre')), output_field=models.CharField(max_length=511), db_persist=True)
+    busqueda_nombre = models.GeneratedField(expression=Lower(Concat('nombre', Value(' '), 'apellidos')), output_field=models.CharField(max_length=511), db_persist=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ruc'], name='cliente_ruc_idx'),
+            models.Index(fields=['busqueda_apellidos'], name='cliente_busqueda_apellidos_idx'),
+            models.Index(fields=['busqueda_nombre'], name='cliente_busqueda_nombre_idx'),
+        ]
 
     def __str__(self):
         return f'{self.nombre} {self.apellidos}'  # Representación en cadena del cliente.
 
+# Escrituras en bloque de productos: no emiten post_save, así que invalidan el catálogo ellas mismas
+class ProductoQuerySet(models.QuerySet):
+    def _invalidar_catalogo(self):
+        from .catalogo import invalidar_catalogo_al_escribir  # catalogo importa este módulo
+        invalidar_catalogo_al_escribir(sender=self.model, using=self.db)
+
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        if filas:
+            self._invalidar_catalogo()
+        return filas
+
+    def bulk_create(self, objs, *args, **kwargs):
+        creados = super().bulk_create(objs, *args, **kwargs)
+        if creados:
+            self._invalidar_catalogo()
+        return creados
+
+    def bulk_update(self, objs, *args, **kwargs):
+        filas = super().bulk_update(objs, *args, **kwargs)
+        if filas:
+            self._invalidar_catalogo()
+        return filas
+
 # Modelo para los productos.
 class Producto(models.Model):
     TIPO_PRODUCTO_CHOICES = [
@@ -32,6 +69,9 @@ class Producto(models.Model):
     puntos_requeridos = models.PositiveIntegerField(null=True, blank=True)  # Puntos requeridos para canje, opcional.
     tipo = models.CharField(max_length=1, choices=TIPO_PRODUCTO_CHOICES)  # Tipo de producto (Venta o Canje).
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True, default='productos/default.jpg')  # Imagen del producto, opcional.
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)  # Rutas de miniaturas y versiones WebP/JPEG generadas (ver api/imagenes.py).
+
+    objects = ProductoQuerySet.as_manager()  # Las escrituras en bloque también invalidan el catálogo
 
     def __str__(self):
         return self.nombre  # Representación en cadena del producto.
@@ -51,6 +91,11 @@ class Transaccion(models.Model):
     tipo = models.CharField(max_length=1, choices=TIPO_TRANSACCION_CHOICES)  # Tipo de transacción (Venta o Canje).
     fecha = models.DateTimeField(auto_now_add=True)  # Fecha de la transacción.
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha'], name='transaccion_prov_fecha_idx'),  # Filtros por proveedor y rango de fechas.
+        ]
+
     def __str__(self):
         return f'{self.tipo} - {self.producto.nombre} - {self.fecha}'  # Representación en cadena de la transacción.
 
@@ -61,6 +106,11 @@ class KiloProveedor(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)  # Fecha de registro.
     descripcion = models.CharField(max_length=2000, default="")  # Descripción del aporte.
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha'], name='kilo_proveedor_fecha_idx'),  # Filtros por proveedor y rango de fechas.
+        ]
+
     def __str__(self):
         return f'{self.proveedor.user.username} - {self.kilos} kg - {self.fecha}'  # Representación en cadena del registro.
 
@@ -68,13 +118,169 @@ class KiloProveedor(models.Model):
 class Configuracion(models.Model):
     conversion_rate = models.PositiveIntegerField(default=100)  # Tasa de conversión, por ejemplo, puntos por unidad monetaria.
 
-# Modelo para los datos de sensores.
+# Modelo para los dispositivos (composteras) que envían lecturas y controlan un servomotor.
+class Dispositivo(models.Model):
+    codigo = models.CharField(max_length=50, unique=True)  # Identificador que envía el dispositivo (?dispositivo=).
+    nombre = models.CharField(max_length=255, blank=True, default='')  # Nombre descriptivo, opcional.
+    fecha_registro = models.DateTimeField(auto_now_add=True)  # Fecha de registro del dispositivo.
+
+    def __str__(self):
+        return self.codigo  # Representación en cadena del dispositivo.
+
+# Modelo para los datos de sensores (serie temporal, solo se agregan filas).
 class SensorData(models.Model):
+    dispositivo = models.ForeignKey(Dispositivo, on_delete=models.CASCADE)  # Dispositivo que envió la lectura.
     temperature = models.FloatField(default=0.0)  # Temperatura registrada por el sensor.
     humidity = models.FloatField(default=0.0)  # Humedad registrada por el sensor.
-    timestamp = models.DateTimeField(auto_now_add=True)  # Fecha y hora del registro.
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)  # Fecha y hora de la lectura (enviada por el dispositivo o la del servidor).
+
+    class Meta:
+        get_latest_by = 'timestamp'  # Permite obtener la lectura más reciente con latest().
+        indexes = [
+            models.Index(fields=['dispositivo', 'timestamp'], name='sensordata_disp_ts_idx'),  # Historial y última lectura por dispositivo.
+        ]
 
 # Modelo para el estado del servo motor.
 class ServoMotorState(models.Model):
+    dispositivo = models.OneToOneField(Dispositivo, on_delete=models.CASCADE)  # Dispositivo al que pertenece el servomotor.
     is_active = models.BooleanField(default=False)  # Estado del servo motor (activo o inactivo).
     timestamp = models.DateTimeField(auto_now_add=True)  # Fecha y hora del registro.
+
+# Modelo para los agregados por hora y por día de los datos de sensores.
+class SensorRollup(models.Model):
+    RESOLUCION_CHOICES = [
+        ('1h', 'Hora'),  # Agregado por hora.
+        ('1d', 'Día'),  # Agregado por día.
+    ]
+    dispositivo = models.ForeignKey(Dispositivo, on_delete=models.CASCADE)  # Dispositivo de las lecturas agregadas.
+    resolucion = models.CharField(max_length=2, choices=RESOLUCION_CHOICES)  # Tamaño de la cubeta.
+    bucket = models.DateTimeField()  # Inicio de la cubeta.
+    count = models.PositiveIntegerField(default=0)  # Cantidad de lecturas agregadas.
+    temperature_min = models.FloatField()  # Temperatura mínima de la cubeta.
+    temperature_max = models.FloatField()  # Temperatura máxima de la cubeta.
+    temperature_sum = models.FloatField(default=0.0)  # Suma de temperaturas (para calcular el promedio).
+    humidity_min = models.FloatField()  # Humedad mínima de la cubeta.
+    humidity_max = models.FloatField()  # Humedad máxima de la cubeta.
+    humidity_sum = models.FloatField(default=0.0)  # Suma de humedades (para calcular el promedio).
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'resolucion', 'bucket'], name='unique_sensor_rollup_dispositivo_bucket'),  # Una fila por dispositivo y cubeta (también sirve de índice para los rangos).
+        ]
+
+# Modelo para guardar hasta qué registro se procesó un trabajo incremental.
+class RollupWatermark(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)  # Nombre del trabajo.
+    ultimo_id = models.BigIntegerField(default=0)  # ID del último registro procesado.
+    visto_id = models.BigIntegerField(default=0)  # ID máximo leído en la última observación, a procesar cuando pase el margen.
+    visto_en = models.DateTimeField(null=True, blank=True)  # Fecha en que se leyó visto_id.
+
+# Modelo para el libro de movimientos de puntos (solo se agregan filas).
+class MovimientoPuntos(models.Model):
+    TIPO_MOVIMIENTO_CHOICES = [
+        ('K', 'Kilos'),  # Puntos acreditados por kilos entregados.
+        ('C', 'Canje'),  # Puntos utilizados en un canje.
+        ('A', 'Ajuste'),  # Ajuste manual del saldo o saldo inicial.
+    ]
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)  # Proveedor al que pertenece el movimiento.
+    puntos = models.IntegerField()  # Puntos del movimiento (positivo acredita, negativo descuenta).
+    tipo = models.CharField(max_length=1, choices=TIPO_MOVIMIENTO_CHOICES)  # Origen del movimiento.
+    kilo = models.ForeignKey(KiloProveedor, null=True, blank=True, on_delete=models.SET_NULL)  # Registro de kilos que originó el movimiento, opcional.
+    transaccion = models.ForeignKey(Transaccion, null=True, blank=True, on_delete=models.SET_NULL)  # Transacción de canje que originó el movimiento, opcional.
+    fecha = models.DateTimeField(auto_now_add=True)  # Fecha del movimiento.
+
+    def __str__(self):
+        return f'{self.proveedor_id} {self.puntos:+d} ({self.tipo}) - {self.fecha}'  # Representación en cadena del movimiento.
+
+# Modelo para el total mensual de kilos por proveedor, mantenido al crear, editar o eliminar KiloProveedor.
+class KiloMensualProveedor(models.Model):
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)  # Proveedor que aportó los kilos.
+    mes = models.DateField()  # Primer día del mes.
+    total_kilos = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Total de kilos del mes.
+    registros = models.PositiveIntegerField(default=0)  # Cantidad de registros de kilos del mes.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['proveedor', 'mes'], name='unique_kilo_mensual_proveedor'),  # Una fila por proveedor y mes (también sirve de índice).
+        ]
+
+    def __str__(self):
+        return f'{self.proveedor_id} - {self.mes:%Y-%m} - {self.total_kilos} kg'  # Representación en cadena del total mensual.
+
+# Modelo para el ranking de proveedores por kilos entregados y por puntos, histórico ('total') y por mes
+# ('2026-10'), mantenido al acreditar kilos y al canjear puntos (ver api/ranking.py).
+class RankingProveedor(models.Model):
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)  # Proveedor clasificado.
+    periodo = models.CharField(max_length=7)  # 'total' o el mes en formato AAAA-MM.
+    kilos = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Kilos entregados en el periodo.
+    puntos = models.IntegerField(default=0)  # Saldo de puntos ('total') o puntos netos ganados en el mes.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['proveedor', 'periodo'], name='unique_ranking_proveedor'),  # Una fila por proveedor y periodo.
+        ]
+        indexes = [
+            # Top-N y "mi posición" recorren solo el índice del periodo, ya ordenado por el valor
+            models.Index(fields=['periodo', '-kilos', 'proveedor'], name='ranking_kilos_idx'),
+            models.Index(fields=['periodo', '-puntos', 'proveedor'], name='ranking_puntos_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.proveedor_id} - {self.periodo} - {self.kilos} kg - {self.puntos} puntos'  # Representación en cadena de la fila del ranking.
+
+# Modelo para los umbrales del control automático del servomotor según las lecturas (ver api/control.py).
+class UmbralControl(models.Model):
+    VARIABLE_CHOICES = [
+        ('temperature', 'Temperatura'),  # Temperatura del sensor.
+        ('humidity', 'Humedad'),  # Humedad del sensor.
+    ]
+    dispositivo = models.ForeignKey(Dispositivo, null=True, blank=True, on_delete=models.CASCADE)  # Dispositivo controlado; vacío: todos los que no tienen umbral propio.
+    variable = models.CharField(max_length=11, choices=VARIABLE_CHOICES)  # Variable del sensor que se vigila.
+    encender = models.FloatField()  # Activar el servomotor cuando la media móvil (EWMA) llega a este valor.
+    apagar = models.FloatField()  # Desactivarlo cuando la media vuelve hasta este valor (histéresis; menor que encender para vigilar valores altos, mayor para valores bajos).
+    alpha = models.FloatField(default=0.2)  # Peso de cada lectura nueva en la media y la varianza móviles (entre 0 y 1).
+    sigmas_anomalia = models.FloatField(default=4.0)  # Desviaciones estándar respecto de la media a partir de las que una lectura es anómala.
+    activo = models.BooleanField(default=True)  # Si el umbral se aplica.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'variable'], name='unique_umbral_control'),  # Un umbral por dispositivo y variable.
+        ]
+
+    def __str__(self):
+        return f'{self.dispositivo_id or "todos"} - {self.variable} {self.apagar}/{self.encender}'  # Representación en cadena del umbral.
+
+# Modelo para el estado del control automático de cada dispositivo (medias y varianzas móviles), compartido por
+# todos los workers. Se actualiza con un UPDATE condicional sobre `version` (ver api/control.py).
+class EstadoControlDispositivo(models.Model):
+    dispositivo = models.OneToOneField(Dispositivo, primary_key=True, on_delete=models.CASCADE)  # Dispositivo controlado.
+    estadisticas = models.JSONField(default=dict)  # {variable: [media, varianza, lecturas]}.
+    exige = models.JSONField(default=dict)  # {variable: si la variable pide el servomotor activo}.
+    ultimo = models.DateTimeField(null=True, blank=True)  # Fecha de la última lectura procesada.
+    version = models.PositiveIntegerField(default=0)  # Se incrementa con cada actualización.
+
+    def __str__(self):
+        return f'{self.dispositivo_id} - v{self.version}'  # Representación en cadena del estado.
+
+# Modelo para el registro de eventos del control automático: cambios del servomotor y lecturas anómalas (solo se agregan filas).
+class EventoControl(models.Model):
+    TIPO_CHOICES = [
+        ('encendido', 'Servomotor activado'),  # La media cruzó el umbral de encendido.
+        ('apagado', 'Servomotor desactivado'),  # La media volvió al umbral de apagado.
+        ('anomalia', 'Lectura anómala'),  # La lectura se alejó de la media más de sigmas_anomalia desviaciones.
+    ]
+    dispositivo = models.ForeignKey(Dispositivo, on_delete=models.CASCADE)  # Dispositivo de la lectura.
+    tipo = models.CharField(max_length=9, choices=TIPO_CHOICES)  # Tipo de evento.
+    variable = models.CharField(max_length=11, choices=UmbralControl.VARIABLE_CHOICES)  # Variable que originó el evento.
+    valor = models.FloatField()  # Valor de la lectura.
+    media = models.FloatField()  # Media móvil después de la lectura.
+    desviacion = models.FloatField()  # Desviación estándar móvil antes de la lectura.
+    fecha = models.DateTimeField()  # Fecha y hora de la lectura.
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dispositivo', '-id'], name='evento_control_disp_idx'),  # Eventos de un dispositivo, paginados por cursor.
+        ]
+
+    def __str__(self):
+        return f'{self.dispositivo_id} - {self.tipo} - {self.variable} {self.valor} - {self.fecha}'  # Representación en cadena del evento.
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+# Paginación por cursor (keyset): cada página filtra por el último id visto en lugar de usar OFFSET,
+# así el costo es el mismo en la primera página que en la página mil. Se ordena por id, que sigue
+# el mismo orden que `fecha` (auto_now_add) y ya está indexado como clave primaria.
+class KeysetPagination(CursorPagination):
+    ordering = '-id'  # Los registros más recientes primero
+    page_size = 50  # Tamaño de página por defecto
+    page_size_query_param = 'limit'  # Permite pedir ?limit=
+    max_page_size = 500  # Límite máximo de registros por página
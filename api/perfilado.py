@@ -0,0 +1,182 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import ExitStack
+from uuid import uuid4
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from .metricas import nombre_ruta
+
+# Perfilado de solicitudes a pedido. Se activa enviando un token firmado (`manage.py token_perfilado`) en el
+# header X-Profile o en ?_profile=, o al azar para una fracción PERFILADO_MUESTREO de las solicitudes. Se
+# guarda el perfil de cProfile y las consultas SQL con su duración en PERFILADO_DIR, o se devuelven en lugar
+# de la respuesta con X-Profile-Output: inline (o ?_profile_output=inline). Como máximo se perfilan
+# PERFILADO_MAX_POR_MINUTO solicitudes por minuto entre todos los workers y una a la vez por proceso.
+PERFILADO_SALT = 'api.perfilado'
+PERFILADO_LINEAS = 40  # Funciones que se muestran en el reporte, ordenadas por tiempo acumulado
+
+_en_curso = threading.Lock()  # cProfile solo admite un perfilador activo por proceso
+
+# Token firmado que habilita el perfilado durante `minutos`
+def crear_token(minutos=60):
+    return signing.dumps({'hasta': int(time.time()) + minutos * 60}, salt=PERFILADO_SALT)
+
+def token_valido(token):
+    try:
+        return signing.loads(token, salt=PERFILADO_SALT)['hasta'] >= time.time()
+    except (signing.BadSignature, KeyError, TypeError):
+        return False
+
+# Indica si se perfila la solicitud y cómo: None, 'archivo' o 'inline'
+def modo_solicitado(request):
+    token = request.headers.get('X-Profile') or request.GET.get('_profile')
+    if token:
+        if not token_valido(token):
+            return None
+        inline = 'inline' in (request.headers.get('X-Profile-Output'), request.GET.get('_profile_output'))
+        return 'inline' if inline else 'archivo'
+    if random.random() < getattr(settings, 'PERFILADO_MUESTREO', 0.0):
+        return 'archivo'
+    return None
+
+# Cupo de perfiles por minuto compartido por todos los workers (con la caché compartida)
+def hay_cupo():
+    clave = f'perfilado:{int(time.time() // 60)}'
+    cache.add(clave, 0, 120)
+    try:
+        return cache.incr(clave) <= getattr(settings, 'PERFILADO_MAX_POR_MINUTO', 6)
+    except ValueError:
+        return False  # La clave expiró entre add e incr
+
+def reporte(request, response, duracion, perfil, consultas):
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(PERFILADO_LINEAS)
+    tiempo_sql = sum(consulta['ms'] for consulta in consultas)
+    lineas = [
+        f'{request.method} {request.get_full_path()} -> {response.status_code} en {duracion * 1000:.1f} ms',
+        f'{len(consultas)} consultas SQL, {tiempo_sql:.1f} ms',
+        '',
+    ]
+    lineas.extend(f"{consulta['ms']:8.2f} ms [{consulta['alias']}] {consulta['sql']}" for consulta in consultas)
+    lineas.extend(['', salida.getvalue()])
+    return '\n'.join(lineas)
+
+# Guarda el perfil binario (.prof, para pstats o snakeviz), el reporte (.txt) y las consultas (.json)
+def guardar(request, nombre, perfil, texto, consultas):
+    directorio = settings.PERFILADO_DIR
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, nombre)
+    perfil.dump_stats(f'{base}.prof')
+    with open(f'{base}.txt', 'w') as archivo:
+        archivo.write(texto)
+    with open(f'{base}.json', 'w') as archivo:
+        json.dump({'ruta': nombre_ruta(request), 'path': request.get_full_path(), 'consultas': consultas}, archivo, indent=1)
+
+# Activa el perfilador y la captura de consultas SQL en el hilo actual; devuelve lo necesario para detenerlos.
+# Lanza ValueError si otra herramienta de perfilado ya está activa.
+def iniciar_perfil(consultas):
+    def medir(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            consultas.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'ms': round((time.perf_counter() - inicio) * 1000, 3),
+                'many': many,
+            })
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    stack = ExitStack()
+    for conexion in connections.all():
+        stack.enter_context(conexion.execute_wrapper(medir))
+    return perfil, stack
+
+def detener_perfil(perfil, stack):
+    stack.close()
+    perfil.disable()
+
+class PerfiladoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        modo = modo_solicitado(request)
+        if modo is None or not hay_cupo():
+            return self.get_response(request)
+        if not _en_curso.acquire(blocking=False):
+            return self.get_response(request)  # Ya hay otro perfil en curso en este proceso
+        try:
+            return self.perfilar(request, modo)
+        finally:
+            _en_curso.release()
+
+    # En ASGI cProfile solo ve el hilo donde se activa. Se activa en el hilo de sync_to_async de la solicitud
+    # (ThreadSensitiveContext), donde corren las vistas síncronas y el ORM de las vistas asíncronas; el código
+    # de las corrutinas en el event loop no aparece en el perfil, porque ese hilo intercala otras solicitudes.
+    async def __acall__(self, request):
+        modo = modo_solicitado(request)
+        if modo is None or not await sync_to_async(hay_cupo)():
+            return await self.get_response(request)
+        if not _en_curso.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            return await self.aperfilar(request, modo)
+        finally:
+            _en_curso.release()
+
+    def perfilar(self, request, modo):
+        consultas = []
+        try:
+            perfil, stack = iniciar_perfil(consultas)
+        except ValueError:
+            return self.get_response(request)  # Otra herramienta de perfilado ya está activa
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            detener_perfil(perfil, stack)
+        return self.resultado(request, modo, response, time.perf_counter() - inicio, perfil, consultas)
+
+    async def aperfilar(self, request, modo):
+        consultas = []
+        try:
+            perfil, stack = await sync_to_async(iniciar_perfil)(consultas)
+        except ValueError:
+            return await self.get_response(request)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(detener_perfil)(perfil, stack)
+        duracion = time.perf_counter() - inicio
+        return await sync_to_async(self.resultado)(request, modo, response, duracion, perfil, consultas)  # Escribe archivos
+
+    def resultado(self, request, modo, response, duracion, perfil, consultas):
+        texto = reporte(request, response, duracion, perfil, consultas)
+        if modo == 'inline':
+            inline = HttpResponse(texto, content_type='text/plain; charset=utf-8')
+            inline['X-Profile-Status'] = response.status_code  # Estado de la respuesta original
+            return inline
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{nombre_ruta(request).replace('/', '_')}-{uuid4().hex[:8]}"
+        guardar(request, nombre, perfil, texto, consultas)
+        response['X-Profile-Id'] = nombre
+        return response
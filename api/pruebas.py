@@ -0,0 +1,17 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Caché de las pruebas: en memoria del proceso. Así las pruebas no leen ni escriben la caché en archivos
+# del servidor de desarrollo (BASE_DIR/cache) ni cambian sus sellos de versión.
+CACHES_PRUEBAS = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Ejecutor de `manage.py test` con la caché de las pruebas (TEST_RUNNER en settings.py)
+class PruebasRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches_pruebas = override_settings(CACHES=CACHES_PRUEBAS)
+        self.caches_pruebas.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_pruebas.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,51 @@
+from django.db.models import F
+from django.utils import timezone
+from .models import Proveedor, MovimientoPuntos
+from .ranking import sumar_ranking
+
+# Operaciones sobre el saldo de puntos de los proveedores. El saldo se modifica siempre con un
+# UPDATE atómico en la base de datos (F-expressions) y cada cambio queda registrado en
+# MovimientoPuntos. Deben llamarse dentro de transaction.atomic() junto con el registro que las origina.
+
+# Acredita puntos al proveedor por un registro de kilos
+def acreditar_puntos(proveedor_id, puntos, kilo=None):
+    Proveedor.objects.filter(id=proveedor_id).update(puntos_acumulados=F('puntos_acumulados') + puntos)
+    MovimientoPuntos.objects.create(proveedor_id=proveedor_id, puntos=puntos, tipo='K', kilo=kilo)
+
+# Acredita puntos a varios proveedores a la vez ({proveedor_id: puntos}): un UPDATE por proveedor
+# y un solo INSERT para los movimientos del libro
+def acreditar_puntos_agrupados(puntos_por_proveedor):
+    for proveedor_id, puntos in puntos_por_proveedor.items():
+        Proveedor.objects.filter(id=proveedor_id).update(puntos_acumulados=F('puntos_acumulados') + puntos)
+    MovimientoPuntos.objects.bulk_create([
+        MovimientoPuntos(proveedor_id=proveedor_id, puntos=puntos, tipo='K')
+        for proveedor_id, puntos in puntos_por_proveedor.items()
+    ])
+
+# Descuenta puntos solo si el saldo alcanza: la verificación y el descuento son la misma sentencia
+# (UPDATE ... WHERE puntos_acumulados >= puntos), por lo que dos canjes simultáneos no pueden gastar
+# el mismo saldo. Devuelve False si el proveedor no existe o no tiene puntos suficientes.
+def descontar_puntos(proveedor_id, puntos):
+    actualizados = Proveedor.objects.filter(id=proveedor_id, puntos_acumulados__gte=puntos).update(
+        puntos_acumulados=F('puntos_acumulados') - puntos
+    )
+    return actualizados == 1
+
+# Ajuste manual del saldo (negativo resta): un UPDATE atómico, que no deja el saldo por debajo de cero,
+# su movimiento en el libro y el ranking de puntos del mes (igual que lo recalcula reconstruir_ranking()).
+# Devuelve False si el proveedor no existe o el saldo no alcanza.
+def ajustar_puntos(proveedor_id, puntos):
+    actualizados = Proveedor.objects.filter(id=proveedor_id, puntos_acumulados__gte=max(-puntos, 0)).update(
+        puntos_acumulados=F('puntos_acumulados') + puntos
+    )
+    if actualizados != 1:
+        return False
+    movimiento = MovimientoPuntos.objects.create(proveedor_id=proveedor_id, puntos=puntos, tipo='A')
+    sumar_ranking(proveedor_id, movimiento.fecha, puntos=puntos)
+    return True
+
+# Registra en el libro el descuento correspondiente a una transacción de canje
+def registrar_canje(transaccion):
+    MovimientoPuntos.objects.create(
+        proveedor_id=transaccion.proveedor_id, puntos=-transaccion.puntos_utilizados, tipo='C', transaccion=transaccion
+    )
@@ -0,0 +1,104 @@
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from .kilos_mensuales import mes_de
+from .models import KiloProveedor, MovimientoPuntos, Proveedor, RankingProveedor
+from .renderizado import decimal_str
+
+# Ranking de proveedores por kilos entregados y por puntos, histórico y por mes. RankingProveedor se
+# mantiene de forma incremental: cada acreditación de kilos o canje suma su diferencia a la fila 'total'
+# y a la del mes con un UPDATE, dentro de la misma transaction.atomic() que el registro que la origina.
+# El top-N y la posición de un proveedor se leen con los índices (periodo, -valor, proveedor): el top-N
+# lee solo N entradas del índice y la posición cuenta las entradas por encima sin tocar la tabla, en lugar
+# de agregar KiloProveedor y ordenar todos los proveedores en cada solicitud.
+PERIODO_TOTAL = 'total'
+CRITERIOS_RANKING = ('kilos', 'puntos')
+RANKING_LIMITE = 10  # Proveedores del top-N por defecto
+RANKING_LIMITE_MAX = 100
+
+# Periodo mensual ('AAAA-MM') de una fecha, en la zona horaria del proyecto (igual que KiloMensualProveedor)
+def periodo_de(fecha):
+    return f'{mes_de(fecha):%Y-%m}'
+
+# Suma (o resta, con valores negativos) kilos y puntos al ranking histórico y al del mes de `fecha`
+def sumar_ranking(proveedor_id, fecha, kilos=0, puntos=0):
+    periodos = [PERIODO_TOTAL, periodo_de(fecha)]
+    filas = RankingProveedor.objects.filter(proveedor_id=proveedor_id, periodo__in=periodos)
+    cambios = {'kilos': F('kilos') + kilos, 'puntos': F('puntos') + puntos}
+    if filas.update(**cambios) == len(periodos):
+        return
+    existentes = set(filas.values_list('periodo', flat=True))
+    for periodo in periodos:
+        if periodo in existentes:
+            continue
+        try:
+            with transaction.atomic():  # Punto de guardado por si otro proceso crea la fila al mismo tiempo
+                RankingProveedor.objects.create(proveedor_id=proveedor_id, periodo=periodo, kilos=kilos, puntos=puntos)
+        except IntegrityError:
+            RankingProveedor.objects.filter(proveedor_id=proveedor_id, periodo=periodo).update(**cambios)
+
+# Recalcula el ranking desde cero: el histórico con el saldo de cada proveedor y los kilos de todos sus
+# registros, y cada mes con los kilos y el neto de MovimientoPuntos del mes
+def reconstruir_ranking():
+    filas = {}
+
+    def fila(proveedor_id, periodo):
+        clave = (proveedor_id, periodo)
+        if clave not in filas:
+            filas[clave] = RankingProveedor(proveedor_id=proveedor_id, periodo=periodo, kilos=Decimal('0'), puntos=0)
+        return filas[clave]
+
+    for proveedor_id, puntos in Proveedor.objects.values_list('id', 'puntos_acumulados'):
+        fila(proveedor_id, PERIODO_TOTAL).puntos = puntos
+    kilos = KiloProveedor.objects.annotate(month=TruncMonth('fecha')).values('proveedor_id', 'month').annotate(total=Sum('kilos')).order_by()
+    for total in kilos:
+        fila(total['proveedor_id'], PERIODO_TOTAL).kilos += total['total']
+        fila(total['proveedor_id'], f"{total['month']:%Y-%m}").kilos = total['total']
+    puntos = MovimientoPuntos.objects.annotate(month=TruncMonth('fecha')).values('proveedor_id', 'month').annotate(total=Sum('puntos')).order_by()
+    for total in puntos:
+        fila(total['proveedor_id'], f"{total['month']:%Y-%m}").puntos = total['total']
+
+    with transaction.atomic():
+        RankingProveedor.objects.all().delete()
+        creados = RankingProveedor.objects.bulk_create(filas.values(), batch_size=1000)
+    return len(creados)
+
+def _resultado(fila, posicion):
+    return {
+        'posicion': posicion,
+        'proveedor': fila['proveedor_id'],
+        'username': fila['proveedor__user__username'],
+        'kilos': decimal_str(fila['kilos']),
+        'puntos': fila['puntos'],
+    }
+
+# Los `limite` primeros proveedores del periodo según `criterio`. Los empates comparten posición (1, 2, 2, 4)
+def top(criterio, periodo=PERIODO_TOTAL, limite=RANKING_LIMITE):
+    filas = (
+        RankingProveedor.objects.filter(periodo=periodo)
+        .order_by(f'-{criterio}', 'proveedor_id')
+        .values('proveedor_id', 'proveedor__user__username', 'kilos', 'puntos')[:limite]
+    )
+    resultados = []
+    anterior = posicion = None
+    for indice, fila in enumerate(filas):
+        if fila[criterio] != anterior:
+            posicion = indice + 1
+        anterior = fila[criterio]
+        resultados.append(_resultado(fila, posicion))
+    return resultados
+
+# Posición del proveedor en el periodo según `criterio` (1 + proveedores con más); None si el proveedor no existe
+def posicion(proveedor_id, criterio, periodo=PERIODO_TOTAL):
+    fila = (
+        RankingProveedor.objects.filter(proveedor_id=proveedor_id, periodo=periodo)
+        .values('proveedor_id', 'proveedor__user__username', 'kilos', 'puntos').first()
+    )
+    if fila is None:  # Sin actividad en el periodo: cuenta como cero
+        username = Proveedor.objects.filter(id=proveedor_id).values_list('user__username', flat=True).first()
+        if username is None:
+            return None
+        fila = {'proveedor_id': proveedor_id, 'proveedor__user__username': username, 'kilos': Decimal('0'), 'puntos': 0}
+    por_encima = RankingProveedor.objects.filter(periodo=periodo, **{f'{criterio}__gt': fila[criterio]}).count()
+    return _resultado(fila, por_encima + 1)
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .exportaciones import CAMPOS_KILO, CAMPOS_TRANSACCION, fecha_iso
+from .imagenes import srcset_de_variantes
+from .models import Producto
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa el JSONRenderer de DRF
+    orjson = None
+
+# Camino rápido de las listas de mucho volumen (transacciones, kilos y productos). Las filas se leen con
+# .values() y se convierten con la misma representación que los serializadores (ids de las claves foráneas,
+# Decimal como cadena con sus decimales, fechas ISO 8601 con 'Z', URLs absolutas de las imágenes), sin
+# instanciar modelos ni campos de serializador. El JSON se escribe con orjson si está instalado; la salida
+# es idéntica byte a byte a la de JSONRenderer (ver RenderizadoRapidoTests).
+CENTAVOS = Decimal('0.01')  # Los DecimalField de estos modelos tienen decimal_places=2
+# Columnas que necesita cada constructor de filas, para pedirlas con .values()
+COLUMNAS_TRANSACCION = list(CAMPOS_TRANSACCION.values())
+COLUMNAS_KILO = list(CAMPOS_KILO.values())
+COLUMNAS_PRODUCTO = ['id', 'nombre', 'descripcion', 'precio', 'puntos_requeridos', 'tipo', 'imagen', 'imagen_variantes']
+
+# Igual que DecimalField de DRF (coerce_to_string): cuantizado a los decimales del campo, sin exponente
+def decimal_str(valor):
+    return None if valor is None else format(valor.quantize(CENTAVOS), 'f')
+
+def filas_transacciones(filas):
+    zona = timezone.get_current_timezone()
+    return [
+        {
+            'id': fila['id'], 'proveedor': fila['proveedor_id'], 'cliente': fila['cliente_id'], 'producto': fila['producto_id'],
+            'cantidad': fila['cantidad'], 'total': decimal_str(fila['total']), 'puntos_utilizados': fila['puntos_utilizados'],
+            'tipo': fila['tipo'], 'fecha': fecha_iso(fila['fecha'], zona) if fila['fecha'] else None,
+        }
+        for fila in filas
+    ]
+
+def filas_kilos(filas):
+    zona = timezone.get_current_timezone()
+    return [
+        {
+            'id': fila['id'], 'proveedor': fila['proveedor_id'], 'kilos': decimal_str(fila['kilos']),
+            'descripcion': fila['descripcion'], 'fecha': fecha_iso(fila['fecha'], zona) if fila['fecha'] else None,
+        }
+        for fila in filas
+    ]
+
+# Igual que ProductoSerializer: la imagen como URL (absoluta si hay request) y el srcset de los derivados
+def filas_productos(filas, request=None):
+    storage = Producto._meta.get_field('imagen').storage
+    resultado = []
+    for fila in filas:
+        imagen = None
+        if fila['imagen']:
+            imagen = storage.url(fila['imagen'])
+            if request is not None:
+                imagen = request.build_absolute_uri(imagen)
+        resultado.append({
+            'id': fila['id'], 'nombre': fila['nombre'], 'descripcion': fila['descripcion'], 'precio': decimal_str(fila['precio']),
+            'puntos_requeridos': fila['puntos_requeridos'], 'tipo': fila['tipo'], 'imagen': imagen,
+            'imagen_srcset': srcset_de_variantes(fila['imagen_variantes'], request),
+        })
+    return resultado
+
+def _no_soportado(valor):
+    raise TypeError(type(valor).__name__)
+
+# JSONRenderer que escribe con orjson. Los datos con tipos que orjson representa distinto que DRF (fechas,
+# Decimal, lazy strings), con indentación pedida o con COMPACT_JSON / UNICODE_JSON desactivados pasan al
+# JSONRenderer normal. orjson escribe los float en otro formato (1e16 y no 1e+16): solo usar en vistas
+# cuyos datos no tienen float.
+class JSONRapidoRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (data is None or orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            contenido = orjson.dumps(data, default=_no_soportado, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que JSONRenderer: U+2028 y U+2029 escapados para poder incrustar el JSON en JavaScript
+        return contenido.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
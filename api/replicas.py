@@ -0,0 +1,87 @@
+import random
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Lecturas desde réplicas (settings.REPLICAS_LECTURA, ver DJANGO_DB_REPLICAS en backend/settings.py). Solo
+# las solicitudes de lectura de las rutas de RUTAS_REPLICA (catálogo, historiales y sensores) leen de una
+# réplica, elegida al azar y la misma durante toda la solicitud. Todo lo demás usa la base principal:
+# las escrituras, las lecturas dentro de transaction.atomic() y cualquier lectura posterior a una escritura
+# en la misma solicitud, para que la solicitud vea lo que acaba de escribir aunque la réplica vaya atrasada.
+RUTAS_REPLICA = {
+    'productos-list', 'productos-detail',  # Catálogo
+    'transaccion-list', 'transaccion-detail', 'transaccion-export', 'kilos-list', 'kilo-detail', 'kilos-export',  # Historiales
+    'canjes_por_proveedor', 'kilos_intercambiados', 'ranking', 'ranking-proveedor',
+    'sensor_data_detail', 'dispositivos-list', 'dispositivos-estado', 'control-eventos',  # Sensores
+}
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+_estado = Local()  # Réplica de la solicitud en curso (contextvars: también en las vistas asíncronas)
+
+def replica_en_uso():
+    return getattr(_estado, 'replica', None)
+
+def usar_replica(replica):
+    _estado.replica = replica
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = replica_en_uso()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        usar_replica(None)  # El resto de la solicitud lee de la base principal
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Las réplicas tienen los mismos datos que la base principal
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'REPLICAS_LECTURA', ()):
+            return False  # Las réplicas reciben las tablas por replicación
+        return None
+
+# Las exportaciones consultan la base de datos mientras se envía la respuesta, después del middleware
+def _con_replica(contenido, replica):
+    usar_replica(replica)
+    try:
+        yield from contenido
+    finally:
+        usar_replica(None)
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        usar_replica(None)
+        response = self.get_response(request)
+        replica = replica_en_uso()
+        if replica is not None and response.streaming:
+            response.streaming_content = _con_replica(response.streaming_content, replica)
+        usar_replica(None)
+        return response
+
+    async def __acall__(self, request):
+        usar_replica(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            usar_replica(None)
+
+    # La ruta ya está resuelta: elegir la réplica si corresponde
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = getattr(settings, 'REPLICAS_LECTURA', ())
+        if replicas and request.method in METODOS_LECTURA and request.resolver_match.url_name in RUTAS_REPLICA:
+            usar_replica(random.choice(replicas))
+        return None
@@ -0,0 +1,147 @@
+from datetime import timedelta
+from django.db import router, transaction
+from django.db.models import Q, Sum, Min, Max, Count
+from django.db.models.functions import TruncMinute, TruncHour, TruncDay
+from django.utils import timezone
+from .models import SensorData, SensorRollup, RollupWatermark
+
+SENSOR_BUCKETS = {'1m': TruncMinute, '1h': TruncHour, '1d': TruncDay}  # Tamaños de cubeta admitidos en el historial
+SENSOR_ROLLUPS = ('1h', '1d')  # Cubetas materializadas en SensorRollup
+SENSOR_WATERMARK = 'sensor_rollup'  # Nombre del watermark del trabajo incremental
+ROLLUP_MARGEN_SEGUNDOS = 60  # Tiempo mínimo entre leer el id máximo y procesar las lecturas hasta ese id
+CAMPOS = ('temperature', 'humidity')
+
+# Inicio de la cubeta de 1h o 1d que contiene a `fecha`
+def inicio_cubeta(fecha, bucket):
+    inicio = fecha.replace(minute=0, second=0, microsecond=0)
+    return inicio.replace(hour=0) if bucket == '1d' else inicio
+
+DURACION_CUBETA = {'1h': timedelta(hours=1), '1d': timedelta(days=1)}
+
+# Agrega en SQL las lecturas crudas de un queryset por dispositivo y cubeta (mínimo, suma, máximo y cantidad)
+def agregar_crudas(lecturas, bucket):
+    agregados = {}
+    for campo in CAMPOS:
+        agregados[f'{campo}_min'] = Min(campo)
+        agregados[f'{campo}_max'] = Max(campo)
+        agregados[f'{campo}_sum'] = Sum(campo)
+    return (
+        lecturas.annotate(bucket=SENSOR_BUCKETS[bucket]('timestamp'))
+        .values('dispositivo_id', 'bucket')
+        .annotate(count=Count('id'), **agregados)
+        .order_by('bucket')
+    )
+
+COLUMNAS = ['count'] + [f'{campo}_{sufijo}' for campo in CAMPOS for sufijo in ('min', 'max', 'sum')]
+
+# Combina dos agregados (diccionarios) de la misma cubeta
+def combinar(destino, origen):
+    destino['count'] += origen['count']
+    for campo in CAMPOS:
+        destino[f'{campo}_min'] = min(destino[f'{campo}_min'], origen[f'{campo}_min'])
+        destino[f'{campo}_max'] = max(destino[f'{campo}_max'], origen[f'{campo}_max'])
+        destino[f'{campo}_sum'] += origen[f'{campo}_sum']
+
+# Id máximo de SensorData en este momento, que se procesará en una ejecución posterior
+def observar(watermark, ahora):
+    maximo = SensorData.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+    watermark.visto_id = max(maximo, watermark.ultimo_id)
+    watermark.visto_en = ahora
+
+# Procesa las lecturas nuevas desde el último watermark y actualiza los agregados por hora y por día.
+# En MySQL el id se asigna al insertar, no al confirmar: una transacción con un id menor puede confirmar
+# después que otra con uno mayor, y si el watermark ya pasó ese id la lectura no se agregaría nunca. Por eso
+# cada ejecución solo procesa hasta el id máximo que se leyó hace al menos `margen` (en una ejecución
+# anterior, o en esta si el margen es cero): para entonces ya confirmaron las inserciones en curso con un id
+# menor. Las lecturas todavía no procesadas se completan desde las crudas en serie_por_cubetas().
+def actualizar_rollups(margen=timedelta(seconds=ROLLUP_MARGEN_SEGUNDOS)):
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.get_or_create(nombre=SENSOR_WATERMARK)
+        watermark = RollupWatermark.objects.select_for_update().get(pk=watermark.pk)  # Evitar que dos ejecuciones procesen las mismas filas
+        ahora = timezone.now()
+        if watermark.visto_id <= watermark.ultimo_id or watermark.visto_en is None:
+            observar(watermark, ahora)
+        procesadas = 0
+        if watermark.visto_id > watermark.ultimo_id and watermark.visto_en <= ahora - margen:
+            procesadas = agregar_lecturas(watermark.ultimo_id, watermark.visto_id)
+            watermark.ultimo_id = watermark.visto_id
+            observar(watermark, ahora)  # Tope de la próxima ejecución
+        watermark.save(update_fields=['ultimo_id', 'visto_id', 'visto_en'])
+    return procesadas
+
+# Suma a los agregados las lecturas con id en (desde_id, hasta_id]
+def agregar_lecturas(desde_id, hasta_id):
+    nuevas = SensorData.objects.filter(id__gt=desde_id, id__lte=hasta_id)
+    procesadas = nuevas.count()
+    for resolucion in SENSOR_ROLLUPS:
+        agregados = {(fila['dispositivo_id'], fila['bucket']): fila for fila in agregar_crudas(nuevas, resolucion)}
+        existentes = SensorRollup.objects.filter(
+            resolucion=resolucion,
+            dispositivo_id__in={dispositivo_id for dispositivo_id, _ in agregados},
+            bucket__in={bucket for _, bucket in agregados},
+        )
+        actualizar = [rollup for rollup in existentes if (rollup.dispositivo_id, rollup.bucket) in agregados]
+        for rollup in actualizar:
+            fila = {columna: getattr(rollup, columna) for columna in COLUMNAS}
+            combinar(fila, agregados.pop((rollup.dispositivo_id, rollup.bucket)))  # Sumar las lecturas nuevas a la cubeta existente
+            for columna, valor in fila.items():
+                setattr(rollup, columna, valor)
+        SensorRollup.objects.bulk_update(actualizar, COLUMNAS, batch_size=1000)
+        SensorRollup.objects.bulk_create(
+            [SensorRollup(resolucion=resolucion, **fila) for fila in agregados.values()],
+            batch_size=1000,
+        )  # Cubetas que todavía no existían
+    return procesadas
+
+# Elimina las lecturas crudas más antiguas que la ventana de retención que ya fueron agregadas
+def compactar(retencion_dias):
+    limite = timezone.now() - timedelta(days=retencion_dias)
+    watermark = RollupWatermark.objects.filter(nombre=SENSOR_WATERMARK).values_list('ultimo_id', flat=True).first() or 0
+    eliminadas, _ = SensorData.objects.filter(timestamp__lt=limite, id__lte=watermark).delete()
+    return eliminadas
+
+# Devuelve la serie agregada por cubetas de las lecturas de un dispositivo con desde <= timestamp < hasta,
+# en todas las resoluciones. Para 1h y 1d lee de la tabla de agregados las cubetas que caen enteras en el
+# rango y completa con las lecturas crudas que todavía no procesó el trabajo incremental; las cubetas de los
+# extremos que `desde` o `hasta` cortan se calculan solo con las crudas del rango (las anteriores a la
+# retención ya no existen, como en la resolución de 1m). El
+# watermark, los agregados y las crudas se leen en una misma transacción (una sola instantánea en REPEATABLE
+# READ): si el trabajo incremental avanza entre las consultas, las lecturas que pasó a los agregados no se
+# cuentan dos veces.
+def serie_por_cubetas(dispositivo_id, desde, hasta, bucket):
+    if bucket not in SENSOR_ROLLUPS:
+        lecturas = SensorData.objects.filter(dispositivo_id=dispositivo_id, timestamp__gte=desde, timestamp__lt=hasta)
+        series = {fila['bucket']: fila for fila in agregar_crudas(lecturas, bucket)}
+    else:
+        inicio = inicio_cubeta(desde, bucket)
+        if inicio < desde:
+            inicio += DURACION_CUBETA[bucket]  # Primera cubeta entera dentro del rango
+        fin = inicio_cubeta(hasta, bucket)  # Las cubetas desde `fin` no terminan antes de `hasta`
+        with transaction.atomic(using=router.db_for_read(SensorRollup)):  # La réplica de la solicitud, si la hay
+            watermark = RollupWatermark.objects.filter(nombre=SENSOR_WATERMARK).values_list('ultimo_id', flat=True).first() or 0
+            series = {
+                fila['bucket']: fila
+                for fila in SensorRollup.objects.filter(
+                    dispositivo_id=dispositivo_id, resolucion=bucket, bucket__gte=inicio, bucket__lt=fin
+                ).values('bucket', *COLUMNAS)
+            }
+            pendientes = SensorData.objects.filter(dispositivo_id=dispositivo_id, timestamp__gte=desde, timestamp__lt=hasta).filter(
+                Q(id__gt=watermark) | Q(timestamp__lt=inicio) | Q(timestamp__gte=fin)
+            )  # Sin agregar todavía o en una cubeta cortada por el rango
+            for fila in agregar_crudas(pendientes, bucket):
+                if fila['bucket'] in series:
+                    combinar(series[fila['bucket']], fila)
+                else:
+                    series[fila['bucket']] = fila
+
+    results = []
+    for clave in sorted(series):
+        fila = series[clave]
+        resultado = {'timestamp': clave}
+        for campo in CAMPOS:
+            resultado[f'{campo}_min'] = fila[f'{campo}_min']
+            resultado[f'{campo}_avg'] = fila[f'{campo}_sum'] / fila['count']
+            resultado[f'{campo}_max'] = fila[f'{campo}_max']
+        resultado['count'] = fila['count']
+        results.append(resultado)
+    return results
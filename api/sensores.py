@@ -0,0 +1,172 @@
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from functools import wraps
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .control import procesar_lecturas
+from .dispositivos import (codigo_solicitado, estado_servo_async, guardar_estado_servo_async, guardar_ultimas_lecturas_async,
+                           obtener_dispositivo_id_async, ultima_lectura_async)
+from .downsampling import lttb_indices
+from .models import Dispositivo, SensorData, ServoMotorState
+from .rollups import SENSOR_BUCKETS, serie_por_cubetas
+from .serializers import SensorReadingSerializer, SensorSerializer, ServoSerializer
+from .servo_stream import publicar_estado_servo_async
+from .views import parse_fecha
+
+# Vistas de los dispositivos (lecturas del sensor y servomotor) como vistas asíncronas de Django con el ORM
+# y la caché asíncronos. Bajo ASGI no ocupan un hilo mientras esperan a la base de datos o a la caché, y un
+# dispositivo con red lenta solo ocupa una conexión abierta: el cuerpo de la solicitud se recibe en el event
+# loop antes de llamar a la vista. Bajo WSGI funcionan igual (Django las ejecuta con async_to_sync).
+# Responden lo mismo que las vistas @api_view que reemplazan: mismos códigos, mismo JSON (JSONRenderer de DRF)
+# y la validación de los serializadores, que no consulta la base de datos.
+SENSOR_BATCH_MAX_SIZE = 5000  # Máximo de lecturas aceptadas por lote
+SENSOR_BULK_BATCH_SIZE = 1000  # Filas por sentencia INSERT en bulk_create
+SENSOR_MAX_POINTS = 5000  # Máximo de puntos que puede pedir el modo LTTB
+
+def respuesta(datos, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(datos), status=status, content_type='application/json')
+
+# Como @api_view para una vista asíncrona: métodos permitidos (405 si no), sin CSRF y request.data con los parsers de DRF
+def vista_dispositivo(metodos):
+    def decorador(vista):
+        @csrf_exempt
+        @wraps(vista)
+        async def envoltura(request, *args, **kwargs):
+            if request.method not in metodos:
+                response = respuesta({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+                response['Allow'] = ', '.join(metodos)
+                return response
+            drf_request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+            try:
+                request.data = drf_request.data if request.method not in ('GET', 'HEAD') else {}
+            except (ParseError, UnsupportedMediaType) as error:
+                return respuesta({'detail': error.detail}, status=error.status_code)
+            return await vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
+
+# Vista para obtener y actualizar el estado del servomotor de un dispositivo (?dispositivo=, por defecto la compostera principal).
+# Se mantiene para el firmware que consulta periódicamente; el firmware nuevo puede usar servo_motor_state/stream/.
+@vista_dispositivo(['GET', 'PUT'])
+async def servo_motor_state_detail(request):
+    try:
+        dispositivo_id = await obtener_dispositivo_id_async(codigo_solicitado(request))
+    except Dispositivo.DoesNotExist:
+        return respuesta({'error': 'Dispositivo no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return respuesta(await estado_servo_async(dispositivo_id))  # Devolver el estado del servomotor (desde la caché)
+
+    serializer = ServoSerializer(data=request.data)
+    if not serializer.is_valid():
+        return respuesta(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    servo_motor_state, _ = await ServoMotorState.objects.aget_or_create(dispositivo_id=dispositivo_id)  # Obtener el estado del servomotor (o crearlo si no existe)
+    estado_anterior = servo_motor_state.is_active
+    servo_motor_state.is_active = serializer.validated_data.get('is_active', estado_anterior)
+    await servo_motor_state.asave()
+    await guardar_estado_servo_async(servo_motor_state)  # Actualizar la caché del estado actual
+    datos = ServoSerializer(servo_motor_state).data
+    if servo_motor_state.is_active != estado_anterior:
+        await publicar_estado_servo_async(dispositivo_id, datos)  # Enviar el nuevo estado a los dispositivos conectados por SSE
+    return respuesta(datos)  # Devolver los datos del estado del servomotor actualizado
+
+# Vista para obtener la última lectura del sensor de un dispositivo y registrar una nueva (?dispositivo=)
+@vista_dispositivo(['GET', 'PUT'])
+async def sensor_data_detail(request):
+    try:
+        dispositivo_id = await obtener_dispositivo_id_async(codigo_solicitado(request))
+    except Dispositivo.DoesNotExist:
+        return respuesta({'error': 'Dispositivo no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET' and any(param in request.GET for param in ('from', 'to', 'bucket', 'points')):
+        return await sensor_history(request, dispositivo_id)  # Consulta por rango de fechas
+
+    ultima = await ultima_lectura_async(dispositivo_id)  # Obtener la lectura más reciente desde la caché (None si no hay lecturas)
+
+    if request.method == 'GET':
+        if ultima is None:
+            return respuesta({'error': 'El dispositivo todavía no tiene lecturas.'}, status=status.HTTP_404_NOT_FOUND)
+        return respuesta({'temperature': ultima['temperature'], 'humidity': ultima['humidity']})  # Devolver los datos del sensor
+
+    serializer = SensorSerializer(data=request.data, partial=ultima is not None)  # La primera lectura debe traer todos los campos
+    if not serializer.is_valid():
+        return respuesta(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    # Agregar una nueva lectura al historial; los campos no enviados conservan el valor de la última lectura
+    lectura = {campo: ultima[campo] for campo in ('temperature', 'humidity') if ultima} | serializer.validated_data
+    sensor_data = await SensorData.objects.acreate(dispositivo_id=dispositivo_id, **lectura)
+    await procesar_lecturas(dispositivo_id, [sensor_data])  # Control automático del servomotor
+    await guardar_ultimas_lecturas_async([sensor_data])  # Actualizar la caché de la última lectura
+    return respuesta(SensorSerializer(sensor_data).data)  # Devolver los datos del sensor registrados
+
+# Historial del sensor de un dispositivo entre ?from= y ?to=, agregado por cubetas en la base de datos
+# (?bucket=1m|1h|1d) y opcionalmente reducido con LTTB (?points=N, sobre ?field=temperature|humidity)
+async def sensor_history(request, dispositivo_id):
+    params = request.GET
+    bucket = params.get('bucket')
+    field = params.get('field', 'temperature')
+    try:
+        hasta = parse_fecha(params['to']) if 'to' in params else timezone.now()
+        desde = parse_fecha(params['from']) if 'from' in params else hasta - timedelta(days=1)
+        points = int(params['points']) if 'points' in params else None
+    except ValueError:
+        return respuesta({'error': 'Parámetros from, to o points inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if bucket is not None and bucket not in SENSOR_BUCKETS:
+        return respuesta({'error': f'bucket debe ser uno de: {", ".join(SENSOR_BUCKETS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+    if field not in ('temperature', 'humidity'):
+        return respuesta({'error': 'field debe ser temperature o humidity.'}, status=status.HTTP_400_BAD_REQUEST)
+    if points is not None and not 3 <= points <= SENSOR_MAX_POINTS:
+        return respuesta({'error': f'points debe estar entre 3 y {SENSOR_MAX_POINTS}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if bucket:
+        # Agregados por cubeta (desde los rollups cuando es posible); combina varias consultas, en un solo salto al hilo del ORM
+        results = await sync_to_async(serie_por_cubetas)(dispositivo_id, desde, hasta, bucket)
+        serie = f'{field}_avg'
+    else:
+        lecturas = SensorData.objects.filter(dispositivo_id=dispositivo_id, timestamp__gte=desde, timestamp__lt=hasta)
+        results = [fila async for fila in lecturas.order_by('timestamp').values('timestamp', 'temperature', 'humidity')]
+        serie = field
+
+    if points is not None:
+        # Reducir la serie a como máximo `points` puntos conservando su forma
+        seleccion = lttb_indices([(fila['timestamp'].timestamp(), fila[serie]) for fila in results], points)
+        results = [results[i] for i in seleccion]
+
+    return respuesta({
+        'from': desde,
+        'to': hasta,
+        'bucket': bucket,
+        'results': results,
+    })  # Devolver la serie del rango solicitado
+
+# Vista para registrar un lote de lecturas del sensor de un dispositivo (?dispositivo=) con una sola inserción
+@vista_dispositivo(['POST'])
+async def sensor_data_batch(request):
+    try:
+        dispositivo_id = await obtener_dispositivo_id_async(codigo_solicitado(request))
+    except Dispositivo.DoesNotExist:
+        return respuesta({'error': 'Dispositivo no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+
+    lecturas = request.data.get('readings') if isinstance(request.data, dict) else request.data  # Aceptar una lista o {"readings": [...]}
+    if not isinstance(lecturas, list) or not lecturas:
+        return respuesta({'error': 'Se requiere una lista de lecturas.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(lecturas) > SENSOR_BATCH_MAX_SIZE:
+        return respuesta({'error': f'El lote no puede superar {SENSOR_BATCH_MAX_SIZE} lecturas.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = SensorReadingSerializer(data=lecturas, many=True)
+    if not serializer.is_valid():
+        return respuesta(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    registros = await SensorData.objects.abulk_create(
+        [SensorData(dispositivo_id=dispositivo_id, **lectura) for lectura in serializer.validated_data],
+        batch_size=SENSOR_BULK_BATCH_SIZE,
+    )  # Insertar todas las lecturas en una sola consulta
+    await procesar_lecturas(dispositivo_id, registros)  # Control automático del servomotor
+    await guardar_ultimas_lecturas_async(registros)  # Actualizar la caché de la última lectura
+    return respuesta({'created': len(registros)}, status=status.HTTP_201_CREATED)  # Devolver la cantidad de lecturas registradas
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Proveedor, Cliente, Producto, Transaccion, KiloProveedor, Configuracion, SensorData, ServoMotorState
+from .models import Proveedor, Cliente, Producto, Transaccion, KiloProveedor, Configuracion, SensorData, ServoMotorState, Dispositivo, UmbralControl, EventoControl
+from .imagenes import srcset
 from django.contrib.auth.models import User
 
 # Serializador para el modelo de usuario de Django.
@@ -10,9 +11,12 @@ class UserSerializer(serializers.ModelSerializer):
 
 # Serializador para el modelo Proveedor.
 class ProveedorSerializer(serializers.ModelSerializer):
+    ajuste_puntos = serializers.IntegerField(write_only=True, required=False)  # Puntos a sumar (o restar) al saldo como ajuste del libro.
+
     class Meta:
         model = Proveedor
-        fields = ['id', 'user', 'puntos_acumulados']  # Campos a serializar del modelo Proveedor.
+        fields = ['id', 'user', 'puntos_acumulados', 'ajuste_puntos']  # Campos a serializar del modelo Proveedor.
+        read_only_fields = ['puntos_acumulados']  # El saldo solo cambia con UPDATE atómicos que quedan en el libro (api/puntos.py).
 
 # Serializador para el modelo Cliente.
 class ClienteSerializer(serializers.ModelSerializer):
@@ -22,9 +26,14 @@ class ClienteSerializer(serializers.ModelSerializer):
 
 # Serializador para el modelo Producto.
 class ProductoSerializer(serializers.ModelSerializer):
+    imagen_srcset = serializers.SerializerMethodField()  # URLs de las versiones reducidas de la imagen (miniatura y tarjeta).
+
     class Meta:
         model = Producto
-        fields = ['id', 'nombre', 'descripcion', 'precio', 'puntos_requeridos', 'tipo', 'imagen']  # Campos a serializar del modelo Producto.
+        fields = ['id', 'nombre', 'descripcion', 'precio', 'puntos_requeridos', 'tipo', 'imagen', 'imagen_srcset']  # Campos a serializar del modelo Producto.
+
+    def get_imagen_srcset(self, obj):
+        return srcset(obj, self.context.get('request'))
 
 # Serializador para el modelo Transaccion.
 class TransaccionSerializer(serializers.ModelSerializer):
@@ -38,6 +47,27 @@ class KiloProveedorSerializer(serializers.ModelSerializer):
         model = KiloProveedor
         fields = ['id', 'proveedor', 'kilos', 'descripcion', 'fecha']  # Campos a serializar del modelo KiloProveedor.
 
+# Campo de proveedor que busca primero en los proveedores precargados en el contexto ({id: Proveedor}),
+# para validar un lote completo sin una consulta por registro.
+class ProveedorPrecargadoField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        proveedores = self.context.get('proveedores')
+        if proveedores is None:
+            return super().to_internal_value(data)
+        try:
+            return proveedores[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+# Serializador para los registros de kilos enviados en lote.
+class KiloProveedorLoteSerializer(KiloProveedorSerializer):
+    proveedor = ProveedorPrecargadoField(queryset=Proveedor.objects.all())
+
+    class Meta(KiloProveedorSerializer.Meta):
+        pass
+
 # Serializador para el modelo Configuracion.
 class ConfiguracionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,9 +79,54 @@ class SensorSerializer(serializers.ModelSerializer):
     class Meta:
         model = SensorData
         fields = ['temperature', 'humidity']  # Campos a serializar del modelo SensorData.
+        extra_kwargs = {'temperature': {'required': True}, 'humidity': {'required': True}}  # Las siguientes lecturas pueden enviar solo uno (partial)
+
+# Serializador para las lecturas con fecha enviadas en lote por los dispositivos.
+class SensorReadingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SensorData
+        fields = ['temperature', 'humidity', 'timestamp']  # El timestamp es opcional, por defecto la hora del servidor.
 
 # Serializador para el modelo ServoMotorState.
 class ServoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServoMotorState
         fields = ['is_active']  # Campo a serializar del modelo ServoMotorState.
+
+# Serializador para el modelo Dispositivo.
+class DispositivoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Dispositivo
+        fields = ['id', 'codigo', 'nombre', 'fecha_registro']  # Campos a serializar del modelo Dispositivo.
+
+# Serializador para los umbrales del control automático del servomotor.
+class UmbralControlSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UmbralControl
+        fields = ['id', 'dispositivo', 'variable', 'encender', 'apagar', 'alpha', 'sigmas_anomalia', 'activo']  # Campos a serializar del modelo UmbralControl.
+
+    def validate(self, data):
+        encender = data.get('encender', getattr(self.instance, 'encender', None))
+        apagar = data.get('apagar', getattr(self.instance, 'apagar', None))
+        if encender == apagar:
+            raise serializers.ValidationError('encender y apagar deben ser distintos.')  # Sin histéresis el servomotor oscilaría con cada lectura
+        if not 0 < data.get('alpha', getattr(self.instance, 'alpha', 0.2)) <= 1:
+            raise serializers.ValidationError({'alpha': 'Debe estar entre 0 (sin incluir) y 1.'})
+        if data.get('sigmas_anomalia', getattr(self.instance, 'sigmas_anomalia', 4.0)) <= 0:
+            raise serializers.ValidationError({'sigmas_anomalia': 'Debe ser mayor que cero.'})
+        # La restricción única no aplica a los umbrales de todos los dispositivos (dispositivo vacío)
+        dispositivo = data.get('dispositivo', getattr(self.instance, 'dispositivo', None))
+        variable = data.get('variable', getattr(self.instance, 'variable', None))
+        if dispositivo is None:
+            repetidos = UmbralControl.objects.filter(dispositivo__isnull=True, variable=variable)
+            if self.instance is not None:
+                repetidos = repetidos.exclude(id=self.instance.id)
+            if repetidos.exists():
+                raise serializers.ValidationError(f'Ya existe un umbral de {variable} para todos los dispositivos.')
+        return data
+
+# Serializador para los eventos del control automático.
+class EventoControlSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventoControl
+        fields = ['id', 'dispositivo', 'tipo', 'variable', 'valor', 'media', 'desviacion', 'fecha']  # Campos a serializar del modelo EventoControl.
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from uuid import uuid4
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from .dispositivos import codigo_solicitado, obtener_dispositivo_id_async
+from .models import Dispositivo, ServoMotorState
+
+# Entrega del estado del servomotor por Server-Sent Events (SSE) bajo ASGI: el dispositivo mantiene
+# la conexión abierta y solo recibe un evento cuando el estado cambia, en lugar de consultar
+# servo_motor_state_detail continuamente.
+SERVO_KEEPALIVE_SEGUNDOS = 15  # Intervalo de los comentarios keepalive (y de la verificación entre workers)
+SERVO_VERSION_KEY = 'servo:version:{}'  # Sello de versión por dispositivo en la caché compartida para avisar a otros workers
+
+# Pub/sub en memoria del proceso por dispositivo: cada suscriptor tiene una cola de un solo elemento con el último estado
+class ServoBroker:
+    def __init__(self):
+        self._suscriptores = {}  # dispositivo_id -> {(loop, cola)}
+
+    def suscribir(self, dispositivo_id):
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue(maxsize=1))
+        self._suscriptores.setdefault(dispositivo_id, set()).add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, dispositivo_id, suscripcion):
+        self._suscriptores.get(dispositivo_id, set()).discard(suscripcion)
+
+    # Puede llamarse desde cualquier hilo (las vistas síncronas corren en un hilo aparte bajo ASGI)
+    def publicar(self, dispositivo_id, estado):
+        for loop, cola in list(self._suscriptores.get(dispositivo_id, ())):
+            loop.call_soon_threadsafe(self._reemplazar, cola, estado)
+
+    @staticmethod
+    def _reemplazar(cola, estado):
+        if cola.full():
+            cola.get_nowait()  # Solo importa el estado más reciente
+        cola.put_nowait(estado)
+
+broker = ServoBroker()
+
+# Avisa a los suscriptores de este proceso y, mediante la caché compartida, a los de los demás workers
+def publicar_estado_servo(dispositivo_id, estado):
+    cache.set(SERVO_VERSION_KEY.format(dispositivo_id), uuid4().hex, None)
+    broker.publicar(dispositivo_id, estado)
+
+async def publicar_estado_servo_async(dispositivo_id, estado):
+    await cache.aset(SERVO_VERSION_KEY.format(dispositivo_id), uuid4().hex, None)
+    broker.publicar(dispositivo_id, estado)
+
+# Estado actual del servomotor leído con el ORM asíncrono
+async def leer_estado_servo(dispositivo_id):
+    servo_motor_state = await ServoMotorState.objects.filter(dispositivo_id=dispositivo_id).afirst()
+    return {'is_active': servo_motor_state.is_active if servo_motor_state else False}
+
+def evento(estado):
+    return f'data: {json.dumps(estado)}\n\n'
+
+# Vista asíncrona que mantiene la conexión abierta y envía el estado del servomotor del dispositivo
+# (?dispositivo=) solo cuando cambia
+async def servo_motor_state_stream(request):
+    try:
+        dispositivo_id = await obtener_dispositivo_id_async(codigo_solicitado(request))
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'error': 'Dispositivo no encontrado.'}, status=404)
+    clave_version = SERVO_VERSION_KEY.format(dispositivo_id)
+
+    async def eventos():
+        suscripcion = broker.suscribir(dispositivo_id)
+        _, cola = suscripcion
+        try:
+            version = await cache.aget(clave_version)
+            ultimo = await leer_estado_servo(dispositivo_id)
+            yield evento(ultimo)  # Estado inicial al conectarse
+            while True:
+                try:
+                    estado = await asyncio.wait_for(cola.get(), timeout=SERVO_KEEPALIVE_SEGUNDOS)
+                    version = await cache.aget(clave_version)
+                except asyncio.TimeoutError:
+                    # Sin eventos locales: revisar si otro worker cambió el estado
+                    nueva_version = await cache.aget(clave_version)
+                    if nueva_version == version:
+                        yield ': keepalive\n\n'
+                        continue
+                    version = nueva_version
+                    estado = await leer_estado_servo(dispositivo_id)
+                if estado != ultimo:
+                    ultimo = estado
+                    yield evento(estado)
+        finally:
+            broker.desuscribir(dispositivo_id, suscripcion)
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Evitar que un proxy (nginx) acumule los eventos
+    return response
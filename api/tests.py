@@ -1,3 +1,1321 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from decimal import Decimal
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.core.cache import cache
+from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from unittest import skipUnless
+from unittest import mock
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from . import exportaciones
+from . import authentication, control, dispositivos, imagenes, metricas, renderizado, servo_stream
+from .benchmark import ESCENARIOS, comparar_conexiones, preparar_contexto, rutas_sin_escenario
+from .configuracion import invalidar_configuracion
+from .datos_sinteticos import sembrar
+from .kilos_mensuales import mes_de, reconstruir_kilos_mensuales
+from .downsampling import lttb_indices
+from .perfilado import crear_token
+from .puntos import descontar_puntos
+from .serializers import KiloProveedorSerializer, ProductoSerializer, TransaccionSerializer
+from .models import Cliente, Proveedor, Producto, Transaccion, KiloProveedor, KiloMensualProveedor, MovimientoPuntos, Configuracion, RankingProveedor, Dispositivo, EstadoControlDispositivo, RollupWatermark, SensorData, SensorRollup, ServoMotorState, UmbralControl, EventoControl
+from .clientes import clientes_que_coinciden
+from .ranking import periodo_de, reconstruir_ranking
+from .replicas import ReplicaMiddleware, ReplicaRouter
+from .rollups import ROLLUP_MARGEN_SEGUNDOS, SENSOR_ROLLUPS, actualizar_rollups, compactar, serie_por_cubetas
+from .servo_stream import broker
 
-# Create your tests here.
+
+# Pruebas de canjes_por_proveedor: paginación por cursor y cantidad de consultas constante
+class CanjesPorProveedorTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='proveedor', password='secreto')
+        self.proveedor = Proveedor.objects.create(user=self.user)
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='', puntos_requeridos=10, tipo='C')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def crear_canjes(self, cantidad):
+        Transaccion.objects.bulk_create([
+            Transaccion(proveedor=self.proveedor, producto=self.productos[i % 3], cantidad=1, puntos_utilizados=10, tipo='C')
+            for i in range(cantidad)
+        ])
+
+    def contar_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/canjes_por_proveedor/', {'limit': 500})
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def test_consultas_constantes_sin_importar_la_cantidad_de_canjes(self):
+        self.crear_canjes(2)
+        pocas = self.contar_consultas()
+        self.crear_canjes(200)
+        muchas = self.contar_consultas()
+        self.assertEqual(pocas, muchas)
+
+    def test_forma_de_la_respuesta_y_paginacion(self):
+        self.crear_canjes(5)
+        response = self.client.get('/api/canjes_por_proveedor/', {'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        primero = response.data['results'][0]
+        self.assertEqual(primero['proveedor'], self.proveedor.id)
+        self.assertEqual(set(primero['producto']), {'id', 'nombre', 'descripcion', 'precio', 'puntos_requeridos', 'tipo', 'imagen', 'imagen_srcset'})
+
+        ids = [fila['id'] for fila in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [fila['id'] for fila in response.data['results']]
+        self.assertEqual(ids, sorted(Transaccion.objects.values_list('id', flat=True), reverse=True))
+
+
+# Pruebas de la paginación por cursor en las listas: más recientes primero, sin repetir ni saltar filas
+# aunque se inserten registros mientras se recorren las páginas
+class PaginacionCursorTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor'))
+        self.producto = Producto.objects.create(nombre='Abono', descripcion='', precio='5', tipo='V')
+        self.crear = {
+            '/api/proveedores/': lambda i: Proveedor.objects.create(user=User.objects.create_user(username=f'p{i}')),
+            '/api/clientes/': lambda i: Cliente.objects.create(nombre='Ana', apellidos=f'Pérez {i}', dni=f'{i:08d}', ubicacion='Lima'),
+            '/api/productos/': lambda i: Producto.objects.create(nombre=f'Producto {i}', descripcion='', precio='1', tipo='V'),
+            '/api/kilos/': lambda i: KiloProveedor.objects.create(proveedor=self.proveedor, kilos='1.00'),
+            '/api/transacciones/': lambda i: Transaccion.objects.create(producto=self.producto, cantidad=1, total='5', tipo='V'),
+        }
+        for crear in self.crear.values():
+            for i in range(5):
+                crear(i)
+
+    def test_orden_estable_entre_paginas(self):
+        for url, crear in self.crear.items():
+            with self.subTest(url=url):
+                pagina = self.client.get(url, {'limit': 2}).json()
+                ids = [fila['id'] for fila in pagina['results']]
+                todos = [fila['id'] for fila in self.client.get(url, {'limit': 500}).json()['results']]
+                crear(100)  # Un registro nuevo no desplaza las páginas siguientes
+                while pagina['next']:
+                    pagina = self.client.get(pagina['next']).json()
+                    ids += [fila['id'] for fila in pagina['results']]
+                self.assertEqual(ids, todos)
+                self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_limite_maximo(self):
+        for i in range(5, 12):
+            self.crear['/api/kilos/'](i)
+        with mock.patch('api.pagination.KeysetPagination.max_page_size', 10):
+            self.assertEqual(len(self.client.get('/api/kilos/', {'limit': 1000}).json()['results']), 10)
+
+# Pruebas del libro de puntos en canjear_puntos y kilos_list_create
+class LibroPuntosTests(APITestCase):
+    def setUp(self):
+        self.proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor', password='secreto'))
+        self.producto = Producto.objects.create(nombre='Abono', descripcion='', puntos_requeridos=10, tipo='C')
+        invalidar_configuracion()  # No reutilizar la configuración en memoria de otra prueba
+
+    def test_kilos_acreditan_puntos_y_registran_movimiento(self):
+        response = self.client.post('/api/kilos/', {'proveedor': self.proveedor.id, 'kilos': '2.50'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.proveedor.refresh_from_db()
+        self.assertEqual(self.proveedor.puntos_acumulados, 200)  # 2 kilos enteros x tasa de conversión por defecto
+        self.assertEqual(MovimientoPuntos.objects.get().puntos, 200)
+
+    def test_canje_sin_saldo_no_descuenta(self):
+        self.proveedor.puntos_acumulados = 15
+        self.proveedor.save()
+        datos = {'proveedor_id': self.proveedor.id, 'producto_id': self.producto.id, 'cantidad': 2}
+        response = self.client.post('/api/canjear_puntos/', datos, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.proveedor.refresh_from_db()
+        self.assertEqual(self.proveedor.puntos_acumulados, 15)
+        self.assertFalse(Transaccion.objects.exists())
+
+        datos['cantidad'] = 1
+        response = self.client.post('/api/canjear_puntos/', datos, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.proveedor.refresh_from_db()
+        self.assertEqual(self.proveedor.puntos_acumulados, 5)
+        self.assertEqual(MovimientoPuntos.objects.get().transaccion_id, response.data['id'])
+
+    def test_proveedor_inexistente(self):
+        response = self.client.post('/api/canjear_puntos/', {'proveedor_id': 999, 'producto_id': self.producto.id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_producto_sin_precio_en_puntos(self):
+        producto = Producto.objects.create(nombre='Sin precio', descripcion='', tipo='C')
+        response = self.client.post('/api/canjear_puntos/', {'proveedor_id': self.proveedor.id, 'producto_id': producto.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_descuento_condicional_sin_saldo(self):
+        Proveedor.objects.filter(id=self.proveedor.id).update(puntos_acumulados=15)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertFalse(descontar_puntos(self.proveedor.id, 20))
+        self.assertEqual(len(consultas), 1)  # La verificación del saldo es parte del mismo UPDATE
+        self.assertRegex(consultas[0]['sql'], r'puntos_acumulados\W* >= 20')
+        response = self.client.post('/api/canjear_puntos/', {'proveedor_id': self.proveedor.id, 'producto_id': self.producto.id, 'cantidad': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Proveedor.objects.get(id=self.proveedor.id).puntos_acumulados, 15)
+        self.assertFalse(MovimientoPuntos.objects.exists())
+        self.assertTrue(descontar_puntos(self.proveedor.id, 15))
+        self.assertEqual(Proveedor.objects.get(id=self.proveedor.id).puntos_acumulados, 0)
+
+    def test_saldo_solo_cambia_con_ajustes_del_libro(self):
+        url = f'/api/proveedores/{self.proveedor.id}/'
+        response = self.client.patch(url, {'puntos_acumulados': 1000}, format='json')
+        self.assertEqual((response.status_code, response.data['puntos_acumulados']), (200, 0))  # Solo lectura
+        response = self.client.patch(url, {'ajuste_puntos': 50}, format='json')
+        self.assertEqual(response.data['puntos_acumulados'], 50)
+        response = self.client.patch(url, {'ajuste_puntos': -80}, format='json')
+        self.assertEqual(response.status_code, 400)  # El saldo no puede quedar negativo
+        self.assertEqual(list(MovimientoPuntos.objects.values_list('tipo', 'puntos')), [('A', 50)])
+        user = User.objects.create_user(username='nuevo')
+        response = self.client.post('/api/proveedores/', {'user': user.id, 'ajuste_puntos': 30}, format='json')
+        self.assertEqual((response.status_code, response.data['puntos_acumulados']), (201, 30))
+        self.assertEqual(MovimientoPuntos.objects.get(proveedor_id=response.data['id']).tipo, 'A')
+
+    def test_saldos_iniciales_en_el_libro(self):
+        migracion = importlib.import_module('api.migrations.0014_movimientopuntos_ajuste')
+        Proveedor.objects.filter(id=self.proveedor.id).update(puntos_acumulados=70)  # Saldo anterior al libro
+        MovimientoPuntos.objects.create(proveedor=self.proveedor, puntos=20, tipo='K')
+        Proveedor.objects.create(user=User.objects.create_user(username='sin-saldo'))
+        migracion.registrar_saldos_iniciales(django_apps, None)
+        self.assertEqual(list(MovimientoPuntos.objects.filter(tipo='A').values_list('proveedor_id', 'puntos')), [(self.proveedor.id, 50)])
+        self.assertEqual(MovimientoPuntos.objects.aggregate(total=Sum('puntos'))['total'], 70)
+
+
+# Pruebas de los totales mensuales de kilos: el mantenimiento incremental debe coincidir con la reconstrucción
+class KilosMensualesTests(APITestCase):
+    def setUp(self):
+        invalidar_configuracion()
+        self.user = User.objects.create_user(username='proveedor')
+        self.proveedor = Proveedor.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def totales(self):
+        return list(KiloMensualProveedor.objects.filter(registros__gt=0).order_by('proveedor_id', 'mes').values_list('proveedor_id', 'mes', 'total_kilos', 'registros'))
+
+    def test_incremental_igual_a_la_reconstruccion(self):
+        otro = Proveedor.objects.create(user=User.objects.create_user(username='otro'))
+        ids = [self.client.post('/api/kilos/', {'proveedor': self.proveedor.id, 'kilos': kilos}, format='json').data['id'] for kilos in ('2.50', '1.25', '4.00')]
+        self.client.post('/api/kilos/batch/', [{'proveedor': otro.id, 'kilos': '3.00'}, {'proveedor': self.proveedor.id, 'kilos': '0.75'}], format='json')
+        self.client.patch(f'/api/kilos/{ids[0]}/', {'kilos': '5.00'}, format='json')
+        self.client.patch(f'/api/kilos/{ids[1]}/', {'proveedor': otro.id}, format='json')  # Pasa al total del otro proveedor
+        self.client.delete(f'/api/kilos/{ids[2]}/')
+        incrementales = self.totales()
+        self.assertEqual(sum(fila[3] for fila in incrementales), 4)
+        reconstruir_kilos_mensuales()
+        self.assertEqual(self.totales(), incrementales)
+
+    def test_kilos_intercambiados_por_mes(self):
+        mes = mes_de(timezone.now())
+        anterior = (mes - timedelta(days=1)).replace(day=1)
+        KiloMensualProveedor.objects.create(proveedor=self.proveedor, mes=anterior, total_kilos=0, registros=0)  # Mes sin registros
+        self.client.post('/api/kilos/', {'proveedor': self.proveedor.id, 'kilos': '2.50'}, format='json')
+        self.client.post('/api/kilos/', {'proveedor': self.proveedor.id, 'kilos': '1.50'}, format='json')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/kilos_intercambiados/')
+        self.assertEqual(response.json(), [{'month': f'{mes:%Y-%m}', 'total_kilos': 4.0}])
+        self.assertEqual(len(consultas), 2)  # Proveedor del usuario y totales ya calculados
+
+# Pruebas del registro de kilos en lote: todo o nada, resultado por registro y consultas independientes del tamaño
+class KilosLoteTests(APITestCase):
+    def setUp(self):
+        invalidar_configuracion()
+        self.proveedores = [Proveedor.objects.create(user=User.objects.create_user(username=f'proveedor{i}')) for i in range(2)]
+
+    def lote(self, cantidad):
+        return [{'proveedor': self.proveedores[i % 2].id, 'kilos': f'{i + 1}.50', 'descripcion': f'Ruta {i}'} for i in range(cantidad)]
+
+    def test_lote_valido(self):
+        response = self.client.post('/api/kilos/batch/', {'registros': self.lote(3)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(fila['index'], fila['status'], fila['puntos']) for fila in response.data['results']],
+                         [(0, 'created', 100), (1, 'created', 200), (2, 'created', 300)])
+        self.assertEqual(sorted(KiloProveedor.objects.values_list('id', flat=True)), [fila['id'] for fila in response.data['results']])
+        self.assertEqual([Proveedor.objects.get(id=proveedor.id).puntos_acumulados for proveedor in self.proveedores], [400, 200])
+        self.assertEqual(MovimientoPuntos.objects.count(), 2)  # Un movimiento por proveedor
+
+    def test_un_registro_invalido_no_guarda_ninguno(self):
+        registros = self.lote(3)
+        registros[1]['proveedor'] = 999
+        response = self.client.post('/api/kilos/batch/', registros, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([fila['status'] for fila in response.data['results']], ['not_saved', 'invalid', 'not_saved'])
+        self.assertIn('proveedor', response.data['results'][1]['errors'])
+        self.assertFalse(KiloProveedor.objects.exists())
+        self.assertFalse(MovimientoPuntos.objects.exists())
+        for cuerpo in ([], {'registros': 'x'}):
+            self.assertEqual(self.client.post('/api/kilos/batch/', cuerpo, format='json').status_code, 400)
+
+    def test_proveedor_con_tipo_incorrecto(self):
+        for valor in ([self.proveedores[0].id], {'id': self.proveedores[0].id}, None):
+            with self.subTest(proveedor=valor):
+                registros = [{'proveedor': valor, 'kilos': '1.00'}, self.lote(1)[0]]
+                response = self.client.post('/api/kilos/batch/', registros, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual([fila['status'] for fila in response.data['results']], ['invalid', 'not_saved'])
+        self.assertFalse(KiloProveedor.objects.exists())
+
+    def test_consultas_independientes_del_tamano(self):
+        self.client.post('/api/kilos/batch/', self.lote(2), format='json')  # Configuración en memoria y filas mensuales y de ranking ya creadas
+        cantidades = []
+        for cantidad in (2, 40):
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.post('/api/kilos/batch/', self.lote(cantidad), format='json')
+            cantidades.append(len(consultas))
+        self.assertEqual(cantidades[0], cantidades[1])
+
+# Prueba de estrés: canjes y acreditaciones concurrentes desde varios hilos contra la base de datos local.
+# Requiere un motor con bloqueo por filas (MySQL, PostgreSQL); SQLite bloquea la base completa.
+@skipUnlessDBFeature('has_select_for_update')
+class LibroPuntosConcurrenciaTests(TransactionTestCase):
+    HILOS = 16
+    CANJES_POR_HILO = 10
+
+    def test_canjes_y_kilos_concurrentes_no_pierden_ni_duplican_puntos(self):
+        proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor', password='secreto'), puntos_acumulados=500)
+        producto = Producto.objects.create(nombre='Abono', descripcion='', puntos_requeridos=10, tipo='C')
+        Configuracion.objects.create(conversion_rate=1)  # Acreditaciones pequeñas para que el saldo llegue a agotarse
+        invalidar_configuracion()
+        barrera = threading.Barrier(self.HILOS)
+        errores = []
+
+        def trabajador(indice):
+            client = APIClient()
+            try:
+                barrera.wait()
+                for _ in range(self.CANJES_POR_HILO):
+                    if indice % 4 == 0:
+                        response = client.post('/api/kilos/', {'proveedor': proveedor.id, 'kilos': '1'}, format='json')
+                        self.assertEqual(response.status_code, 201)
+                    else:
+                        response = client.post('/api/canjear_puntos/', {'proveedor_id': proveedor.id, 'producto_id': producto.id}, format='json')
+                        self.assertIn(response.status_code, (201, 400))
+            except Exception as e:  # Los errores de los hilos se reportan en el hilo principal
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajador, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        proveedor.refresh_from_db()
+        acreditados = MovimientoPuntos.objects.filter(tipo='K').aggregate(total=Sum('puntos'))['total'] or 0
+        canjeados = Transaccion.objects.filter(proveedor=proveedor).aggregate(total=Sum('puntos_utilizados'))['total'] or 0
+        self.assertEqual(proveedor.puntos_acumulados, 500 + acreditados - canjeados)
+        self.assertEqual(proveedor.puntos_acumulados, MovimientoPuntos.objects.aggregate(total=Sum('puntos'))['total'] + 500)
+        self.assertGreaterEqual(proveedor.puntos_acumulados, 0)
+
+
+# Pruebas de la configuración en memoria con invalidación por versión
+class ConfiguracionCacheTests(APITestCase):
+    def setUp(self):
+        invalidar_configuracion()
+
+    def test_lectura_sin_consultas_y_invalidacion_tras_put(self):
+        self.assertEqual(self.client.get('/api/configuracion/').data['conversion_rate'], 100)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/configuracion/')
+        self.assertEqual(len(consultas), 0)
+
+        self.client.put('/api/configuracion/', {'conversion_rate': 7}, format='json')
+        self.assertEqual(self.client.get('/api/configuracion/').data['conversion_rate'], 7)
+
+
+# Máximo de consultas SQL por solicitud para cada escenario de api/benchmark.py, con la caché vacía y con la
+# caché cargada. Se verifica con dos tamaños de datos: si una vista pasa a hacer una consulta por fila, la
+# cantidad crece con los datos grandes y la prueba falla. Incluye los SAVEPOINT de transaction.atomic().
+PRESUPUESTO_CONSULTAS = {
+    'register': 2,
+    'login': 2,
+    'loginuser': 2,
+    'proveedores-list': 1,
+    'user-list': 1,
+    'user-detail': 1,
+    'proveedor-detail': 1,
+    'clientes-list': 1,
+    'cliente-detail': 1,
+    'clientes-search': 1,
+    'productos-list': 1,
+    'productos-detail': 1,
+    'canjear-puntos': 7,
+    'consultar-puntos': 1,
+    'ranking': 1,
+    'ranking-proveedor': 2,
+    'register-prove': 2,
+    'proveedor-profile': 3,
+    'kilos-list': 2,
+    'kilos-create': 9,  # configuración (en frío), proveedor, savepoints, kilo, saldo, libro, total mensual y ranking
+    'kilos-batch': 9,  # Igual que kilos-create, con una sola inserción para todo el lote
+    'kilos-export-csv': 2,  # id máximo + una consulta por cada EXPORTACION_CHUNK filas
+    'kilo-detail': 1,
+    'transaccion-list': 1,
+    'transacciones-export-ndjson': 2,
+    'transaccion-detail': 1,
+    'update-user': 4,
+    'configuracion': 1,
+    'dispositivos-list': 1,
+    'dispositivos-estado': 4,  # Dispositivos + una consulta por tipo de valor que falta en la caché (no una por dispositivo)
+    'sensor-ultima': 2,
+    'sensor-historial-1h': 5,  # Watermark, agregados y crudas pendientes en una transacción (SAVEPOINT y RELEASE en la prueba)
+    'sensor-historial-lttb': 1,
+    'sensor-put': 11,  # Última lectura e inserción + control: umbrales, fila de estado (en frío: historial y alta con punto de guardado) y eventos
+    'sensor-batch': 5,  # Inserción + control: umbrales, actualización condicional de la fila de estado y eventos
+    'servo-get': 1,
+    'servo-put': 2,
+    'control-umbrales': 1,
+    'control-umbral-detail': 1,
+    'control-eventos': 1,
+    'canjes-por-proveedor': 1,
+    'kilos-intercambiados': 1,
+}
+
+# Hasher rápido para no medir PBKDF2
+presupuesto_settings = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+# Pruebas de presupuesto de consultas por ruta; las subclases indican el tamaño de los datos
+class PresupuestoConsultasMixin:
+    DATOS = {}  # Argumentos de sembrar()
+
+    @classmethod
+    def setUpTestData(cls):
+        invalidar_configuracion()  # Que sembrar() cree la configuración de esta base de prueba
+        sembrar(**cls.DATOS, dias=60)
+
+    def setUp(self):
+        dispositivos._ids_por_codigo.clear()  # Los IDs cambian entre clases de prueba
+        authentication._usuarios_activos.clear()
+
+    def test_todas_las_rutas_tienen_escenario_y_presupuesto(self):
+        self.assertEqual(rutas_sin_escenario(), [])
+        self.assertEqual({escenario[0] for escenario in ESCENARIOS}, set(PRESUPUESTO_CONSULTAS))
+
+    def test_consultas_dentro_del_presupuesto(self):
+        contexto = preparar_contexto(iteraciones=2)
+        for nombre, metodo, _, url, cuerpo, autenticado in ESCENARIOS:
+            with self.subTest(escenario=nombre):
+                extra = {'HTTP_AUTHORIZATION': f"Bearer {contexto['token']}"} if autenticado else {}
+                cache.clear()
+                for i, estado_cache in enumerate(('vacía', 'cargada')):
+                    with CaptureQueriesContext(connection) as consultas:
+                        response = self.client.generic(
+                            metodo, url.format(**contexto), json.dumps(cuerpo(contexto, i)) if cuerpo else '',
+                            content_type='application/json', **extra,
+                        )
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    self.assertLess(response.status_code, 400)
+                    self.assertLessEqual(
+                        len(consultas), PRESUPUESTO_CONSULTAS[nombre],
+                        f"{nombre} con la caché {estado_cache}:\n" + '\n'.join(consulta['sql'] for consulta in consultas.captured_queries),
+                    )
+
+@presupuesto_settings
+class PresupuestoConsultasPocosDatosTests(PresupuestoConsultasMixin, TestCase):
+    DATOS = {'proveedores': 2, 'clientes': 2, 'productos': 2, 'kilos': 4, 'transacciones': 4, 'dispositivos': 1, 'lecturas': 50}
+
+@presupuesto_settings
+class PresupuestoConsultasMuchosDatosTests(PresupuestoConsultasMixin, TestCase):
+    DATOS = {'proveedores': 60, 'clientes': 60, 'productos': 60, 'kilos': 1200, 'transacciones': 600, 'dispositivos': 8, 'lecturas': 2000}
+
+# Pruebas de la autenticación por claims del JWT: sin consultas del usuario, revocación tras el TTL y
+# memoria acotada de usuarios activos
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AutenticacionJWTTests(APITestCase):
+    def setUp(self):
+        authentication._usuarios_activos.clear()
+        self.user = User.objects.create_user(username='proveedor', password='secreto')
+        self.proveedor = Proveedor.objects.create(user=self.user)
+        access = self.client.post('/api/login/', {'username': 'proveedor', 'password': 'secreto'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_claims_del_token(self):
+        token = authentication.tokens_para_usuario(self.user, self.proveedor.id).access_token
+        self.assertEqual((token['username'], token['proveedor_id']), ('proveedor', self.proveedor.id))
+        self.assertNotIn('role', token)
+
+    def test_usuario_desactivado_rechazado_tras_el_ttl(self):
+        self.assertEqual(self.client.get('/api/profile_proveedor/').status_code, 200)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.client.get('/api/profile_proveedor/').status_code, 200)  # Todavía dentro del TTL
+        vencido = time.monotonic() + authentication.REVOCACION_TTL_SEGUNDOS
+        with mock.patch.object(authentication.time, 'monotonic', return_value=vencido):
+            self.assertEqual(self.client.get('/api/profile_proveedor/').status_code, 401)
+
+    def test_usuarios_recordados_acotados(self):
+        with mock.patch.object(authentication, 'REVOCACION_MAX_USUARIOS', 2):
+            for user_id in (self.user.id, 998, 999):
+                authentication.usuario_activo(user_id)
+            authentication.usuario_activo(998)  # Usado recientemente: no se descarta
+            authentication.usuario_activo(1000)
+        self.assertEqual(list(authentication._usuarios_activos), [998, 1000])
+
+# Pruebas del middleware de métricas y del endpoint /metrics
+class MetricasTests(APITestCase):
+    def test_metricas_por_ruta_en_formato_prometheus(self):
+        proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor', password='secreto'))
+        self.client.get('/api/kilos/')
+        self.client.get(f'/api/consultar_puntos/{proveedor.id}/')
+        self.client.get('/api/consultar_puntos/999999/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        texto = response.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', texto)
+        self.assertRegex(texto, r'api_requests_total\{ruta="consultar-puntos",metodo="GET",status="404"\} [1-9]')
+        self.assertRegex(texto, r'api_request_duration_seconds_count\{ruta="kilos-list",metodo="GET"\} [1-9]')
+        self.assertRegex(texto, r'api_request_db_queries_sum\{ruta="kilos-list",metodo="GET"\} [1-9]')
+        self.assertRegex(texto, r'api_response_size_bytes_bucket\{ruta="kilos-list",metodo="GET",le="\+Inf"\} [1-9]')
+
+    def test_solo_desde_ips_permitidas(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 404)
+
+    async def test_consultas_medidas_bajo_asgi(self):
+        await cache.aclear()
+        dispositivos._ids_por_codigo.clear()  # Que la vista asíncrona consulte la base de datos
+        antes = metricas.snapshot_proceso()
+        await self.async_client.get('/api/kilos/')  # Vista síncrona detrás del middleware asíncrono
+        await self.async_client.get('/api/sensor_data/')  # Vista asíncrona
+        despues = metricas.snapshot_proceso()
+        for clave in ('kilos-list\tGET', 'sensor_data_detail\tGET'):
+            anterior = antes.get(clave, metricas._nueva_estadistica())
+            self.assertGreater(despues[clave]['consultas_suma'] - anterior['consultas_suma'], 0, clave)
+            self.assertGreater(despues[clave]['db_segundos'] - anterior['db_segundos'], 0, clave)
+
+# Pruebas del perfilado de solicitudes a pedido
+class PerfiladoTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.directorio = tempfile.mkdtemp()
+
+    def test_inline_devuelve_perfil_y_sql(self):
+        response = self.client.get('/api/kilos/', HTTP_X_PROFILE=crear_token(), HTTP_X_PROFILE_OUTPUT='inline')
+        texto = response.content.decode()
+        self.assertEqual(response['X-Profile-Status'], '200')
+        self.assertIn('consultas SQL', texto)
+        self.assertIn('api_kiloproveedor', texto)
+        self.assertIn('cumulative', texto)
+
+    def test_archivo_en_el_directorio_de_perfiles(self):
+        with self.settings(PERFILADO_DIR=self.directorio):
+            response = self.client.get(f'/api/kilos/?_profile={crear_token()}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, f"{response['X-Profile-Id']}.prof")))
+        with open(os.path.join(self.directorio, f"{response['X-Profile-Id']}.json")) as archivo:
+            self.assertEqual(json.load(archivo)['ruta'], 'kilos-list')
+
+    async def test_perfila_bajo_asgi(self):
+        response = await self.async_client.get('/api/kilos/', headers={'X-Profile': crear_token(), 'X-Profile-Output': 'inline'})
+        texto = response.content.decode()
+        self.assertEqual(response['X-Profile-Status'], '200')
+        self.assertIn('api_kiloproveedor', texto)  # Consultas del hilo de la solicitud
+        self.assertIn('kilos_list_create', texto)  # La vista síncrona en el perfil
+        response = await self.async_client.get('/api/sensor_data/', headers={'X-Profile': crear_token(), 'X-Profile-Output': 'inline'})
+        self.assertIn('api_sensordata', response.content.decode())  # ORM de una vista asíncrona
+
+    def test_token_invalido_o_vencido_no_perfila(self):
+        for token in ('no-firmado', crear_token(minutos=-1)):
+            response = self.client.get('/api/kilos/', HTTP_X_PROFILE=token, HTTP_X_PROFILE_OUTPUT='inline')
+            self.assertNotIn('X-Profile-Status', response)
+
+    def test_limite_por_minuto(self):
+        with self.settings(PERFILADO_DIR=self.directorio, PERFILADO_MAX_POR_MINUTO=1):
+            token = crear_token()
+            self.assertIn('X-Profile-Id', self.client.get('/api/kilos/', HTTP_X_PROFILE=token))
+            self.assertNotIn('X-Profile-Id', self.client.get('/api/kilos/', HTTP_X_PROFILE=token))
+
+# Pruebas de las exportaciones en CSV y NDJSON por bloques
+class ExportacionesTests(APITestCase):
+    def setUp(self):
+        self.proveedores = [Proveedor.objects.create(user=User.objects.create_user(username=f'proveedor{i}')) for i in range(2)]
+        producto = Producto.objects.create(nombre='Producto', descripcion='', puntos_requeridos=10, tipo='C')
+        for i in range(7):
+            KiloProveedor.objects.create(proveedor=self.proveedores[i % 2], kilos=f'{i}.25', descripcion=f'Entrega, "lote" {i}')
+            Transaccion.objects.create(proveedor=self.proveedores[i % 2], producto=producto, cantidad=1, puntos_utilizados=10, tipo='C')
+        Transaccion.objects.create(producto=producto, cantidad=2, total='19.90', tipo='V')
+
+    def descargar(self, url):
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_igual_al_serializador_en_varios_bloques(self):
+        with mock.patch.object(exportaciones, 'EXPORTACION_CHUNK', 3):
+            response, contenido = self.descargar('/api/transacciones/export/?formato=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        esperado = TransaccionSerializer(Transaccion.objects.order_by('id'), many=True).data
+        self.assertEqual([json.loads(linea) for linea in contenido.splitlines()], json.loads(json.dumps(esperado)))
+
+    def test_csv_con_filtro_de_proveedor(self):
+        with mock.patch.object(exportaciones, 'EXPORTACION_CHUNK', 2):
+            response, contenido = self.descargar(f'/api/kilos/export/?proveedor={self.proveedores[0].id}')
+        self.assertIn('attachment; filename="kilos-', response['Content-Disposition'])
+        filas = list(csv.DictReader(io.StringIO(contenido)))
+        esperado = KiloProveedorSerializer(KiloProveedor.objects.filter(proveedor=self.proveedores[0]).order_by('id'), many=True).data
+        self.assertEqual(filas, [{campo: str(valor) for campo, valor in fila.items()} for fila in esperado])
+
+    def test_rango_de_fechas_y_parametros_invalidos(self):
+        _, contenido = self.descargar('/api/kilos/export/?formato=ndjson&from=2000-01-01&to=2000-02-01')
+        self.assertEqual(contenido, '')
+        self.assertEqual(self.client.get('/api/kilos/export/?formato=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/transacciones/export/?from=ayer').status_code, 400)
+
+# Pruebas del camino rápido de las listas: la salida debe ser idéntica byte a byte a la de los serializadores
+class RenderizadoRapidoTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor'))
+        self.productos = [
+            Producto.objects.create(nombre='Compost ñandú', descripcion='Línea\u2028separada "x"\n', precio='12.5', tipo='V'),
+            Producto.objects.create(nombre='Sin imagen', descripcion='', puntos_requeridos=10, tipo='C', imagen=None),
+            Producto.objects.create(nombre='Con derivados', descripcion='😀', puntos_requeridos=3, tipo='C', imagen_variantes={
+                'origen': 'x', 'thumb': {'webp': 'productos/derivados/a.webp'}, 'card': {'jpeg': 'productos/derivados/b.jpg'},
+            }),
+            Producto.objects.create(nombre='Otro', descripcion='d', precio='0.05', tipo='V'),
+        ]
+        for i in range(4):
+            KiloProveedor.objects.create(proveedor=proveedor, kilos=f'{i}.5', descripcion=f'Entrega {i} ✓')
+            Transaccion.objects.create(proveedor=proveedor, producto=self.productos[1], cantidad=1, puntos_utilizados=10, tipo='C')
+        Transaccion.objects.create(producto=self.productos[0], cantidad=2, total='19.9', tipo='V')
+
+    # JSON que devolvía la vista con el serializador, para la misma página
+    def esperado(self, url, serializer_class, queryset, contenido):
+        datos = json.loads(contenido)
+        request = RequestFactory().get(url)
+        resultados = serializer_class(queryset.order_by('-id')[:3], many=True, context={'request': request}).data
+        return JSONRenderer().render({'next': datos['next'], 'previous': datos['previous'], 'results': resultados})
+
+    def test_listas_identicas_al_serializador(self):
+        casos = [
+            ('/api/transacciones/?limit=3', TransaccionSerializer, Transaccion.objects.all()),
+            ('/api/kilos/?limit=3', KiloProveedorSerializer, KiloProveedor.objects.all()),
+            ('/api/productos/?limit=3', ProductoSerializer, Producto.objects.all()),
+        ]
+        for url, serializer_class, queryset in casos:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, self.esperado(url, serializer_class, queryset, response.content))
+                siguiente = self.client.get(json.loads(response.content)['next'])  # El cursor funciona con filas de .values()
+                self.assertEqual(len(json.loads(siguiente.content)['results']), queryset.count() - 3)
+
+    def test_renderer_igual_a_json_renderer(self):
+        datos = {'texto': 'a\u2028b\u2029c ñ \x00', 'lista': [1, None, True, {'x': '1.50'}]}
+        self.assertEqual(renderizado.JSONRapidoRenderer().render(datos), JSONRenderer().render(datos))
+        with mock.patch.object(renderizado, 'orjson', None):  # Sin orjson instalado
+            self.assertEqual(renderizado.JSONRapidoRenderer().render(datos), JSONRenderer().render(datos))
+        # Tipos que orjson escribe distinto pasan al JSONRenderer
+        otros = {'fecha': Transaccion.objects.first().fecha, 'decimal': KiloProveedor.objects.first().kilos}
+        self.assertEqual(renderizado.JSONRapidoRenderer().render(otros), JSONRenderer().render(otros))
+        self.assertEqual(renderizado.JSONRapidoRenderer().render(datos, 'application/json; indent=2'),
+                         JSONRenderer().render(datos, 'application/json; indent=2'))
+
+# Pruebas del catálogo pre-renderizado: 304 con ETag, invalidación en cualquier escritura de Producto y
+# clave de caché independiente de los parámetros que la vista no lee
+class CatalogoTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.producto = Producto.objects.create(nombre='Compost', descripcion='', precio='10', tipo='V')
+
+    def etag(self, url='/api/productos/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_304_con_la_misma_version(self):
+        etag = self.etag()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(consultas), 0)
+
+    def test_escrituras_fuera_de_la_api_invalidan(self):
+        escrituras = [
+            lambda: Producto.objects.create(nombre='Nuevo', descripcion='', precio='1', tipo='V'),
+            lambda: Producto.objects.filter(id=self.producto.id).update(nombre='Renombrado'),
+            lambda: Producto.objects.bulk_create([Producto(nombre='Lote', descripcion='', precio='2', tipo='V')]),
+            lambda: Producto.objects.filter(nombre='Lote').delete(),
+        ]
+        for escritura in escrituras:
+            etag = self.etag()
+            escritura()
+            self.assertEqual(self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(json.loads(self.client.get('/api/productos/').content)['results'][-1]['nombre'], 'Renombrado')
+
+    def test_invalida_otra_vez_al_confirmar_la_transaccion(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                Producto.objects.filter(id=self.producto.id).update(nombre='Renombrado')
+        self.assertEqual(len(callbacks), 1)
+        etag = self.etag()
+        callbacks[0]()
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_parametros_ignorados_no_cambian_la_clave(self):
+        Producto.objects.create(nombre='Otro', descripcion='', precio='1', tipo='V')
+        etag = self.etag('/api/productos/?limit=1')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/productos/?x=1&limit=1&_=123')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(consultas), 0)  # Misma entrada de la caché
+        self.assertEqual(self.etag('/api/productos/?limit=50'), self.etag('/api/productos/?limit=abc'))  # limit por defecto
+        siguiente = json.loads(response.content)['next']
+        self.assertNotIn('x=1', siguiente)
+        self.assertIn('limit=1', siguiente)
+        self.assertEqual(len(json.loads(self.client.get(siguiente).content)['results']), 1)
+
+# Pruebas de los derivados de las imágenes de productos: tamaños y formatos, regeneración solo si cambia la
+# imagen, srcset en la API y caché inmutable al servirlos
+class ImagenesDerivadasTests(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def imagen(self, nombre='foto.png', color=(0, 128, 0, 128)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (800, 600), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+    def crear(self, **extra):
+        datos = {'nombre': 'Abono', 'descripcion': 'Bolsa de 5 kg', 'precio': '5', 'tipo': 'V', 'imagen': self.imagen(), **extra}
+        response = self.client.post('/api/productos/', datos, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Producto.objects.get(id=response.data['id'])
+
+    def test_derivados_y_srcset(self):
+        producto = self.crear()
+        variantes = producto.imagen_variantes
+        self.assertEqual(variantes['origen'], producto.imagen.name)
+        for nombre, lado in imagenes.TAMANOS.items():
+            for extension, formato in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with Image.open(os.path.join(self.media_root, variantes[nombre][extension])) as derivada:
+                    self.assertEqual((derivada.format, max(derivada.size)), (formato, lado))
+        with Image.open(os.path.join(self.media_root, variantes['thumb']['jpeg'])) as jpeg:
+            self.assertEqual(jpeg.mode, 'RGB')  # Transparencia compuesta sobre blanco
+        fila = self.client.get('/api/productos/').json()['results'][0]
+        self.assertEqual(fila['imagen_srcset']['card']['webp'], f"http://testserver/media/{variantes['card']['webp']}")
+
+    def test_solo_se_regeneran_si_cambia_la_imagen(self):
+        producto = self.crear()
+        variantes = producto.imagen_variantes
+        self.client.patch(f'/api/productos/{producto.id}/', {'nombre': 'Otro nombre'}, format='json')
+        producto.refresh_from_db()
+        self.assertEqual(producto.imagen_variantes, variantes)
+        self.assertFalse(imagenes.actualizar_derivados(producto))
+        self.client.patch(f'/api/productos/{producto.id}/', {'imagen': self.imagen('otra.png', (255, 0, 0, 255))}, format='multipart')
+        producto.refresh_from_db()
+        self.assertNotEqual(producto.imagen_variantes['thumb']['webp'], variantes['thumb']['webp'])  # El nombre lleva el hash del contenido
+
+    def test_imagen_inexistente_sin_derivados(self):
+        producto = self.crear()
+        Producto.objects.filter(id=producto.id).update(imagen='productos/no-existe.png')
+        producto.refresh_from_db()
+        self.assertTrue(imagenes.actualizar_derivados(producto))
+        self.assertEqual(Producto.objects.get(id=producto.id).imagen_variantes, {})  # Se sigue usando la original
+        self.assertIsNone(imagenes.srcset(producto))
+        self.assertFalse(imagenes.actualizar_derivados(producto))
+
+    def test_derivados_con_cache_inmutable(self):
+        variantes = self.crear().imagen_variantes
+        request = RequestFactory().get('/media/')
+        response = imagenes.servir_media(request, variantes['thumb']['webp'], document_root=self.media_root)
+        self.assertEqual(response['Cache-Control'], imagenes.CACHE_INMUTABLE)
+        response = imagenes.servir_media(request, Producto.objects.get().imagen.name, document_root=self.media_root)
+        self.assertNotIn('Cache-Control', response)  # La imagen original puede reemplazarse con el mismo nombre
+
+# Pruebas del ranking de proveedores: el mantenimiento incremental debe coincidir con la reconstrucción
+class RankingTests(APITestCase):
+    def setUp(self):
+        invalidar_configuracion()
+        Configuracion.objects.create(conversion_rate=10)
+        self.proveedores = [Proveedor.objects.create(user=User.objects.create_user(username=f'proveedor{i}')) for i in range(4)]
+        self.producto = Producto.objects.create(nombre='Canje', descripcion='', puntos_requeridos=30, tipo='C')
+        reconstruir_ranking()
+
+    def filas(self):
+        return sorted(RankingProveedor.objects.values_list('proveedor_id', 'periodo', 'kilos', 'puntos'))
+
+    def test_incremental_igual_a_reconstruir(self):
+        p0, p1, p2, _ = self.proveedores
+        lote = [{'proveedor': p1.id, 'kilos': '8'}, {'proveedor': p1.id, 'kilos': '3'}, {'proveedor': p2.id, 'kilos': '4'}]
+        self.assertEqual(self.client.post('/api/kilos/', {'proveedor': p0.id, 'kilos': '12.50'}, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/kilos/batch/', lote, format='json').status_code, 201)
+        canje = {'proveedor_id': p0.id, 'producto_id': self.producto.id}
+        self.assertEqual(self.client.post('/api/canjear_puntos/', canje, format='json').status_code, 201)
+        kilo = KiloProveedor.objects.filter(proveedor=p2).first()
+        self.assertEqual(self.client.put(f'/api/kilos/{kilo.id}/', {'proveedor': p0.id, 'kilos': '6', 'descripcion': 'corregido'}, format='json').status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/kilos/{KiloProveedor.objects.filter(proveedor=p1).first().id}/').status_code, 204)
+        self.assertEqual(self.client.patch(f'/api/proveedores/{p2.id}/', {'ajuste_puntos': 25}, format='json').status_code, 200)
+        self.assertEqual(self.client.patch(f'/api/proveedores/{p0.id}/', {'ajuste_puntos': -10}, format='json').status_code, 200)
+        nuevo = self.client.post('/api/proveedores/', {'user': User.objects.create_user(username='nuevo').id, 'ajuste_puntos': 500}, format='json').data
+        incremental = self.filas()
+        self.assertIn((p0.id, 'total', Decimal('18.50'), 120 - 30 - 10), incremental)
+        self.assertEqual(self.client.get('/api/ranking/?por=puntos&limit=1').json()['resultados'][0]['proveedor'], nuevo['id'])
+        reconstruir_ranking()
+        self.assertEqual(incremental, self.filas())
+
+    def test_top_con_empates_y_posicion(self):
+        p0, p1, p2, p3 = self.proveedores
+        for proveedor, kilos in ((p0, '5'), (p1, '9'), (p2, '5')):
+            self.client.post('/api/kilos/', {'proveedor': proveedor.id, 'kilos': kilos}, format='json')
+        datos = self.client.get('/api/ranking/?por=kilos&limit=3').json()
+        self.assertEqual(
+            [(fila['posicion'], fila['proveedor'], fila['kilos']) for fila in datos['resultados']],
+            [(1, p1.id, '9.00'), (2, p0.id, '5.00'), (2, p2.id, '5.00')],
+        )
+        mes = periodo_de(KiloProveedor.objects.first().fecha)
+        self.assertEqual(self.client.get(f'/api/ranking/{p2.id}/?por=puntos&mes={mes}').json()['posicion'], 2)
+        self.assertEqual(self.client.get(f'/api/ranking/{p3.id}/?mes={mes}').json()['posicion'], 4)  # Sin kilos en el mes
+        self.assertEqual(self.client.get('/api/ranking/?mes=2000-01').json()['resultados'], [])
+        self.assertEqual(self.client.get('/api/ranking/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/ranking/?por=nombre').status_code, 400)
+        self.assertEqual(self.client.get('/api/ranking/?mes=2026-13').status_code, 400)
+
+# Pruebas de la búsqueda de clientes y de que las consultas por proveedor y fecha usan los índices compuestos
+class BusquedaClientesTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Cliente.objects.bulk_create([  # Suficientes filas para que el planificador prefiera los índices
+            Cliente(nombre=f'Nombre {i}', apellidos=f'Apellido {i}', dni=f'{50000000 + i}', ruc=f'{20500000000 + i}', ubicacion='x')
+            for i in range(500)
+        ])
+        Cliente.objects.create(nombre='Ana', apellidos='García Pérez', dni='12345678', ruc='10123456781', ubicacion='Lima')
+        Cliente.objects.create(nombre='Juan', apellidos='Garcés', dni='12349999', ubicacion='Cusco')
+        Cliente.objects.create(nombre='Luz', apellidos='Díaz Ruiz', dni='70000009', ruc='10999999999', ubicacion='Piura')
+        cls.proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor'))
+        producto = Producto.objects.create(nombre='Producto', descripcion='', tipo='V')
+        otros = [Proveedor.objects.create(user=User.objects.create_user(username=f'otro{i}')) for i in range(5)]
+        for proveedor in [cls.proveedor, *otros]:
+            KiloProveedor.objects.bulk_create([KiloProveedor(proveedor=proveedor, kilos='1') for _ in range(100)])
+            Transaccion.objects.bulk_create([Transaccion(proveedor=proveedor, producto=producto, cantidad=1, tipo='V') for _ in range(100)])
+
+    def buscar(self, q, **params):
+        response = self.client.get('/api/clientes/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_busqueda_por_prefijo(self):
+        self.assertEqual([c['nombre'] for c in self.buscar('GARC')['resultados']], ['Juan', 'Ana'])  # Ordenados por apellidos
+        self.assertEqual([c['nombre'] for c in self.buscar('ana  garc')['resultados']], ['Ana'])
+        self.assertEqual([c['dni'] for c in self.buscar('1234')['resultados']], ['12349999', '12345678'])
+        self.assertEqual([c['dni'] for c in self.buscar('10123456781')['resultados']], ['12345678'])  # RUC exacto
+        datos = self.buscar('apellido 1', limit=5)
+        self.assertEqual(len(datos['resultados']), 5)
+        self.assertTrue(datos['hay_mas'])
+        self.assertEqual(self.client.get('/api/clientes/search/?q=a').status_code, 400)
+        self.assertEqual(self.client.get('/api/clientes/search/?q=ana&limit=x').status_code, 400)
+
+    # Prefijos terminados en 9 o en z: el límite superior del rango no sirve con intercalaciones como las de MySQL,
+    # que usan LIKE; se prueban las dos formas de la condición
+    def test_prefijos_que_terminan_en_9_o_z(self):
+        casos = [('1234999', ['12349999']), ('12349999', ['12349999']), ('70000009', ['70000009']),
+                 ('10999999999', ['70000009']), ('díaz', ['70000009']), ('luz', ['70000009']), ('díaz ruiz', ['70000009'])]
+        for vendor in ('sqlite', 'mysql'):
+            for q, dnis in casos:
+                with self.subTest(vendor=vendor, q=q):
+                    self.assertEqual(list(clientes_que_coinciden(q, vendor).values_list('dni', flat=True)), dnis)
+        self.assertEqual([c['nombre'] for c in self.buscar('Luz D')['resultados']], ['Luz'])
+
+    def test_busqueda_usa_los_indices(self):
+        plan = clientes_que_coinciden('garc').order_by('busqueda_apellidos', 'id')[:21].explain()
+        self.assertIn('cliente_busqueda_apellidos_idx', plan)
+        self.assertIn('cliente_busqueda_nombre_idx', plan)
+        self.assertIn('cliente_ruc_idx', clientes_que_coinciden('1012').explain())
+
+    def test_filtros_por_proveedor_y_fecha_usan_indice_compuesto(self):
+        desde, hasta = timezone.now() - timedelta(days=7), timezone.now()
+        self.assertIn('kilo_proveedor_fecha_idx', exportaciones.kilos_filtrados(self.proveedor.id, desde, hasta).explain())
+        self.assertIn('transaccion_prov_fecha_idx', exportaciones.transacciones_filtradas(self.proveedor.id, desde, hasta).explain())
+
+# Pruebas del enrutamiento de lecturas a las réplicas (sin réplicas reales: solo la base elegida)
+@override_settings(REPLICAS_LECTURA=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    databases = {'default'}  # Sin la transacción de TestCase, que haría leer todo de la base principal
+
+    # Base elegida por el router para cada acción ('leer', 'escribir', 'leer_en_atomic') durante la solicitud
+    def destinos(self, metodo, path, acciones):
+        router = ReplicaRouter()
+        elegidas = []
+
+        def vista(request):
+            middleware.process_view(request, None, (), {})
+            for accion in acciones:
+                if accion == 'escribir':
+                    elegidas.append(router.db_for_write(Producto))
+                elif accion == 'leer_en_atomic':
+                    with transaction.atomic():
+                        elegidas.append(router.db_for_read(Producto))
+                else:
+                    elegidas.append(router.db_for_read(Producto))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(vista)
+        request = RequestFactory().generic(metodo, path)
+        request.resolver_match = resolve(path)
+        middleware(request)
+        return elegidas
+
+    def test_lecturas_de_catalogo_van_a_la_replica_hasta_la_primera_escritura(self):
+        self.assertEqual(self.destinos('GET', '/api/productos/', ['leer', 'leer_en_atomic', 'leer', 'escribir', 'leer']),
+                         ['replica1', 'default', 'replica1', 'default', 'default'])
+        self.assertEqual(ReplicaRouter().db_for_read(Producto), 'default')  # Fuera de una solicitud
+
+    def test_escrituras_y_otras_rutas_usan_la_base_principal(self):
+        self.assertEqual(self.destinos('POST', '/api/kilos/', ['leer']), ['default'])
+        self.assertEqual(self.destinos('GET', '/api/clientes/', ['leer']), ['default'])
+        self.assertEqual(self.destinos('GET', '/api/sensor_data/', ['leer']), ['replica1'])
+
+# Prueba con réplicas configuradas (DJANGO_DB_REPLICAS); en las pruebas son espejos de la base principal
+@skipUnless(settings.REPLICAS_LECTURA, 'Sin réplicas configuradas (DJANGO_DB_REPLICAS).')
+class ReplicasTests(TransactionTestCase):
+    databases = {'default', *settings.REPLICAS_LECTURA}
+
+    def consultas(self, metodo, url, datos=None):
+        replica = settings.REPLICAS_LECTURA[0]
+        with mock.patch('api.replicas.random.choice', return_value=replica):
+            with CaptureQueriesContext(connections['default']) as principal, CaptureQueriesContext(connections[replica]) as en_replica:
+                response = APIClient().generic(metodo, url, json.dumps(datos) if datos else '', content_type='application/json')
+        self.assertLess(response.status_code, 300)
+        return len(principal), len(en_replica)
+
+    def test_lecturas_en_la_replica_y_escrituras_en_la_principal(self):
+        cache.clear()
+        proveedor = Proveedor.objects.create(user=User.objects.create_user(username='proveedor'))
+        Producto.objects.create(nombre='Producto', descripcion='', tipo='V')
+        principal, en_replica = self.consultas('GET', '/api/productos/')
+        self.assertEqual(principal, 0)
+        self.assertGreater(en_replica, 0)
+        principal, en_replica = self.consultas('POST', '/api/kilos/', {'proveedor': proveedor.id, 'kilos': '2'})
+        self.assertGreater(principal, 0)
+        self.assertEqual(en_replica, 0)
+        self.assertEqual(self.consultas('GET', '/api/clientes/')[1], 0)
+
+# Pruebas del historial del sensor por rango: lecturas crudas, cubetas, reducción con LTTB y validación
+class HistorialSensorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dispositivos._ids_por_codigo.clear()
+        self.dispositivo = Dispositivo.objects.create(codigo='bin-1')
+        self.inicio = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        SensorData.objects.bulk_create([
+            SensorData(dispositivo=self.dispositivo, temperature=90 if i == 70 else 20 + i % 5, humidity=50,
+                       timestamp=self.inicio + timedelta(minutes=10 * i))
+            for i in range(144)  # Un día, una lectura cada 10 minutos, con un pico en la lectura 70
+        ])
+
+    def historial(self, desde, hasta, **params):
+        params = {'dispositivo': 'bin-1', 'from': desde.isoformat(), 'to': hasta.isoformat(), **params}
+        return self.client.get('/api/sensor_data/', params)
+
+    def test_lecturas_crudas_del_rango(self):
+        response = self.historial(self.inicio, self.inicio + timedelta(hours=1))
+        self.assertEqual(response.status_code, 200)
+        fechas = [fila['timestamp'] for fila in response.json()['results']]
+        self.assertEqual(len(fechas), 6)  # `to` no se incluye
+        self.assertEqual(fechas, sorted(fechas))
+
+    def test_cubetas_por_hora(self):
+        resultados = self.historial(self.inicio, self.inicio + timedelta(days=1), bucket='1h').json()['results']
+        self.assertEqual(len(resultados), 24)
+        self.assertTrue(all(fila['count'] == 6 for fila in resultados))
+        self.assertEqual(resultados[0]['temperature_avg'], (20 + 21 + 22 + 23 + 24 + 20) / 6)
+        self.assertEqual(max(fila['temperature_max'] for fila in resultados), 90)
+
+    def test_lttb_conserva_extremos_y_picos(self):
+        crudas = self.historial(self.inicio, self.inicio + timedelta(days=1)).json()['results']
+        resultados = self.historial(self.inicio, self.inicio + timedelta(days=1), points=10).json()['results']
+        self.assertEqual(len(resultados), 10)
+        self.assertEqual((resultados[0], resultados[-1]), (crudas[0], crudas[-1]))
+        self.assertIn(90, [fila['temperature'] for fila in resultados])
+        puntos = [(i, i % 3) for i in range(5)]
+        self.assertEqual(lttb_indices(puntos, 5), list(range(5)))  # Sin reducción si alcanza el límite
+        self.assertEqual(lttb_indices(puntos, 3)[::2], [0, 4])
+
+    def test_parametros_invalidos(self):
+        fin = self.inicio + timedelta(days=1)
+        for params in ({'bucket': '5m'}, {'points': 2}, {'points': 'x'}, {'field': 'presion'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.historial(self.inicio, fin, **params).status_code, 400)
+        response = self.client.get('/api/sensor_data/', {'dispositivo': 'bin-1', 'from': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+# Pruebas de los agregados de sensores: trabajo incremental con margen, compactación y series iguales a las crudas
+class RollupsTests(TestCase):
+    def setUp(self):
+        self.dispositivo = Dispositivo.objects.create(codigo='bin-1')
+        self.inicio = (timezone.now() - timedelta(days=3)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def lecturas(self, minuto, cantidad):
+        SensorData.objects.bulk_create([
+            SensorData(dispositivo=self.dispositivo, temperature=20 + i % 7, humidity=50 + i % 3, timestamp=self.inicio + timedelta(minutes=minuto + i * 7))
+            for i in range(cantidad)
+        ])
+
+    # Serie calculada en Python desde las lecturas crudas (todas o las del rango [desde, hasta))
+    def crudas(self, bucket, desde=None, hasta=None):
+        lecturas = SensorData.objects.filter(dispositivo=self.dispositivo)
+        if desde is not None:
+            lecturas = lecturas.filter(timestamp__gte=desde, timestamp__lt=hasta)
+        series = {}
+        for fecha, temperatura in lecturas.values_list('timestamp', 'temperature'):
+            clave = fecha.replace(minute=0, second=0, microsecond=0)
+            series.setdefault(clave.replace(hour=0) if bucket == '1d' else clave, []).append(temperatura)
+        return [(clave, len(valores), min(valores), max(valores), round(sum(valores) / len(valores), 6)) for clave, valores in sorted(series.items())]
+
+    def servida(self, bucket, desde=None, hasta=None):
+        desde = desde or self.inicio
+        hasta = hasta or self.inicio + timedelta(days=2)
+        return [
+            (fila['timestamp'], fila['count'], fila['temperature_min'], fila['temperature_max'], round(fila['temperature_avg'], 6))
+            for fila in serie_por_cubetas(self.dispositivo.id, desde, hasta, bucket)
+        ]
+
+    def assertSerieIgualALasCrudas(self):
+        for bucket in SENSOR_ROLLUPS:
+            self.assertEqual(self.servida(bucket), self.crudas(bucket), bucket)
+
+    def test_incremental_combina_cubetas_y_respeta_el_margen(self):
+        self.lecturas(0, 100)
+        self.assertEqual(actualizar_rollups(), 0)  # Solo lee el id máximo: se procesa cuando pase el margen
+        self.assertFalse(SensorRollup.objects.exists())
+        self.assertSerieIgualALasCrudas()  # Todo desde las crudas pendientes
+        self.assertEqual(actualizar_rollups(margen=timedelta(0)), 100)
+        self.lecturas(3, 50)  # En las mismas cubetas que ya tienen agregados
+        self.assertEqual(actualizar_rollups(margen=timedelta(0)), 50)
+        self.assertEqual(SensorRollup.objects.filter(resolucion='1h').aggregate(total=Sum('count'))['total'], 150)
+        self.assertSerieIgualALasCrudas()
+
+        # Una lectura insertada después de leer el id máximo espera a la ejecución siguiente
+        self.lecturas(5, 20)
+        self.assertEqual(actualizar_rollups(), 0)
+        RollupWatermark.objects.update(visto_en=timezone.now() - timedelta(seconds=ROLLUP_MARGEN_SEGUNDOS + 1))
+        self.lecturas(6, 10)
+        self.assertEqual(actualizar_rollups(), 20)
+        self.assertSerieIgualALasCrudas()  # Agregados + las 10 crudas pendientes, sin contar nada dos veces
+
+    def test_rango_no_alineado_a_las_cubetas(self):
+        self.lecturas(0, 400)  # Casi dos días, una lectura cada 7 minutos
+        actualizar_rollups(margen=timedelta(0))
+        self.lecturas(2, 30)  # Sin agregar todavía
+        rangos = (
+            (timedelta(hours=1, minutes=20), timedelta(hours=30, minutes=45)),
+            (timedelta(hours=5, minutes=10), timedelta(hours=5, minutes=50)),  # Dentro de una sola cubeta
+            (timedelta(hours=23, minutes=30), timedelta(hours=24, minutes=30)),  # Corta dos cubetas vecinas
+        )
+        for desplazamiento_desde, desplazamiento_hasta in rangos:
+            desde, hasta = self.inicio + desplazamiento_desde, self.inicio + desplazamiento_hasta
+            for bucket in SENSOR_ROLLUPS:
+                with self.subTest(desde=desde, hasta=hasta, bucket=bucket):
+                    servida = self.servida(bucket, desde, hasta)
+                    self.assertEqual(servida, self.crudas(bucket, desde, hasta))
+                    self.assertEqual(sum(fila[1] for fila in servida), SensorData.objects.filter(timestamp__gte=desde, timestamp__lt=hasta).count())
+
+    def test_compactar_solo_elimina_lecturas_agregadas(self):
+        self.lecturas(0, 100)
+        actualizar_rollups(margen=timedelta(0))
+        self.lecturas(1, 30)  # Antiguas pero todavía sin agregar
+        esperadas = {bucket: self.crudas(bucket) for bucket in SENSOR_ROLLUPS}
+        self.assertEqual(compactar(retencion_dias=1), 100)
+        self.assertEqual(SensorData.objects.count(), 30)
+        for bucket in SENSOR_ROLLUPS:
+            self.assertEqual(self.servida(bucket), esperadas[bucket], bucket)
+
+# Pruebas de las vistas asíncronas de los dispositivos (con el cliente asíncrono, como bajo ASGI)
+class SensoresAsyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dispositivos._ids_por_codigo.clear()
+        Dispositivo.objects.create(codigo='bin-1')
+
+    def test_las_vistas_de_dispositivos_son_asincronas(self):
+        for path in ('/api/sensor_data/', '/api/sensor_data/batch/', '/api/servo_motor_state/'):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(path).func), path)
+
+    async def test_lecturas_y_lotes(self):
+        response = await self.async_client.get('/api/sensor_data/?dispositivo=bin-1')
+        self.assertEqual(response.status_code, 404)  # Sin lecturas todavía, y la consulta no crea ninguna
+        response = await self.async_client.put('/api/sensor_data/?dispositivo=bin-1', {'temperature': 41.5}, content_type='application/json')
+        self.assertEqual((response.status_code, list(response.json())), (400, ['humidity']))  # La primera lectura trae los dos campos
+        self.assertFalse(await SensorData.objects.aexists())
+        response = await self.async_client.put('/api/sensor_data/?dispositivo=bin-1', {'temperature': 41.5, 'humidity': 55.0}, content_type='application/json')
+        self.assertEqual(response.json(), {'temperature': 41.5, 'humidity': 55.0})
+        response = await self.async_client.put('/api/sensor_data/?dispositivo=bin-1', {'temperature': 42.0}, content_type='application/json')
+        self.assertEqual(response.json(), {'temperature': 42.0, 'humidity': 55.0})  # La humedad se conserva de la última lectura
+        response = await self.async_client.post(
+            '/api/sensor_data/batch/?dispositivo=bin-1', {'readings': [{'temperature': 50.0, 'humidity': 60.0}] * 3}, content_type='application/json',
+        )
+        self.assertEqual((response.status_code, response.json()), (201, {'created': 3}))
+        response = await self.async_client.get('/api/sensor_data/?dispositivo=bin-1')
+        self.assertEqual(response.json(), {'temperature': 50.0, 'humidity': 60.0})
+        self.assertEqual(await SensorData.objects.filter(dispositivo__codigo='bin-1').acount(), 5)
+        response = await self.async_client.get('/api/sensor_data/?dispositivo=bin-1&points=500')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_estado_de_todos_no_escribe(self):
+        Dispositivo.objects.create(codigo='bin-2')
+        response = self.client.get('/api/dispositivos/estado/')
+        self.assertEqual([(fila['sensor'], fila['servo']) for fila in response.json()], [(None, {'is_active': False})] * Dispositivo.objects.count())
+        self.assertFalse(SensorData.objects.exists())
+        self.assertFalse(ServoMotorState.objects.exists())
+        dispositivos.obtener_dispositivo_id('bin-2')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/api/dispositivos/estado/')
+            self.assertEqual(self.client.get('/api/sensor_data/?dispositivo=bin-2').status_code, 404)
+        self.assertEqual(len(consultas), 0)  # Que no hay lecturas también queda en la caché
+        self.client.put('/api/sensor_data/?dispositivo=bin-2', {'temperature': 40.0, 'humidity': 50.0}, content_type='application/json')
+        self.assertEqual(self.client.get('/api/sensor_data/?dispositivo=bin-2').json(), {'temperature': 40.0, 'humidity': 50.0})
+
+    async def test_servo_publica_solo_los_cambios(self):
+        dispositivo_id = await dispositivos.obtener_dispositivo_id_async('bin-1')
+        suscripcion = broker.suscribir(dispositivo_id)
+        try:
+            for _ in range(2):
+                response = await self.async_client.put('/api/servo_motor_state/?dispositivo=bin-1', {'is_active': True}, content_type='application/json')
+                self.assertEqual(response.json(), {'is_active': True})
+            await asyncio.sleep(0)  # El broker entrega con call_soon_threadsafe
+            self.assertEqual(suscripcion[1].qsize(), 1)
+        finally:
+            broker.desuscribir(dispositivo_id, suscripcion)
+        self.assertEqual((await self.async_client.get('/api/servo_motor_state/?dispositivo=bin-1')).json(), {'is_active': True})
+
+    async def test_errores_como_las_vistas_de_drf(self):
+        response = await self.async_client.get('/api/sensor_data/?dispositivo=no-existe')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post('/api/servo_motor_state/?dispositivo=bin-1')
+        self.assertEqual((response.status_code, response['Allow']), (405, 'GET, PUT'))
+        response = await self.async_client.put('/api/sensor_data/?dispositivo=bin-1', '{"temperature":', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('detail', response.json())
+        response = await self.async_client.put('/api/sensor_data/?dispositivo=bin-1', {'temperature': 'caliente', 'humidity': 50}, content_type='application/json')
+        self.assertEqual(list(response.json()), ['temperature'])
+
+# Pruebas de la caché de últimos valores por dispositivo: lecturas sin consultas, recarga tras vaciar la caché
+# y lecturas atrasadas que no reemplazan a la más nueva
+class UltimosValoresTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dispositivos._ids_por_codigo.clear()
+        self.dispositivos = [Dispositivo.objects.create(codigo=f'bin-{i}') for i in range(3)]
+
+    def put(self, codigo, temperatura):
+        return self.client.put(f'/api/sensor_data/?dispositivo={codigo}', {'temperature': temperatura, 'humidity': 50.0}, content_type='application/json')
+
+    def test_ultima_lectura_desde_la_cache(self):
+        self.put('bin-0', 40.0)
+        self.put('bin-1', 41.0)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/sensor_data/?dispositivo=bin-1').json(), {'temperature': 41.0, 'humidity': 50.0})
+        self.assertEqual(len(consultas), 0)
+
+        cache.clear()  # Otro worker o un reinicio de la caché: se lee una vez de la base de datos
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/sensor_data/?dispositivo=bin-0').json()['temperature'], 40.0)
+            self.client.get('/api/sensor_data/?dispositivo=bin-0')
+        self.assertEqual(len(consultas), 1)
+
+    # Con la caché configurada del proyecto (no la de las pruebas): una flota de 200 composteras entra
+    # completa, sin que la caché descarte últimos valores
+    def test_flota_completa_con_la_cache_configurada(self):
+        configurada = dict(importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE']).CACHES['default'])
+        if configurada['BACKEND'] != 'django.core.cache.backends.filebased.FileBasedCache':
+            self.skipTest('La caché configurada no es la de archivos.')
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        with override_settings(CACHES={'default': {**configurada, 'LOCATION': directorio.name}}):
+            Dispositivo.objects.bulk_create([Dispositivo(codigo=f'flota-{i}') for i in range(200)])
+            dispositivos.invalidar_dispositivos()
+            for i in range(200):
+                self.put(f'flota-{i}', 40.0 + i % 10)
+            self.client.get('/api/dispositivos/estado/')  # Carga el estado del servomotor de todos
+            total = Dispositivo.objects.count()
+            with CaptureQueriesContext(connection) as consultas:
+                for i in range(200):
+                    self.assertEqual(self.client.get(f'/api/sensor_data/?dispositivo=flota-{i}').json()['temperature'], 40.0 + i % 10)
+                for _ in range(3):
+                    self.assertEqual(len(self.client.get('/api/dispositivos/estado/').json()), total)
+            self.assertEqual(len(consultas), 0)
+
+    def test_lectura_atrasada_no_reemplaza_a_la_mas_nueva(self):
+        ahora = timezone.now()
+        lotes = [
+            [SensorData(dispositivo=self.dispositivos[0], temperature=30, humidity=50, timestamp=ahora),
+             SensorData(dispositivo=self.dispositivos[0], temperature=10, humidity=50, timestamp=ahora - timedelta(minutes=5))],
+            [SensorData(dispositivo=self.dispositivos[0], temperature=20, humidity=50, timestamp=ahora - timedelta(minutes=1))],
+        ]
+        for lote in lotes:
+            dispositivos.guardar_ultimas_lecturas(SensorData.objects.bulk_create(lote))
+        self.assertEqual(dispositivos.ultima_lectura(self.dispositivos[0].id)['temperature'], 30)
+
+    def test_estado_de_todos_desde_la_cache(self):
+        for i, dispositivo in enumerate(self.dispositivos):
+            self.put(dispositivo.codigo, 40.0 + i)
+        self.client.get('/api/dispositivos/estado/')
+        with CaptureQueriesContext(connection) as consultas:
+            estado = {fila['dispositivo']: fila for fila in self.client.get('/api/dispositivos/estado/').json()}
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual([estado[f'bin-{i}']['sensor']['temperature'] for i in range(3)], [40.0, 41.0, 42.0])
+
+# Pruebas del estado del servomotor por SSE: estado inicial, cambios publicados, keepalive y cambios de otros workers
+class ServoStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dispositivos._ids_por_codigo.clear()
+        self.dispositivo = Dispositivo.objects.create(codigo='bin-1')
+
+    async def test_eventos_y_keepalive(self):
+        response = await servo_stream.servo_motor_state_stream(RequestFactory().get('/api/servo_motor_state/stream/?dispositivo=bin-1'))
+        self.assertEqual((response['Content-Type'], response['Cache-Control']), ('text/event-stream', 'no-cache'))
+        eventos = aiter(response.streaming_content)
+        with mock.patch.object(servo_stream, 'SERVO_KEEPALIVE_SEGUNDOS', 0.05):
+            self.assertEqual(await anext(eventos), b'data: {"is_active": false}\n\n')  # Estado inicial
+            await servo_stream.publicar_estado_servo_async(self.dispositivo.id, {'is_active': True})
+            self.assertEqual(await anext(eventos), b'data: {"is_active": true}\n\n')
+            await servo_stream.publicar_estado_servo_async(self.dispositivo.id, {'is_active': True})  # Sin cambios: no se reenvía
+            self.assertEqual(await anext(eventos), b': keepalive\n\n')
+
+            # Otro worker cambia el estado: solo queda el sello de versión en la caché compartida
+            await ServoMotorState.objects.acreate(dispositivo=self.dispositivo, is_active=False)
+            await cache.aset(servo_stream.SERVO_VERSION_KEY.format(self.dispositivo.id), 'otro-worker', None)
+            self.assertEqual(await anext(eventos), b'data: {"is_active": false}\n\n')
+        # Al desconectarse el cliente, el servidor ASGI cancela la tarea que espera el siguiente evento
+        espera = asyncio.ensure_future(anext(eventos))
+        await asyncio.sleep(0.01)
+        espera.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await espera
+        self.assertFalse(broker._suscriptores[self.dispositivo.id])
+
+    async def test_dispositivo_inexistente(self):
+        response = await servo_stream.servo_motor_state_stream(RequestFactory().get('/api/servo_motor_state/stream/?dispositivo=no-existe'))
+        self.assertEqual(response.status_code, 404)
+
+# Prueba del benchmark de conexiones lentas en WSGI y ASGI dentro del proceso
+class BenchmarkConexionesTests(TransactionTestCase):
+    def test_wsgi_y_asgi_registran_todas_las_lecturas(self):
+        dispositivos._ids_por_codigo.clear()
+        # La base de prueba de SQLite en memoria (caché compartida) responde "database table is locked" sin esperar
+        # cuando dos hilos escriben a la vez: un solo hilo WSGI y, en ASGI, el ORM de todas las solicitudes en el
+        # mismo hilo (sin un ThreadSensitiveContext por solicitud)
+        with mock.patch('django.core.handlers.asgi.ThreadSensitiveContext', contextlib.nullcontext):
+            informe = comparar_conexiones(clientes=10, latencia_ms=20, fragmentos=2, hilos=1)
+        for modo in ('wsgi', 'asgi'):
+            self.assertEqual(informe['resultados'][modo]['status'], {'200': 10}, modo)
+        self.assertEqual(SensorData.objects.count(), 22)  # 11 lecturas por modo (con la de calentamiento)
+
+# Pruebas del control automático del servomotor: estadísticas móviles, histéresis, eventos y recuperación
+class ControlServoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dispositivos._ids_por_codigo.clear()
+        control._estados.clear()
+        self.dispositivo = Dispositivo.objects.create(codigo='bin-1')
+        UmbralControl.objects.create(dispositivo=self.dispositivo, variable='temperature', encender=50, apagar=40, alpha=0.5)
+
+    async def enviar(self, *temperaturas):
+        for temperatura in temperaturas:
+            response = await self.async_client.put(
+                '/api/sensor_data/?dispositivo=bin-1', {'temperature': temperatura, 'humidity': 50}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+
+    async def servo_activo(self):
+        servo_motor_state = await ServoMotorState.objects.filter(dispositivo=self.dispositivo).afirst()
+        return servo_motor_state is not None and servo_motor_state.is_active
+
+    def test_media_y_varianza_movil(self):
+        estadistica = control.EstadisticaMovil()
+        for valor in (10, 12, 11, 13):
+            estadistica.actualizar(valor, 0.5)
+        self.assertAlmostEqual(estadistica.media, 12.0)  # 10 -> 11 -> 11 -> 12
+        self.assertAlmostEqual(estadistica.varianza, 1.25)
+
+    async def test_histeresis_y_eventos(self):
+        with mock.patch('api.control.recuperar_estado', wraps=control.recuperar_estado) as recuperar:
+            await self.enviar(30, 40, 45)  # Media 30 (la primera lectura), 35, 40 -> todavía apagado
+            self.assertFalse(await self.servo_activo())
+            await self.enviar(60)  # Media 50 -> encender
+            self.assertTrue(await self.servo_activo())
+            await self.enviar(35, 45)  # Media 42.5, 43.75: entre los umbrales sigue encendido
+            self.assertTrue(await self.servo_activo())
+            await self.enviar(30)  # Media 36.9 -> apagar
+            self.assertFalse(await self.servo_activo())
+        self.assertEqual(recuperar.call_count, 1)  # El historial solo se leyó con la primera lectura
+        medias = [evento.media async for evento in EventoControl.objects.order_by('id')]
+        self.assertEqual([round(media, 3) for media in medias], [50.0, 36.875])  # Sin ninguna lectura en cero en la media
+        eventos = [(evento.tipo, evento.valor) async for evento in EventoControl.objects.order_by('id')]
+        self.assertEqual(eventos, [('encendido', 60.0), ('apagado', 30.0)])
+        self.assertEqual((await self.async_client.get('/api/control/eventos/?dispositivo=bin-1&tipo=apagado')).json()['results'][0]['valor'], 30.0)
+
+    async def test_lecturas_anomalas(self):
+        await self.enviar(*[30 + i % 2 for i in range(25)], 80)
+        anomalias = [evento async for evento in EventoControl.objects.filter(tipo='anomalia')]
+        self.assertEqual([evento.valor for evento in anomalias], [80.0])
+
+    def media(self):
+        return EstadoControlDispositivo.objects.get(dispositivo=self.dispositivo).estadisticas['temperature'][0]
+
+    async def test_recupera_el_estado_desde_las_lecturas_recientes(self):
+        await self.enviar(20, 30, 40, 48)
+        media = await sync_to_async(self.media)()
+        control._estados.clear()  # Reinicio del proceso: el estado sigue en la fila, sin leer el historial
+        await EstadoControlDispositivo.objects.all().adelete()  # Sin fila (primera lectura): se lee el historial
+        with mock.patch('api.control.recuperar_estado', wraps=control.recuperar_estado) as recuperar:
+            await self.enviar(56)
+            control._estados.clear()
+            await self.enviar(56)
+        self.assertEqual(recuperar.call_count, 1)
+        media = media + 0.5 * (56 - media)
+        self.assertAlmostEqual(await sync_to_async(self.media)(), media + 0.5 * (56 - media))
+
+    # Dos workers que se alternan las lecturas de un dispositivo (cada uno con su memoria de proceso)
+    async def test_workers_comparten_el_estado(self):
+        otro_worker = {}
+        with mock.patch('api.control.recuperar_estado', wraps=control.recuperar_estado) as recuperar:
+            for i, temperatura in enumerate((30, 40, 45, 60, 35, 45, 30)):
+                with mock.patch.object(control, '_estados', otro_worker if i % 2 else control._estados):
+                    await self.enviar(temperatura)
+        self.assertEqual(recuperar.call_count, 1)  # Solo en la primera lectura del dispositivo
+        eventos = [(evento.tipo, evento.valor, round(evento.media, 3)) async for evento in EventoControl.objects.order_by('id')]
+        self.assertEqual(eventos, [('encendido', 60.0, 50.0), ('apagado', 30.0, 36.875)])  # Igual que con un solo worker
+        self.assertEqual((await EstadoControlDispositivo.objects.aget(dispositivo=self.dispositivo)).version, 7)
+
+    def test_umbrales_por_api(self):
+        response = self.client.post('/api/control/umbrales/', {'variable': 'humidity', 'encender': 70, 'apagar': 70}, format='json')
+        self.assertEqual(response.status_code, 400)
+        version = cache.get(control.CONTROL_VERSION_KEY)
+        response = self.client.post('/api/control/umbrales/', {'variable': 'humidity', 'encender': 70, 'apagar': 60}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(cache.get(control.CONTROL_VERSION_KEY), version)  # Los workers releen los umbrales
+        response = self.client.post('/api/control/umbrales/', {'variable': 'humidity', 'encender': 80, 'apagar': 60}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)  # Ya hay un umbral de humedad para todos los dispositivos
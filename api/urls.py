@@ -1,5 +1,7 @@
 from django.urls import path
-from .views import canjes_por_proveedor, kilos_intercambiados,sensor_data_detail, servo_motor_state_detail,login_user,configuracion_detail,TransaccionesList,kilos_list_create,TransaccionDetail,KiloDetail,update_user,UserList,UserDetail,register, login, ProveedorList, ClienteList, ProductoList, canjear_puntos, consultar_puntos, register_proveedor, proveedor_profile, ProveedorDetail, ClienteDetail, ProductoDetail
+from .sensores import sensor_data_detail, sensor_data_batch, servo_motor_state_detail
+from .servo_stream import servo_motor_state_stream
+from .views import canjes_por_proveedor, kilos_intercambiados, DispositivoList, dispositivos_estado, UmbralControlList, UmbralControlDetail, EventoControlList, login_user,configuracion_detail,TransaccionesList,kilos_list_create, kilos_batch, kilos_export, transacciones_export,TransaccionDetail,KiloDetail,update_user,UserList,UserDetail,register, login, ProveedorList, ClienteList, clientes_search, ProductoList, canjear_puntos, consultar_puntos, ranking_proveedores, ranking_proveedor, register_proveedor, proveedor_profile, ProveedorDetail, ClienteDetail, ProductoDetail
 
 urlpatterns = [
     path('register/', register),
@@ -10,21 +12,34 @@ urlpatterns = [
     path('usuarios/<int:pk>/', UserDetail.as_view(), name='user-detail'),
     path('proveedores/<int:pk>/', ProveedorDetail.as_view(), name='proveedor-detail'),
     path('clientes/', ClienteList.as_view(), name='clientes-list'),
+    path('clientes/search/', clientes_search, name='clientes-search'),
     path('clientes/<int:pk>/', ClienteDetail.as_view(), name='cliente-detail'),
     path('productos/', ProductoList.as_view(), name='productos-list'),
     path('productos/<int:pk>/', ProductoDetail.as_view(), name='productos-detail'),
     path('canjear_puntos/', canjear_puntos, name='canjear-puntos'),
     path('consultar_puntos/<int:proveedor_id>/', consultar_puntos, name='consultar-puntos'),
+    path('ranking/', ranking_proveedores, name='ranking'),
+    path('ranking/<int:proveedor_id>/', ranking_proveedor, name='ranking-proveedor'),
     path('register_proveedor/', register_proveedor, name='register-prove'),
     path('profile_proveedor/', proveedor_profile, name='proveedor-profile'),
     path('kilos/', kilos_list_create, name='kilos-list'),
+    path('kilos/batch/', kilos_batch, name='kilos-batch'),
+    path('kilos/export/', kilos_export, name='kilos-export'),
     path('kilos/<int:pk>/', KiloDetail.as_view() , name='kilo-detail'),
     path('transacciones/', TransaccionesList.as_view(), name='transaccion-list'),
+    path('transacciones/export/', transacciones_export, name='transaccion-export'),
     path('transacciones/<int:pk>/', TransaccionDetail.as_view(), name='transaccion-detail'),
     path('update-user/<int:pk>/', update_user, name='update-user'),
     path('configuracion/', configuracion_detail, name='configuracion'),
+    path('dispositivos/', DispositivoList.as_view(), name='dispositivos-list'),
+    path('dispositivos/estado/', dispositivos_estado, name='dispositivos-estado'),
     path('sensor_data/', sensor_data_detail, name='sensor_data_detail'),
+    path('sensor_data/batch/', sensor_data_batch, name='sensor_data_batch'),
     path('servo_motor_state/', servo_motor_state_detail, name='servo_motor_state_detail'),
+    path('servo_motor_state/stream/', servo_motor_state_stream, name='servo_motor_state_stream'),
+    path('control/umbrales/', UmbralControlList.as_view(), name='control-umbrales'),
+    path('control/umbrales/<int:pk>/', UmbralControlDetail.as_view(), name='control-umbral-detail'),
+    path('control/eventos/', EventoControlList.as_view(), name='control-eventos'),
     path('canjes_por_proveedor/', canjes_por_proveedor, name='canjes_por_proveedor'),
     path('kilos_intercambiados/', kilos_intercambiados, name='kilos_intercambiados'),
 ]
@@ -1,29 +1,57 @@
-from django.db.models.functions import TruncMonth
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from urllib.parse import urlencode
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import status, generics
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Proveedor, Cliente, Producto, Transaccion, KiloProveedor, Configuracion, ServoMotorState, SensorData
-from .serializers import ConfiguracionSerializer, ProveedorSerializer, ClienteSerializer, ProductoSerializer, TransaccionSerializer, KiloProveedorSerializer, UserSerializer, ServoSerializer, SensorSerializer
-from django.db.models import Sum
-
-# Vista para obtener las transacciones de canje realizadas por un proveedor
+from rest_framework.decorators import api_view, authentication_classes, renderer_classes
+from rest_framework.exceptions import ValidationError
+from .models import Proveedor, Cliente, Producto, Transaccion, KiloProveedor, KiloMensualProveedor, Configuracion, Dispositivo, UmbralControl, EventoControl
+from .serializers import ConfiguracionSerializer, ProveedorSerializer, ClienteSerializer, ProductoSerializer, TransaccionSerializer, KiloProveedorSerializer, KiloProveedorLoteSerializer, UserSerializer, DispositivoSerializer, UmbralControlSerializer, EventoControlSerializer
+from .authentication import ClaimsJWTAuthentication, buscar_proveedor_id, proveedor_id_de, tokens_para_usuario
+from .clientes import BUSQUEDA_LIMITE, BUSQUEDA_LIMITE_MAX, BUSQUEDA_MIN_CARACTERES, buscar_clientes
+from .catalogo import estado_catalogo, catalogo_renderizado, respuesta_condicional
+from .configuracion import obtener_configuracion, invalidar_configuracion
+from .control import invalidar_umbrales
+from .dispositivos import invalidar_dispositivos, estado_de_todos
+from .exportaciones import CAMPOS_KILO, CAMPOS_TRANSACCION, FORMATOS_EXPORTACION, exportar, kilos_filtrados, transacciones_filtradas
+from .imagenes import actualizar_derivados, srcset
+from .kilos_mensuales import mes_de, sumar_kilos_mensuales
+from .pagination import KeysetPagination
+from .renderizado import COLUMNAS_KILO, COLUMNAS_PRODUCTO, COLUMNAS_TRANSACCION, JSONRapidoRenderer, filas_kilos, filas_productos, filas_transacciones
+from .ranking import CRITERIOS_RANKING, PERIODO_TOTAL, RANKING_LIMITE, RANKING_LIMITE_MAX, posicion, sumar_ranking, top
+from .puntos import acreditar_puntos, acreditar_puntos_agrupados, ajustar_puntos, descontar_puntos, registrar_canje
+
+KILOS_BATCH_MAX_SIZE = 1000  # Máximo de registros de kilos aceptados por lote
+
+# Vista para obtener las transacciones de canje realizadas por un proveedor (paginada por cursor)
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 def canjes_por_proveedor(request):
-    user = request.user  # Obtener el usuario autenticado
     try:
-        proveedor = Proveedor.objects.get(user=user)  # Obtener el proveedor asociado al usuario
-        transacciones = Transaccion.objects.filter(proveedor=proveedor)  # Obtener todas las transacciones del proveedor
-        
+        proveedor_id = proveedor_id_de(request)  # Obtener el proveedor del usuario autenticado (desde el token)
+        # Traer cada transacción junto con su producto en una sola consulta
+        transacciones = Transaccion.objects.filter(proveedor_id=proveedor_id).select_related('producto')
+        paginator = KeysetPagination()
+        pagina = paginator.paginate_queryset(transacciones, request)
+
+        imagenes = {}  # URL absoluta de la imagen por producto, calculada una sola vez
+        srcsets = {}  # URLs de las versiones reducidas por producto
         response_data = []  # Lista para almacenar los datos de respuesta
-        for transaccion in transacciones:
+        for transaccion in pagina:
             producto = transaccion.producto
-            # Construir la URL absoluta de la imagen del producto, si existe
-            imagen_url = request.build_absolute_uri(producto.imagen.url) if producto.imagen else None
+            if producto.id not in imagenes:
+                # Construir la URL absoluta de la imagen del producto, si existe
+                imagenes[producto.id] = request.build_absolute_uri(producto.imagen.url) if producto.imagen else None
+                srcsets[producto.id] = srcset(producto, request)
             transaccion_data = {
                 "id": transaccion.id,
-                "proveedor": transaccion.proveedor.id,
+                "proveedor": transaccion.proveedor_id,
                 "producto": {
                     "id": producto.id,
                     "nombre": producto.nombre,
@@ -31,7 +59,8 @@ def canjes_por_proveedor(request):
                     "precio": str(producto.precio),  # Convertir el precio a cadena para evitar problemas de serialización
                     "puntos_requeridos": producto.puntos_requeridos,
                     "tipo": producto.tipo,
-                    "imagen": imagen_url
+                    "imagen": imagenes[producto.id],
+                    "imagen_srcset": srcsets[producto.id]
                 },
                 "cantidad": transaccion.cantidad,
                 "puntos_utilizados": transaccion.puntos_utilizados,
@@ -39,25 +68,24 @@ def canjes_por_proveedor(request):
             }
             response_data.append(transaccion_data)  # Agregar los datos de la transacción a la lista de respuesta
         
-        return Response(response_data, status=status.HTTP_200_OK)  # Devolver la respuesta con los datos de las transacciones
+        return paginator.get_paginated_response(response_data)  # Devolver la página con los datos de las transacciones y los cursores
     
     except Proveedor.DoesNotExist:
         return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)  # Devolver un error si el proveedor no existe
 
 # Vista para obtener los kilos intercambiados por un proveedor, agrupados por mes
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 def kilos_intercambiados(request):
-    user = request.user  # Obtener el usuario autenticado
     try:
-        proveedor = Proveedor.objects.get(user=user)  # Obtener el proveedor asociado al usuario
-        kilos = KiloProveedor.objects.filter(proveedor=proveedor)  # Obtener todos los registros de kilos del proveedor
-        # Agrupar los registros por mes y sumar los kilos por mes
-        kilos_by_month = kilos.annotate(month=TruncMonth('fecha')).values('month').annotate(total_kilos=Sum('kilos')).order_by('month')
+        proveedor_id = proveedor_id_de(request)  # Obtener el proveedor del usuario autenticado (desde el token)
+        # Leer los totales mensuales ya calculados del proveedor (lectura por índice)
+        kilos_by_month = KiloMensualProveedor.objects.filter(proveedor_id=proveedor_id, registros__gt=0).order_by('mes').values('mes', 'total_kilos')
         
         response_data = []  # Lista para almacenar los datos de respuesta
         for entry in kilos_by_month:
             response_data.append({
-                'month': entry['month'].strftime('%Y-%m'),  # Formatear la fecha del mes
+                'month': entry['mes'].strftime('%Y-%m'),  # Formatear la fecha del mes
                 'total_kilos': entry['total_kilos']  # Total de kilos intercambiados en el mes
             })
 
@@ -78,7 +106,7 @@ def register(request):
         return Response({'error': 'El nombre de usuario ya existe'}, status=status.HTTP_400_BAD_REQUEST)  # Verificar que el nombre de usuario no exista ya
 
     user = User.objects.create_user(username=username, password=password)  # Crear el nuevo usuario
-    refresh = RefreshToken.for_user(user)  # Crear tokens JWT para el usuario
+    refresh = tokens_para_usuario(user, None)  # Crear tokens JWT para el usuario
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -105,7 +133,7 @@ def update_user(request, pk):
 
     user.save()  # Guardar los cambios
 
-    refresh = RefreshToken.for_user(user)  # Crear nuevos tokens JWT para el usuario
+    refresh = tokens_para_usuario(user, buscar_proveedor_id(user))  # Crear nuevos tokens JWT para el usuario
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -129,7 +157,7 @@ def login(request):
     if user is None or not user.check_password(password):
         return Response({'error': 'Credenciales inválidas'}, status=status.HTTP_401_UNAUTHORIZED)  # Verificar las credenciales
 
-    refresh = RefreshToken.for_user(user)  # Crear tokens JWT para el usuario
+    refresh = tokens_para_usuario(user, buscar_proveedor_id(user))  # Crear tokens JWT con el nombre y el proveedor del usuario
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -152,7 +180,7 @@ def login_user(request):
     if Proveedor.objects.filter(user=user).exists():
         return Response({'error': 'El usuario es un proveedor y no puede iniciar sesión aquí'}, status=status.HTTP_403_FORBIDDEN)  # Restricción adicional para proveedores
 
-    refresh = RefreshToken.for_user(user)  # Crear tokens JWT para el usuario
+    refresh = tokens_para_usuario(user, None)  # Crear tokens JWT para el usuario
     return Response({
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -173,16 +201,48 @@ class ProveedorList(generics.ListCreateAPIView):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
 
+    def perform_create(self, serializer):
+        guardar_proveedor(serializer)
+
 # Vista basada en clase para obtener, actualizar o eliminar un proveedor específico
 class ProveedorDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Proveedor.objects.all()
     serializer_class = ProveedorSerializer
 
+    def perform_update(self, serializer):
+        guardar_proveedor(serializer)
+
+# Guarda el proveedor y aplica `ajuste_puntos` al saldo con un UPDATE atómico registrado en el libro y en el
+# ranking, en lugar de escribir el saldo leído por el serializador (que pisaría las acreditaciones y canjes simultáneos)
+def guardar_proveedor(serializer):
+    ajuste = serializer.validated_data.pop('ajuste_puntos', 0)
+    with transaction.atomic():
+        proveedor = serializer.save()
+        if ajuste:
+            if not ajustar_puntos(proveedor.id, ajuste):
+                raise ValidationError({'ajuste_puntos': 'El saldo del proveedor no puede quedar negativo.'})
+            proveedor.refresh_from_db(fields=['puntos_acumulados'])
+
 # Vista basada en clase para listar y crear clientes
 class ClienteList(generics.ListCreateAPIView):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
 
+# Vista para buscar clientes por DNI, RUC o el comienzo del nombre o los apellidos (?q=, ?limit=)
+@api_view(['GET'])
+def clientes_search(request):
+    q = request.query_params.get('q', '').strip()
+    if len(q) < BUSQUEDA_MIN_CARACTERES:
+        return Response({'error': f'q debe tener al menos {BUSQUEDA_MIN_CARACTERES} caracteres.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limite = min(int(request.query_params.get('limit', BUSQUEDA_LIMITE)), BUSQUEDA_LIMITE_MAX)
+    except ValueError:
+        limite = 0
+    if limite < 1:
+        return Response({'error': 'limit debe ser un número entero mayor que cero.'}, status=status.HTTP_400_BAD_REQUEST)
+    clientes, hay_mas = buscar_clientes(q, limite)
+    return Response({'resultados': ClienteSerializer(clientes, many=True).data, 'hay_mas': hay_mas})  # Devolver los clientes encontrados
+
 # Vista basada en clase para obtener, actualizar o eliminar un cliente específico
 class ClienteDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Cliente.objects.all()
@@ -192,48 +252,91 @@ class ClienteDetail(generics.RetrieveUpdateDestroyAPIView):
 class ProductoList(generics.ListCreateAPIView):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
+    renderer_classes = [JSONRapidoRenderer, BrowsableAPIRenderer]
+
+    # Servir la página pedida desde el catálogo pre-renderizado, con ETag / Last-Modified
+    def list(self, request, *args, **kwargs):
+        estado = estado_catalogo()
+        url = self.url_canonica(request)  # Las URLs de las imágenes y de los cursores dependen del host y de la página
+        return respuesta_condicional(
+            request,
+            etag=f"{estado['version']}-{hashlib.md5(url.encode()).hexdigest()}",
+            construir_contenido=lambda: catalogo_renderizado(estado, url, lambda: self.pagina(request, url)),
+            last_modified=estado['modificado'],
+        )
+
+    # URL de la página pedida solo con los parámetros que lee la vista (cursor y limit), para que otros
+    # parámetros no creen entradas nuevas en la caché
+    def url_canonica(self, request):
+        paginador = self.paginator
+        params = {}
+        if request.query_params.get(paginador.cursor_query_param):
+            params[paginador.cursor_query_param] = request.query_params[paginador.cursor_query_param]
+        limite = paginador.get_page_size(request)
+        if limite != paginador.page_size:
+            params[paginador.page_size_query_param] = limite
+        return request.build_absolute_uri(request.path) + (f'?{urlencode(params)}' if params else '')
+
+    # Página pedida leída con .values(), con la misma salida que ProductoSerializer (ver api/renderizado.py)
+    def pagina(self, request, url):
+        pagina = self.paginate_queryset(self.get_queryset().values(*COLUMNAS_PRODUCTO))
+        self.paginator.base_url = url  # Enlaces next / previous sobre la URL canónica
+        return self.get_paginated_response(filas_productos(pagina, request)).data
+
+    def perform_create(self, serializer):
+        actualizar_derivados(serializer.save())  # Miniaturas y WebP de la imagen subida
 
 # Vista basada en clase para obtener, actualizar o eliminar un producto específico
 class ProductoDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
 
+    def perform_update(self, serializer):
+        actualizar_derivados(serializer.save())  # Solo se regeneran si cambió la imagen
+
 # Vista para canjear puntos por productos
 @api_view(['POST'])
 def canjear_puntos(request):
-    proveedor_id = request.data.get('proveedor_id')  # Obtener el ID del proveedor del cuerpo de la solicitud
-    producto_id = request.data.get('producto_id')  # Obtener el ID del producto del cuerpo de la solicitud
-    cantidad = request.data.get('cantidad', 1)  # Obtener la cantidad deseada (por defecto 1)
+    try:
+        proveedor_id = int(request.data.get('proveedor_id'))  # Obtener el ID del proveedor del cuerpo de la solicitud
+        producto_id = int(request.data.get('producto_id'))  # Obtener el ID del producto del cuerpo de la solicitud
+        cantidad = int(request.data.get('cantidad', 1))  # Obtener la cantidad deseada (por defecto 1)
+    except (TypeError, ValueError):
+        return Response({'error': 'proveedor_id, producto_id y cantidad deben ser números enteros.'}, status=status.HTTP_400_BAD_REQUEST)
+    if cantidad < 1:
+        return Response({'error': 'La cantidad debe ser mayor que cero.'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        proveedor = Proveedor.objects.get(id=proveedor_id)  # Obtener el proveedor por su ID
         producto = Producto.objects.get(id=producto_id)  # Obtener el producto por su ID
+    except Producto.DoesNotExist:
+        return Response({'error': 'Producto no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
-        if producto.tipo != 'C':  # Verificar que el producto esté disponible para canje
-            return Response({'error': 'El producto no está disponible para canje.'}, status=status.HTTP_400_BAD_REQUEST)
+    if producto.tipo != 'C':  # Verificar que el producto esté disponible para canje
+        return Response({'error': 'El producto no está disponible para canje.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        puntos_requeridos = producto.puntos_requeridos * cantidad  # Calcular los puntos requeridos para el canje
-        if proveedor.puntos_acumulados < puntos_requeridos:  # Verificar que el proveedor tenga suficientes puntos
-            return Response({'error': 'No tienes suficientes puntos para este canje.'}, status=status.HTTP_400_BAD_REQUEST)
+    if producto.puntos_requeridos is None:  # Producto de canje sin precio en puntos
+        return Response({'error': 'El producto no tiene un precio en puntos.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        proveedor.puntos_acumulados -= puntos_requeridos  # Restar los puntos utilizados del proveedor
-        proveedor.save()
+    puntos_requeridos = producto.puntos_requeridos * cantidad  # Calcular los puntos requeridos para el canje
+    with transaction.atomic():
+        # Verificar el saldo y descontar los puntos en una sola sentencia UPDATE condicional
+        if not descontar_puntos(proveedor_id, puntos_requeridos):
+            if not Proveedor.objects.filter(id=proveedor_id).exists():
+                return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'error': 'No tienes suficientes puntos para este canje.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Crear una nueva transacción de canje
+        # Crear una nueva transacción de canje y registrarla en el libro de puntos
         transaccion = Transaccion.objects.create(
-            proveedor=proveedor,
+            proveedor_id=proveedor_id,
             producto=producto,
             cantidad=cantidad,
             puntos_utilizados=puntos_requeridos,
             tipo='C'
         )
+        registrar_canje(transaccion)
+        sumar_ranking(proveedor_id, transaccion.fecha, puntos=-puntos_requeridos)  # Bajar en el ranking de puntos
 
-        return Response(TransaccionSerializer(transaccion).data, status=status.HTTP_201_CREATED)  # Devolver los datos de la transacción creada
-
-    except Proveedor.DoesNotExist:
-        return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
-    except Producto.DoesNotExist:
-        return Response({'error': 'Producto no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(TransaccionSerializer(transaccion).data, status=status.HTTP_201_CREATED)  # Devolver los datos de la transacción creada
 
 # Vista para consultar los puntos acumulados por un proveedor
 @api_view(['GET'])
@@ -244,6 +347,39 @@ def consultar_puntos(request, proveedor_id):
     except Proveedor.DoesNotExist:
         return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
+# Criterio (?por=kilos|puntos) y periodo (?mes=AAAA-MM, o el histórico) del ranking; lanza ValueError si son inválidos
+def parametros_ranking(request):
+    criterio = request.query_params.get('por', 'kilos')
+    if criterio not in CRITERIOS_RANKING:
+        raise ValueError(criterio)
+    mes = request.query_params.get('mes')
+    periodo = f"{datetime.strptime(mes, '%Y-%m'):%Y-%m}" if mes else PERIODO_TOTAL
+    return criterio, periodo
+
+# Vista para el ranking de proveedores por kilos entregados o por puntos (?por=, ?mes=, ?limit=)
+@api_view(['GET'])
+def ranking_proveedores(request):
+    try:
+        criterio, periodo = parametros_ranking(request)
+        limite = min(int(request.query_params.get('limit', RANKING_LIMITE)), RANKING_LIMITE_MAX)
+    except ValueError:
+        return Response({'error': 'por debe ser kilos o puntos, mes AAAA-MM y limit un número entero.'}, status=status.HTTP_400_BAD_REQUEST)
+    if limite < 1:
+        return Response({'error': 'limit debe ser mayor que cero.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'por': criterio, 'periodo': periodo, 'resultados': top(criterio, periodo, limite)})  # Devolver los primeros del ranking
+
+# Vista para consultar la posición de un proveedor en el ranking (?por=, ?mes=)
+@api_view(['GET'])
+def ranking_proveedor(request, proveedor_id):
+    try:
+        criterio, periodo = parametros_ranking(request)
+    except ValueError:
+        return Response({'error': 'por debe ser kilos o puntos y mes AAAA-MM.'}, status=status.HTTP_400_BAD_REQUEST)
+    resultado = posicion(proveedor_id, criterio, periodo)
+    if resultado is None:
+        return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'por': criterio, 'periodo': periodo, **resultado})  # Devolver la posición del proveedor
+
 # Vista para registrar un nuevo proveedor
 @api_view(['POST'])
 def register_proveedor(request):
@@ -255,23 +391,34 @@ def register_proveedor(request):
 
     try:
         user = User.objects.create_user(username=username, password=password)  # Crear el nuevo usuario
-        Proveedor.objects.create(user=user, puntos_acumulados=0)  # Crear el nuevo proveedor asociado al usuario
-        return Response({'message': 'User registered successfully.'}, status=status.HTTP_201_CREATED)  # Devolver mensaje de éxito
+        proveedor = Proveedor.objects.create(user=user, puntos_acumulados=0)  # Crear el nuevo proveedor asociado al usuario
+        refresh = tokens_para_usuario(user, proveedor.id)  # Crear tokens JWT con el proveedor en sus claims
+        return Response({
+            'message': 'User registered successfully.',
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }, status=status.HTTP_201_CREATED)  # Devolver mensaje de éxito y los tokens
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)  # Devolver error en caso de fallo
 
 # Vista para obtener el perfil de un proveedor
 @api_view(['GET'])
+@authentication_classes([ClaimsJWTAuthentication])
 def proveedor_profile(request):
-    user = request.user  # Obtener el usuario autenticado
+    user = request.user  # Usuario autenticado, construido desde los claims del token
     try:
-        proveedor = Proveedor.objects.get(user=user)  # Obtener el proveedor asociado al usuario
-        productos = Producto.objects.filter(tipo='C')  # Obtener todos los productos disponibles para canje
-        return Response({
-            'user_name': user.username,
+        proveedor = Proveedor.objects.get(id=proveedor_id_de(request))  # Obtener el proveedor asociado al usuario
+        # Catálogo de productos disponibles para canje, ya renderizado para la versión vigente
+        productos = catalogo_renderizado(
+            estado_catalogo(), 'perfil:canje',
+            lambda: filas_productos(Producto.objects.filter(tipo='C').values(*COLUMNAS_PRODUCTO)),
+        )
+        perfil = JSONRenderer().render({
+            'user_name': user.username or User.objects.values_list('username', flat=True).get(id=user.id),  # Tokens emitidos antes de incluir el claim
             'proveedor': ProveedorSerializer(proveedor).data,
-            'productos': ProductoSerializer(productos, many=True).data
-        }, status=status.HTTP_200_OK)  # Devolver los datos del proveedor y productos
+        })
+        contenido = perfil[:-1] + b',"productos":' + productos + b'}'  # Agregar el catálogo al final del objeto JSON
+        return respuesta_condicional(request, etag=hashlib.md5(contenido).hexdigest(), contenido=contenido)  # Devolver los datos del proveedor y productos (o 304)
     except Proveedor.DoesNotExist:
         return Response({'error': 'Proveedor no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -279,6 +426,42 @@ def proveedor_profile(request):
 class TransaccionesList(generics.ListCreateAPIView):
     queryset = Transaccion.objects.all()
     serializer_class = TransaccionSerializer
+    renderer_classes = [JSONRapidoRenderer, BrowsableAPIRenderer]
+
+    # Listar con .values() en lugar del serializador, con la misma salida (ver api/renderizado.py)
+    def list(self, request, *args, **kwargs):
+        pagina = self.paginate_queryset(self.get_queryset().values(*COLUMNAS_TRANSACCION))
+        return self.get_paginated_response(filas_transacciones(pagina))
+
+# Filtros comunes de las exportaciones (?proveedor=, ?from=, ?to=); lanza ValueError si alguno es inválido
+def filtros_exportacion(request):
+    params = request.query_params
+    return {
+        'proveedor_id': int(params['proveedor']) if 'proveedor' in params else None,
+        'desde': parse_fecha(params['from']) if 'from' in params else None,
+        'hasta': parse_fecha(params['to']) if 'to' in params else None,
+    }
+
+# Respuesta que envía la exportación por partes a medida que se leen los bloques de filas
+def respuesta_exportacion(queryset, campos, formato, nombre):
+    response = StreamingHttpResponse(exportar(queryset, campos, formato), content_type=FORMATOS_EXPORTACION[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nombre}-{timezone.now():%Y%m%d}.{formato}"'
+    return response
+
+# Vista para exportar todas las transacciones en CSV o NDJSON (?formato=csv|ndjson, ?proveedor=, ?tipo=, ?from=, ?to=)
+@api_view(['GET'])
+def transacciones_export(request):
+    formato = request.query_params.get('formato', 'csv')
+    tipo = request.query_params.get('tipo')
+    if formato not in FORMATOS_EXPORTACION:
+        return Response({'error': 'formato debe ser csv o ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+    if tipo is not None and tipo not in ('V', 'C'):
+        return Response({'error': 'tipo debe ser V o C.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        filtros = filtros_exportacion(request)
+    except ValueError:
+        return Response({'error': 'Parámetros proveedor, from o to inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+    return respuesta_exportacion(transacciones_filtradas(tipo=tipo, **filtros), CAMPOS_TRANSACCION, formato, 'transacciones')
 
 # Vista basada en clase para obtener, actualizar o eliminar una transacción específica
 class TransaccionDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -287,83 +470,186 @@ class TransaccionDetail(generics.RetrieveUpdateDestroyAPIView):
 
 # Vista para listar y crear registros de kilos de proveedores
 @api_view(['GET', 'POST'])
+@renderer_classes([JSONRapidoRenderer, BrowsableAPIRenderer])
 def kilos_list_create(request):
-    configuracion = Configuracion.objects.first()  # Obtener la configuración (o crearla si no existe)
-    if not configuracion:
-        configuracion = Configuracion.objects.create()
-
-    conversion_rate = configuracion.conversion_rate  # Obtener la tasa de conversión de la configuración
+    conversion_rate = obtener_configuracion().conversion_rate  # Obtener la tasa de conversión de la configuración (en memoria)
 
     if request.method == 'GET':
-        kilos = KiloProveedor.objects.all()  # Obtener todos los registros de kilos
-        serializer = KiloProveedorSerializer(kilos, many=True)
-        return Response(serializer.data)  # Devolver los datos de los registros de kilos
+        kilos = KiloProveedor.objects.values(*COLUMNAS_KILO)  # Obtener los registros de kilos (sin instanciar modelos)
+        paginator = KeysetPagination()
+        pagina = paginator.paginate_queryset(kilos, request)  # Solo la página pedida con ?cursor=&limit=
+        return paginator.get_paginated_response(filas_kilos(pagina))  # Devolver la página de registros de kilos, igual que KiloProveedorSerializer
 
     elif request.method == 'POST':
         serializer = KiloProveedorSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            proveedor = Proveedor.objects.get(id=request.data['proveedor'])  # Obtener el proveedor por su ID
-            proveedor.puntos_acumulados += int(request.data['kilos']) * conversion_rate  # Actualizar los puntos acumulados del proveedor
-            proveedor.save()
+            with transaction.atomic():
+                kilo = serializer.save()
+                acreditar_puntos(kilo.proveedor_id, int(kilo.kilos) * conversion_rate, kilo=kilo)  # Sumar los puntos en la base de datos y registrar el movimiento
+                sumar_kilos_mensuales(kilo.proveedor_id, kilo.fecha, kilo.kilos)  # Actualizar el total mensual del proveedor
+                sumar_ranking(kilo.proveedor_id, kilo.fecha, kilos=kilo.kilos, puntos=int(kilo.kilos) * conversion_rate)  # Actualizar el ranking
             return Response(serializer.data, status=status.HTTP_201_CREATED)  # Devolver los datos del registro de kilos creado
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Vista para exportar todos los registros de kilos en CSV o NDJSON (?formato=csv|ndjson, ?proveedor=, ?from=, ?to=)
+@api_view(['GET'])
+def kilos_export(request):
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return Response({'error': 'formato debe ser csv o ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        filtros = filtros_exportacion(request)
+    except ValueError:
+        return Response({'error': 'Parámetros proveedor, from o to inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+    return respuesta_exportacion(kilos_filtrados(**filtros), CAMPOS_KILO, formato, 'kilos')
+
+# Vista para registrar en lote los kilos sincronizados por los camiones de recolección.
+# Todo el lote se valida y se guarda en una sola transacción: si algún registro es inválido no se guarda ninguno.
+@api_view(['POST'])
+def kilos_batch(request):
+    registros = request.data.get('registros') if isinstance(request.data, dict) else request.data  # Aceptar una lista o {"registros": [...]}
+    if not isinstance(registros, list) or not registros:
+        return Response({'error': 'Se requiere una lista de registros de kilos.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(registros) > KILOS_BATCH_MAX_SIZE:
+        return Response({'error': f'El lote no puede superar {KILOS_BATCH_MAX_SIZE} registros.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Cargar todos los proveedores del lote en una sola consulta para validar
+    # (solo los valores con forma de id: una lista o un objeto como proveedor queda inválido en el serializador)
+    valores = [registro.get('proveedor') for registro in registros if isinstance(registro, dict)]
+    ids = {int(pk) for pk in valores if isinstance(pk, int) or (isinstance(pk, str) and pk.isdigit())}
+    proveedores = Proveedor.objects.in_bulk(ids)
+    serializer = KiloProveedorLoteSerializer(data=registros, many=True, context={'proveedores': proveedores})
+    if not serializer.is_valid():
+        errores = serializer.errors
+        if isinstance(errores, list):
+            errores = dict(enumerate(errores))
+        # Devolver el resultado de cada registro en el mismo orden en que se enviaron
+        return Response({'results': [
+            {'index': i, 'status': 'invalid', 'errors': errores[i]} if errores.get(i) else {'index': i, 'status': 'not_saved'}
+            for i in range(len(registros))
+        ]}, status=status.HTTP_400_BAD_REQUEST)
+
+    conversion_rate = obtener_configuracion().conversion_rate
+    with transaction.atomic():
+        kilos = KiloProveedor.objects.bulk_create([KiloProveedor(**datos) for datos in serializer.validated_data])  # Un solo INSERT para todo el lote
+
+        # Agrupar los puntos por proveedor y los kilos y puntos por proveedor y mes
+        puntos_por_proveedor = {}
+        kilos_por_mes = {}
+        for kilo in kilos:
+            puntos = int(kilo.kilos) * conversion_rate
+            puntos_por_proveedor[kilo.proveedor_id] = puntos_por_proveedor.get(kilo.proveedor_id, 0) + puntos
+            clave = (kilo.proveedor_id, mes_de(kilo.fecha))
+            total, cantidad, puntos_mes, _ = kilos_por_mes.get(clave, (0, 0, 0, None))
+            kilos_por_mes[clave] = (total + kilo.kilos, cantidad + 1, puntos_mes + puntos, kilo.fecha)
+
+        acreditar_puntos_agrupados(puntos_por_proveedor)  # Un UPDATE por proveedor
+        for (proveedor_id, _), (total, cantidad, puntos_mes, fecha) in kilos_por_mes.items():
+            sumar_kilos_mensuales(proveedor_id, fecha, total, registros=cantidad)  # Un UPDATE por proveedor y mes
+            sumar_ranking(proveedor_id, fecha, kilos=total, puntos=puntos_mes)  # Otro para el ranking
+
+    return Response({'results': [
+        {'index': i, 'status': 'created', 'id': kilo.pk, 'puntos': int(kilo.kilos) * conversion_rate}
+        for i, kilo in enumerate(kilos)
+    ]}, status=status.HTTP_201_CREATED)  # Devolver el resultado de cada registro
+
 # Vista basada en clase para obtener, actualizar o eliminar un registro de kilos de proveedor específico
 class KiloDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = KiloProveedor.objects.all()
     serializer_class = KiloProveedorSerializer
 
+    # Al editar, mover los kilos anteriores fuera del total mensual y del ranking y sumar los nuevos
+    def perform_update(self, serializer):
+        anterior = serializer.instance
+        proveedor_id, fecha, kilos = anterior.proveedor_id, anterior.fecha, anterior.kilos
+        with transaction.atomic():
+            kilo = serializer.save()
+            sumar_kilos_mensuales(proveedor_id, fecha, -kilos, registros=-1)
+            sumar_kilos_mensuales(kilo.proveedor_id, kilo.fecha, kilo.kilos)
+            sumar_ranking(proveedor_id, fecha, kilos=-kilos)
+            sumar_ranking(kilo.proveedor_id, kilo.fecha, kilos=kilo.kilos)
+
+    # Al eliminar, restar los kilos del total mensual y del ranking
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            sumar_kilos_mensuales(instance.proveedor_id, instance.fecha, -instance.kilos, registros=-1)
+            sumar_ranking(instance.proveedor_id, instance.fecha, kilos=-instance.kilos)
+            instance.delete()
+
 # Vista para obtener y actualizar la configuración
 @api_view(['GET', 'PUT'])
 def configuracion_detail(request):
-    configuracion = Configuracion.objects.first()  # Obtener la configuración (o crearla si no existe)
-    if not configuracion:
-        configuracion = Configuracion.objects.create()
-
     if request.method == 'GET':
-        serializer = ConfiguracionSerializer(configuracion)
+        serializer = ConfiguracionSerializer(obtener_configuracion())  # Leer la configuración en memoria
         return Response(serializer.data)  # Devolver los datos de la configuración
 
     elif request.method == 'PUT':
+        configuracion = Configuracion.objects.first()  # Obtener la configuración (o crearla si no existe)
+        if not configuracion:
+            configuracion = Configuracion.objects.create()
         serializer = ConfiguracionSerializer(configuracion, data=request.data)
         if serializer.is_valid():
             serializer.save()
+            invalidar_configuracion()  # Avisar a todos los workers que deben releer la configuración
             return Response(serializer.data)  # Devolver los datos de la configuración actualizada
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-# Vista para obtener y actualizar el estado del servomotor
-@api_view(['GET', 'PUT'])
-def servo_motor_state_detail(request):
-    servo_motor_state = ServoMotorState.objects.first()  # Obtener el estado del servomotor (o crearlo si no existe)
-    if not servo_motor_state:
-        servo_motor_state = ServoMotorState.objects.create()
+# Vista para listar y registrar dispositivos (composteras)
+class DispositivoList(generics.ListCreateAPIView):
+    queryset = Dispositivo.objects.all()
+    serializer_class = DispositivoSerializer
 
-    if request.method == 'GET':
-        serializer = ServoSerializer(servo_motor_state)
-        return Response(serializer.data)  # Devolver los datos del estado del servomotor
-
-    elif request.method == 'PUT':
-        serializer = ServoSerializer(servo_motor_state, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)  # Devolver los datos del estado del servomotor actualizado
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-# Vista para obtener y actualizar los datos del sensor
-@api_view(['GET', 'PUT'])
-def sensor_data_detail(request):
-    sensor_data = SensorData.objects.first()  # Obtener los datos del sensor (o crearlos si no existen)
-    if not sensor_data:
-        sensor_data = SensorData.objects.create()
-
-    if request.method == 'GET':
-        serializer = SensorSerializer(sensor_data)
-        return Response(serializer.data)  # Devolver los datos del sensor
+    def perform_create(self, serializer):
+        serializer.save()
+        invalidar_dispositivos()  # Incluir el nuevo dispositivo en el estado de todos los dispositivos
 
-    elif request.method == 'PUT':
-        serializer = SensorSerializer(sensor_data, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)  # Devolver los datos del sensor actualizados
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+# Vista para obtener la última lectura y el estado del servomotor de todos los dispositivos (desde la caché)
+@api_view(['GET'])
+def dispositivos_estado(request):
+    return Response(estado_de_todos(), status=status.HTTP_200_OK)
+
+# Vista para listar y crear los umbrales del control automático del servomotor
+class UmbralControlList(generics.ListCreateAPIView):
+    queryset = UmbralControl.objects.all()
+    serializer_class = UmbralControlSerializer
+
+    def perform_create(self, serializer):
+        serializer.save()
+        invalidar_umbrales()  # Avisar a todos los workers que deben releer los umbrales
+
+# Vista para obtener, actualizar y eliminar un umbral del control automático
+class UmbralControlDetail(generics.RetrieveUpdateDestroyAPIView):
+    queryset = UmbralControl.objects.all()
+    serializer_class = UmbralControlSerializer
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidar_umbrales()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidar_umbrales()
+
+# Vista para listar los eventos del control automático (?dispositivo=, ?tipo=), del más reciente al más antiguo
+class EventoControlList(generics.ListAPIView):
+    serializer_class = EventoControlSerializer
+
+    def get_queryset(self):
+        eventos = EventoControl.objects.all()
+        if 'dispositivo' in self.request.query_params:
+            eventos = eventos.filter(dispositivo__codigo=self.request.query_params['dispositivo'])
+        if 'tipo' in self.request.query_params:
+            eventos = eventos.filter(tipo=self.request.query_params['tipo'])
+        return eventos
+
+# Convierte un parámetro de fecha (ISO 8601 o AAAA-MM-DD) en un datetime con zona horaria
+def parse_fecha(valor):
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise ValueError(valor)
+        fecha = datetime.combine(dia, time.min)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, dt_timezone.utc)
+    return fecha
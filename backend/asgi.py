@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+The streaming endpoints (for example /api/servo_motor_state/stream/) hold the
+connection open, so serve them with an ASGI server such as
+``uvicorn backend.asgi:application``. The device endpoints (sensor_data/,
+sensor_data/batch/, servo_motor_state/) are async views, so slow devices do not
+hold a worker thread; compare both servers with
+``python manage.py benchmark_conexiones``.
 """
 
 import os
@@ -48,9 +48,13 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',  # Paginación por cursor (?cursor=&limit=) en las vistas de lista
 }
 
 MIDDLEWARE = [
+    'api.metricas.MetricasMiddleware',  # Primero, para medir el tiempo total de cada solicitud
+    'api.perfilado.PerfiladoMiddleware',  # Perfilado a pedido (X-Profile / ?_profile=)
+    'api.replicas.ReplicaMiddleware',  # Lecturas de catálogo, historiales y sensores desde las réplicas
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -97,6 +101,59 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB=sqlite usa un archivo SQLite en lugar de MySQL (desarrollo local, pruebas y benchmarks;
+# la ruta se puede cambiar con DJANGO_SQLITE_PATH)
+if os.environ.get('DJANGO_DB') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {'timeout': 20},  # Esperar a que se libere el bloqueo de escritura en lugar de fallar
+        }
+    }
+
+# Réplicas de solo lectura: DJANGO_DB_REPLICAS=host1,host2 (con DJANGO_DB=sqlite, rutas de archivos; por
+# ejemplo una copia de db.sqlite3 para probar localmente con dos bases). Se agregan como replica1,
+# replica2... con la misma configuración que 'default'. Las lecturas de catálogo, historiales y sensores
+# van a una réplica (ver api/replicas.py); en las pruebas las réplicas son espejos de 'default'.
+REPLICAS_LECTURA = []
+for numero, destino in enumerate([valor.strip() for valor in os.environ.get('DJANGO_DB_REPLICAS', '').split(',') if valor.strip()], start=1):
+    clave = 'NAME' if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' else 'HOST'
+    DATABASES[f'replica{numero}'] = {**DATABASES['default'], clave: destino, 'TEST': {'MIRROR': 'default'}}
+    REPLICAS_LECTURA.append(f'replica{numero}')
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Caché en archivos: la comparten todos los workers del mismo servidor (gunicorn). Con varios
+# servidores usar un backend compartido: DJANGO_REDIS_URL=redis://host:6379/0 (requiere el paquete redis).
+# Al superar MAX_ENTRIES la caché en archivos borra al azar un tercio de las entradas, incluidos los
+# últimos valores de los dispositivos (api/dispositivos.py), que deben estar siempre en caché: se usan
+# unas tres claves por dispositivo (lectura, servomotor y versión del servomotor) más las páginas del
+# catálogo y la configuración. El máximo se cambia con DJANGO_CACHE_MAX_ENTRIES.
+CACHE_MAX_ENTRIES = int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 20000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }
+}
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+
+# Las pruebas usan una caché en memoria en lugar de la de archivos (ver api/pruebas.py)
+TEST_RUNNER = 'api.pruebas.PruebasRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -139,4 +196,16 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Días de lecturas crudas de sensores que conserva el comando compactar_sensores
+SENSOR_RAW_RETENTION_DAYS = 30
+
+# Métricas de Prometheus en /metrics (solo desde estas IPs). Con varios workers, definir METRICAS_DIR
+# (un directorio local por servidor, vaciado en cada despliegue) para sumar las métricas de todos.
+METRICAS_DIR = os.environ.get('METRICAS_DIR')
+METRICAS_IPS_PERMITIDAS = ['127.0.0.1', '::1']
+
+# Perfilado de solicitudes a pedido (ver api/perfilado.py y `manage.py token_perfilado`)
+PERFILADO_DIR = os.path.join(BASE_DIR, 'perfiles')
+PERFILADO_MAX_POR_MINUTO = 6  # Entre todos los workers
+PERFILADO_MUESTREO = 0.0  # Fracción de solicitudes perfiladas sin token (por ejemplo 0.001)
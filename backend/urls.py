@@ -3,6 +3,9 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api.imagenes import servir_media
+from api.metricas import metricas_prometheus
+
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -13,6 +16,8 @@ urlpatterns = [
     path('api/', include('api.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metricas_prometheus, name='metrics'),  # Endpoint interno para Prometheus
 ]
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Los derivados de imágenes se sirven con Cache-Control inmutable (en producción, lo mismo desde el servidor web)
+    urlpatterns += static(settings.MEDIA_URL, view=servir_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file